@@ -0,0 +1,355 @@
+"""
+Writers for the archives (library.zip and library.cxa) created by the
+freezer.
+"""
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import marshal
+import os
+import struct
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+import zipfile
+import zlib
+
+from .manifest import BuildManifest
+
+__all__ = ["ArchiveWriter", "IndexedArchiveWriter"]
+
+DataFunction = Callable[[], bytes]
+
+
+# the internals of ZipFile used to append entries which were already
+# compressed; they are those of ZipFile.writestr() in Python 3.6 to 3.13,
+# which test_archive_writer checks (otherwise, the entries are compressed
+# again by ZipFile.writestr())
+_ZIP_FILE_INTERNALS = ("_lock", "_writecheck", "_didModify", "start_dir", "fp")
+
+
+class _ZipFile(zipfile.ZipFile):
+    """ZipFile which accepts entries that were already compressed."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.can_write_compressed = all(
+            hasattr(self, name) for name in _ZIP_FILE_INTERNALS
+        )
+
+    def write_compressed(
+        self, zinfo: zipfile.ZipInfo, data: bytes, compressed: bytes
+    ) -> None:
+        """
+        Append an entry given its uncompressed and compressed data; this is
+        what ZipFile.writestr() does, except for the compression itself.
+        """
+        if not self.can_write_compressed:
+            self.writestr(zinfo, data)
+            return
+        zinfo.file_size = len(data)
+        zinfo.compress_size = len(compressed)
+        zinfo.CRC = zlib.crc32(data)
+        zinfo.flag_bits = 0x00
+        if not zinfo.external_attr:
+            zinfo.external_attr = 0o600 << 16  # permissions: ?rw-------
+        with self._lock:
+            self.fp.seek(self.start_dir)
+            zinfo.header_offset = self.fp.tell()
+            self._writecheck(zinfo)
+            self._didModify = True
+            self.fp.write(zinfo.FileHeader())
+            self.fp.write(compressed)
+            self.filelist.append(zinfo)
+            self.NameToInfo[zinfo.filename] = zinfo
+            self.start_dir = self.fp.tell()
+
+
+class ArchiveWriter:
+    """
+    Write entries to a zip file. The data of each entry is produced (for
+    instance, by marshalling a code object) and compressed in a pool of
+    threads, since zlib releases the GIL, but entries are always appended
+    to the archive in the order in which they were added, so the layout of
+    the archive does not depend on the number of jobs used. Files written
+    to the file system (the .pyc files of packages stored there) also go
+    through the pool.
+
+    If a build manifest is given (incremental builds), the digest of each
+    entry and file is computed as well: files with unchanged contents are
+    not rewritten, unchanged entries are copied from the previous archive
+    without being compressed again and the previous archive is left as it
+    is if none of its entries changed.
+    """
+
+    # number of pending entries per job before waiting for the oldest one
+    MAX_PENDING_PER_JOB = 64
+
+    def __init__(
+        self,
+        file_name: str,
+        compress_type: int,
+        jobs: int = 1,
+        manifest: Optional[BuildManifest] = None,
+    ) -> None:
+        self.file_name = file_name
+        self.compress_type = compress_type
+        self.manifest = manifest
+        self._members: List[Tuple[str, str]] = []
+        self._previous_members: List[Tuple[str, str]] = []
+        self._previous: Optional[zipfile.ZipFile] = None
+        self._temp_name = file_name
+        if manifest is not None:
+            self._previous_members = manifest.get_members(file_name)
+            if self._previous_members:
+                try:
+                    self._previous = zipfile.ZipFile(file_name)
+                except (OSError, zipfile.BadZipFile):
+                    self._previous_members = []
+            self._temp_name = file_name + ".tmp"
+        self._previous_digests: Dict[str, str] = dict(self._previous_members)
+        self._zip = _ZipFile(self._temp_name, "w", compress_type)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if jobs > 1:
+            self._executor = ThreadPoolExecutor(max_workers=jobs)
+        self._max_pending = jobs * self.MAX_PENDING_PER_JOB
+        self._pending: Deque[Tuple[zipfile.ZipInfo, Future]] = deque()
+        self._file_futures = []
+
+    def _compress(
+        self, name: str, get_data: DataFunction
+    ) -> Tuple[bytes, Optional[bytes], Optional[str]]:
+        """
+        Return the data of the entry, the compressed data (or None if the
+        entry is unchanged and can be copied from the previous archive) and
+        the digest of the data (or None if not an incremental build).
+        """
+        data = get_data()
+        digest = None
+        if self.manifest is not None:
+            digest = hashlib.sha1(data).hexdigest()
+            if self._previous_digests.get(name) == digest:
+                return data, None, digest
+        return data, self._deflate(data), digest
+
+    def _deflate(self, data: bytes) -> bytes:
+        """Return the data compressed like ZipFile.writestr() does."""
+        # without the internals of ZipFile, the entry is compressed when it
+        # is written
+        if (
+            self.compress_type == zipfile.ZIP_STORED
+            or not self._zip.can_write_compressed
+        ):
+            return data
+        compressor = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15
+        )
+        return compressor.compress(data) + compressor.flush()
+
+    def _read_previous(self, name: str) -> Optional[bytes]:
+        """Return the compressed data of the entry in the previous archive."""
+        try:
+            zinfo = self._previous.getinfo(name)
+        except KeyError:
+            return None
+        if zinfo.compress_type != self.compress_type:
+            return None
+        fp = self._previous.fp
+        fp.seek(zinfo.header_offset)
+        header = fp.read(zipfile.sizeFileHeader)
+        name_length, extra_length = struct.unpack("<HH", header[26:30])
+        fp.seek(name_length + extra_length, os.SEEK_CUR)
+        return fp.read(zinfo.compress_size)
+
+    def _write(self, zinfo: zipfile.ZipInfo, result: Tuple) -> None:
+        data, compressed, digest = result
+        if digest is not None:
+            self._members.append((zinfo.filename, digest))
+        if compressed is None and self._zip.can_write_compressed:
+            compressed = self._read_previous(zinfo.filename)
+        if compressed is None:
+            compressed = self._deflate(data)
+        self._zip.write_compressed(zinfo, data, compressed)
+
+    def _flush(self, wait_all: bool = False) -> None:
+        """Append the entries which are ready, in the order of addition."""
+        while self._pending:
+            zinfo, future = self._pending[0]
+            if not wait_all and not future.done():
+                if len(self._pending) < self._max_pending:
+                    break
+            self._pending.popleft()
+            self._write(zinfo, future.result())
+
+    def add_data(self, zinfo: zipfile.ZipInfo, get_data: DataFunction):
+        """
+        Add an entry to the archive; get_data is called (possibly in another
+        thread) to produce the uncompressed data of the entry.
+        """
+        zinfo.compress_type = self.compress_type
+        if self._executor is None:
+            self._write(zinfo, self._compress(zinfo.filename, get_data))
+            return
+        future = self._executor.submit(
+            self._compress, zinfo.filename, get_data
+        )
+        self._pending.append((zinfo, future))
+        self._flush()
+
+    def add_file(self, file_name: str, arcname: str) -> None:
+        """Add the contents of the file to the archive as arcname."""
+        zinfo = zipfile.ZipInfo.from_file(file_name, arcname)
+
+        def get_data():
+            with open(file_name, "rb") as fp:
+                return fp.read()
+
+        self.add_data(zinfo, get_data)
+
+    def write_file(
+        self,
+        target_name: str,
+        get_data: DataFunction,
+        source: Optional[str] = None,
+    ) -> None:
+        """
+        Write the data (produced by get_data from the source, if given) to
+        the file system.
+        """
+
+        # the threads only write the file; the manifest is updated by
+        # _record_file
+        def write():
+            digest = None
+            data = get_data()
+            if self.manifest is not None:
+                digest = hashlib.sha1(data).hexdigest()
+                if self.manifest.is_data_current(target_name, digest):
+                    return None
+            with open(target_name, "wb") as fp:
+                fp.write(data)
+            return digest
+
+        if self._executor is None:
+            self._record_file(target_name, source, write())
+        else:
+            future = self._executor.submit(write)
+            self._file_futures.append((target_name, source, future))
+
+    def _record_file(
+        self, target_name: str, source: Optional[str], digest: Optional[str]
+    ) -> None:
+        """Record the file written (with the digest) or left unchanged."""
+        if self.manifest is None:
+            return
+        if digest is None:
+            self.manifest.keep(target_name)
+        else:
+            self.manifest.record_data(target_name, digest, source)
+
+    def close(self) -> None:
+        """Wait for all pending entries and files and close the archive."""
+        try:
+            self._flush(wait_all=True)
+            for target_name, source, future in self._file_futures:
+                self._record_file(target_name, source, future.result())
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._zip.close()
+            if self._previous is not None:
+                self._previous.close()
+        if self.manifest is None:
+            return
+        unchanged = self._members == self._previous_members
+        if self._previous is not None and unchanged:
+            # keep the previous archive (and its modification time)
+            os.remove(self._temp_name)
+            self.manifest.keep(self.file_name)
+        else:
+            os.replace(self._temp_name, self.file_name)
+            self.manifest.record_archive(self.file_name, self._members)
+
+
+# the format of the indexed archive (library.cxa), also read by the finder
+# installed by initscripts/__startup__.py:
+#   header: magic, number of slots and of entries, offset of the table
+#   names and data (the marshalled code objects) of the modules
+#   table: open addressing hash table of slots (the FNV-1a hash of the name,
+#   flags, offset and length of the name and offset and length of the data;
+#   empty slots have a name length of zero)
+INDEXED_ARCHIVE_MAGIC = b"CXFRZ\x00\x00\x01"
+INDEXED_ARCHIVE_HEADER = struct.Struct("<8sIIQ")
+INDEXED_ARCHIVE_SLOT = struct.Struct("<IIIIQQ")
+INDEXED_ARCHIVE_PACKAGE = 0x1
+
+
+def fnv1a_hash(data: bytes) -> int:
+    """Return the 32 bit FNV-1a hash of the data."""
+    value = 0x811C9DC5
+    for byte in data:
+        value = ((value ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return value
+
+
+class IndexedArchiveWriter:
+    """
+    Write the code of modules to an indexed archive, which is read at
+    startup through mmap by a finder which only looks up the modules that
+    are actually imported, instead of reading the central directory of a
+    zip file. The code objects are stored marshalled but not compressed.
+    """
+
+    def __init__(
+        self, file_name: str, manifest: Optional[BuildManifest] = None
+    ) -> None:
+        self.file_name = file_name
+        self.manifest = manifest
+        self._entries: List[Tuple[bytes, int, bytes]] = []
+
+    def add_module(self, name: str, is_package: bool, code) -> None:
+        """Add the code object of the module to the archive."""
+        flags = INDEXED_ARCHIVE_PACKAGE if is_package else 0
+        self._entries.append((name.encode(), flags, marshal.dumps(code)))
+
+    def get_data(self) -> bytes:
+        """Return the contents of the archive."""
+        num_slots = 8
+        while num_slots < 2 * len(self._entries):
+            num_slots *= 2
+        slots = [None] * num_slots
+        chunks = []
+        offset = INDEXED_ARCHIVE_HEADER.size
+        for name, flags, data in self._entries:
+            value = fnv1a_hash(name)
+            index = value & (num_slots - 1)
+            while slots[index] is not None:
+                index = (index + 1) & (num_slots - 1)
+            name_offset = offset
+            data_offset = name_offset + len(name)
+            slots[index] = INDEXED_ARCHIVE_SLOT.pack(
+                value, flags, name_offset, len(name), data_offset, len(data)
+            )
+            chunks.append(name)
+            chunks.append(data)
+            offset = data_offset + len(data)
+        empty = INDEXED_ARCHIVE_SLOT.pack(0, 0, 0, 0, 0, 0)
+        header = INDEXED_ARCHIVE_HEADER.pack(
+            INDEXED_ARCHIVE_MAGIC, num_slots, len(self._entries), offset
+        )
+        chunks.insert(0, header)
+        chunks.extend(slot or empty for slot in slots)
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        """Write the archive, unless unchanged (in incremental builds)."""
+        data = self.get_data()
+        digest = None
+        if self.manifest is not None:
+            digest = hashlib.sha1(data).hexdigest()
+            if self.manifest.is_data_current(self.file_name, digest):
+                self.manifest.keep(self.file_name)
+                return
+        with open(self.file_name, "wb") as fp:
+            fp.write(data)
+        if self.manifest is not None:
+            self.manifest.record_data(self.file_name, digest)
@@ -0,0 +1,202 @@
+"""
+Persistent caches shared between builds.
+"""
+
+import hashlib
+from importlib.util import MAGIC_NUMBER
+import marshal
+import os
+import sys
+import threading
+from types import CodeType
+from typing import Any, List, Optional, Tuple
+
+__all__ = ["DependencyCache", "ScanCache"]
+
+# bump these whenever the format of the cached entries changes
+SCAN_CACHE_VERSION = 4
+DEPENDENCY_CACHE_VERSION = 1
+
+
+class _FileCache:
+    """
+    Base class for caches which store each entry in its own file, named
+    after a hash of its key, so that concurrent builds sharing the same
+    cache directory never see a partially written entry.
+    """
+
+    def __init__(self, cache_dir: str, name: str):
+        self.cache_dir = os.path.join(os.path.abspath(cache_dir), name)
+
+    def _get_entry_path(self, key: Tuple) -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest[2:])
+
+    def _read_entry(self, key: Tuple) -> Optional[Any]:
+        try:
+            with open(self._get_entry_path(key), "rb") as fp:
+                cached_key, value = marshal.load(fp)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if cached_key != key:
+            return None
+        return value
+
+    def _write_entry(self, key: Tuple, value: Any) -> None:
+        entry_path = self._get_entry_path(key)
+        temp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            with open(temp_path, "wb") as fp:
+                marshal.dump((key, value), fp)
+            os.replace(temp_path, entry_path)
+        except (OSError, ValueError):
+            # the cache is only an optimization; never fail the build
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+class ScanCache(_FileCache):
+    """
+    On-disk cache of compiled code objects and the import operations found
+    in them, keyed by the source file (path, size and modification time),
+    the optimize flag, the analyses made of the import statements (see
+    cx_Freeze.guards) and the magic number of the running interpreter.
+    """
+
+    def __init__(self, cache_dir: str):
+        super().__init__(cache_dir, "scan")
+
+    def _get_key(
+        self, path: str, optimize_flag: int, analyses: Tuple[str, ...]
+    ) -> Optional[Tuple]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (
+            SCAN_CACHE_VERSION,
+            os.path.normcase(os.path.abspath(path)),
+            st.st_size,
+            st.st_mtime_ns,
+            optimize_flag,
+            analyses,
+            MAGIC_NUMBER,
+        )
+
+    def contains(
+        self, path: str, optimize_flag: int, analyses: Tuple[str, ...] = ()
+    ) -> bool:
+        """Return True if the source file is (probably) cached."""
+        key = self._get_key(path, optimize_flag, analyses)
+        return key is not None and os.path.exists(self._get_entry_path(key))
+
+    def get(
+        self, path: str, optimize_flag: int, analyses: Tuple[str, ...] = ()
+    ) -> Optional[Tuple[CodeType, List[tuple]]]:
+        """
+        Return the cached code object and scanned import operations for the
+        given source file or None if the file is not cached or has changed.
+        """
+        key = self._get_key(path, optimize_flag, analyses)
+        if key is None:
+            return None
+        value = self._read_entry(key)
+        if value is None:
+            return None
+        code, ops = value
+        return code, list(ops)
+
+    def put(
+        self,
+        path: str,
+        optimize_flag: int,
+        code: CodeType,
+        ops: List[tuple],
+        analyses: Tuple[str, ...] = (),
+    ) -> None:
+        """Store the code object and import operations for the source file."""
+        key = self._get_key(path, optimize_flag, analyses)
+        if key is not None:
+            self._write_entry(key, (code, tuple(ops)))
+
+
+class DependencyCache(_FileCache):
+    """
+    On-disk cache of the shared libraries a binary depends on, before any
+    filtering by the include and exclude lists of the build. Entries are
+    keyed by the path, real path, inode, size and modification time of
+    the binary and by a fingerprint of the environment used to resolve the
+    dependencies (the library search path and the cache of ldconfig); an
+    entry is also ignored if one of the dependencies no longer exists.
+    """
+
+    def __init__(self, cache_dir: str):
+        super().__init__(cache_dir, "deps")
+        self.fingerprint = self._get_fingerprint()
+
+    @staticmethod
+    def _get_fingerprint() -> str:
+        parts = [sys.platform, sys.executable]
+        if sys.platform == "win32":
+            parts.append(os.environ.get("PATH", ""))
+            parts.extend(sys.path)
+        else:
+            parts.append(os.environ.get("LD_LIBRARY_PATH", ""))
+            try:
+                st = os.stat("/etc/ld.so.cache")
+                parts.append(f"{st.st_size}:{st.st_mtime_ns}")
+            except OSError:
+                pass
+        return hashlib.sha1("\0".join(parts).encode()).hexdigest()
+
+    def _get_key(
+        self, path: str, search_path: Optional[List[str]]
+    ) -> Optional[Tuple]:
+        real_path = os.path.realpath(path)
+        try:
+            st = os.stat(real_path)
+        except OSError:
+            return None
+        # the path itself matters too, for $ORIGIN in DT_RPATH/DT_RUNPATH
+        return (
+            DEPENDENCY_CACHE_VERSION,
+            os.path.normcase(os.path.abspath(path)),
+            os.path.normcase(real_path),
+            st.st_ino,
+            st.st_size,
+            st.st_mtime_ns,
+            self.fingerprint,
+            tuple(search_path or ()),
+        )
+
+    def get(
+        self, path: str, search_path: Optional[List[str]] = None
+    ) -> Optional[Tuple[List[str], List[str]]]:
+        """
+        Return the cached dependencies of the binary (found using the given
+        additional search path) and the names of the dependencies which
+        could not be found, or None if not cached.
+        """
+        key = self._get_key(path, search_path)
+        if key is None:
+            return None
+        value = self._read_entry(key)
+        if value is None:
+            return None
+        dependent_files, missing = value
+        if not all(os.path.exists(f) for f in dependent_files):
+            return None
+        return list(dependent_files), list(missing)
+
+    def put(
+        self,
+        path: str,
+        dependent_files: List[str],
+        missing: List[str],
+        search_path: Optional[List[str]] = None,
+    ) -> None:
+        """Store the (unfiltered) dependencies of the binary."""
+        key = self._get_key(path, search_path)
+        if key is not None:
+            self._write_entry(key, (tuple(dependent_files), tuple(missing)))
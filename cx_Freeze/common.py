@@ -7,6 +7,8 @@ import types
 from typing import Any, List, Tuple, Optional, Union
 import warnings
 
+SIZE_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
 
 def get_resource_file_path(dirname: str, name: str, ext: str) -> str:
     """
@@ -78,6 +80,30 @@ def process_path_specs(
     return processed_specs
 
 
+def parse_size(value: Union[int, str]) -> int:
+    """
+    Return the size given as a number of bytes, optionally followed by one
+    of the units K, M or G (powers of 1024), such as "10M".
+    """
+    if isinstance(value, int):
+        size = value
+    else:
+        text = value.strip().upper()
+        if text.endswith("B"):
+            text = text[:-1]
+        multiplier = 1
+        if text[-1:] in SIZE_UNITS:
+            multiplier = SIZE_UNITS[text[-1]]
+            text = text[:-1]
+        try:
+            size = int(float(text) * multiplier)
+        except ValueError:
+            raise ConfigError(f"invalid size {value!r}") from None
+    if size < 0:
+        raise ConfigError(f"invalid size {value!r}")
+    return size
+
+
 def code_object_replace(code: types.CodeType, **kwargs) -> types.CodeType:
     """
     Return a copy of the code object with new values for the specified fields.
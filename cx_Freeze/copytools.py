@@ -0,0 +1,131 @@
+"""
+Copying files and directory trees to the target directory as cheaply as the
+platform and file system allow: by sharing the data with the source (hard
+links, if requested, or reflinks on copy-on-write file systems) or by having
+the kernel copy it (copy_file_range or sendfile) instead of copying it
+through user space buffers.
+"""
+
+import errno
+import os
+import shutil
+import sys
+from typing import Callable, List, Optional, Set, Tuple
+
+__all__ = ["copy_file", "list_tree"]
+
+# ioctl which clones a file on Linux (btrfs, xfs, ...), from linux/fs.h
+FICLONE = 0x40049409
+
+# errors meaning that a method of copying is not available for these files
+_UNSUPPORTED_ERRORS = {
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+}
+
+
+def _reflink(source_fd: int, target_fd: int) -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import fcntl
+
+        fcntl.ioctl(target_fd, FICLONE, source_fd)
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def _copy_in_kernel(source_fd: int, target_fd: int, size: int) -> bool:
+    """Copy using copy_file_range or sendfile, if supported."""
+    for name in ("copy_file_range", "sendfile"):
+        function = getattr(os, name, None)
+        if function is None:
+            continue
+        offset = 0
+        try:
+            while offset < size:
+                remaining = size - offset
+                if name == "sendfile":
+                    count = function(target_fd, source_fd, offset, remaining)
+                else:
+                    count = function(source_fd, target_fd, remaining)
+                if count == 0:
+                    break
+                offset += count
+        except OSError as exc:
+            if exc.errno not in _UNSUPPORTED_ERRORS or offset > 0:
+                raise
+            continue
+        if offset == size:
+            return True
+        # the file changed size while being copied; start over
+        os.lseek(source_fd, 0, os.SEEK_SET)
+        os.lseek(target_fd, 0, os.SEEK_SET)
+        os.ftruncate(target_fd, 0)
+    return False
+
+
+def copy_file(
+    source: str,
+    target: str,
+    hardlink: bool = False,
+    include_mode: bool = False,
+) -> str:
+    """
+    Copy the file and its metadata (like shutil.copy2) and return the method
+    used ("hardlink", "reflink", "kernel" or "copy"). The target must not
+    exist. A hard link is only created if requested and the source and the
+    target are on the same file system; the target then shares its data and
+    metadata with the source, so it must never be modified.
+    """
+    if hardlink and sys.platform != "darwin":
+        try:
+            os.link(source, target)
+        except OSError:
+            pass
+        else:
+            return "hardlink"
+    with open(source, "rb") as source_file, open(target, "wb") as target_file:
+        source_fd = source_file.fileno()
+        target_fd = target_file.fileno()
+        size = os.fstat(source_fd).st_size
+        if _reflink(source_fd, target_fd):
+            method = "reflink"
+        elif _copy_in_kernel(source_fd, target_fd, size):
+            method = "kernel"
+        else:
+            shutil.copyfileobj(source_file, target_file)
+            method = "copy"
+    shutil.copystat(source, target)
+    if include_mode:
+        shutil.copymode(source, target)
+    return method
+
+
+def list_tree(
+    source: str,
+    target: str,
+    ignore: Optional[Callable[[str, List[str]], Set[str]]] = None,
+) -> List[Tuple[str, str]]:
+    """
+    Return the (source, target) pairs of the files of the directory tree to
+    copy like shutil.copytree() does (following symbolic links), creating
+    the target directories (which may exist already).
+    """
+    pairs = []
+    for dir_path, dir_names, file_names in os.walk(source, followlinks=True):
+        ignored = ignore(dir_path, dir_names + file_names) if ignore else ()
+        dir_names[:] = [n for n in dir_names if n not in ignored]
+        relative_path = os.path.relpath(dir_path, source)
+        target_path = os.path.normpath(os.path.join(target, relative_path))
+        os.makedirs(target_path, exist_ok=True)
+        for name in file_names:
+            if name not in ignored:
+                source_name = os.path.join(dir_path, name)
+                pairs.append((source_name, os.path.join(target_path, name)))
+    return pairs
+
@@ -14,6 +14,7 @@ import warnings
 
 import cx_Freeze
 from cx_Freeze.common import normalize_to_list
+from cx_Freeze.sizereport import BUILD_RECORD_NAMES
 
 __all__ = [
     "bdist_rpm",
@@ -140,8 +141,146 @@ class build_exe(distutils.core.Command):
             "[default: *]",
         ),
         ("silent", "s", "suppress all output except warnings"),
+        (
+            "cache-dir=",
+            None,
+            "directory of a persistent cache shared between builds "
+            "[default: no cache]",
+        ),
+        (
+            "jobs=",
+            "j",
+            "number of parallel jobs used to build (0 for the number of "
+            "CPUs) [default: 1]",
+        ),
+        (
+            "incremental",
+            None,
+            "skip the files which did not change since the previous build "
+            "and remove the files which are no longer part of the build",
+        ),
+        (
+            "hardlink",
+            None,
+            "create hard links to the files copied to the build directory "
+            "when possible, instead of copying them",
+        ),
+        (
+            "indexed-archive",
+            None,
+            "store the modules in an indexed archive (library.cxa) read "
+            "through mmap instead of the zip file",
+        ),
+        (
+            "trace-startup",
+            None,
+            "let the executables write a trace of their startup and imports "
+            "to the file named by the CXFREEZE_TRACE environment variable",
+        ),
+        (
+            "import-profiles=",
+            None,
+            "comma-separated list of import profiles (traces written by "
+            "executables built with trace-startup) or of directories "
+            "containing them, used to report the modules never imported",
+        ),
+        (
+            "prune-modules",
+            None,
+            "exclude the modules never imported according to the import "
+            "profiles",
+        ),
+        (
+            "prune-allowlist=",
+            None,
+            "comma-separated list of modules never excluded by "
+            "prune-modules, with their submodules",
+        ),
+        (
+            "hot-archive",
+            None,
+            "store the modules imported according to the import profiles in "
+            "a separate archive (library_hot.zip) searched first",
+        ),
+        (
+            "lazy-packages=",
+            None,
+            "comma-separated list of packages whose modules are executed "
+            "only when first used",
+        ),
+        (
+            "lazy-excludes=",
+            None,
+            "comma-separated list of modules of the lazy packages which are "
+            "executed when imported, with their submodules",
+        ),
+        (
+            "runtime-config=",
+            None,
+            "comma-separated list of name=value options of the runtime "
+            "configuration of the Python interpreter of the executables "
+            "(optimize, hash_seed, allocator, utf8_mode, faulthandler, "
+            "dont_write_bytecode, unbuffered, warnings, io_encoding, "
+            "environment)",
+        ),
+        (
+            "static-guards",
+            None,
+            "skip the imports in code which does not run on this platform, "
+            "guarded by conditions on sys.platform, os.name, "
+            "sys.version_info or TYPE_CHECKING",
+        ),
+        (
+            "size-report=",
+            None,
+            "write the size report of the build to this file, as JSON, and "
+            "print a summary of it",
+        ),
+        (
+            "graph-output=",
+            None,
+            "write the graph of the imports between the modules to this file, "
+            "in the DOT language if its extension is .dot or .gv, else as "
+            "JSON",
+        ),
+        (
+            "explain=",
+            None,
+            "comma-separated list of modules for which to explain why they "
+            "are included and what excluding them would exclude",
+        ),
+        (
+            "optional-report",
+            None,
+            "report the optional dependencies (imported only where "
+            "ImportError is handled) and the size each one adds",
+        ),
+        (
+            "optional-size-limit=",
+            None,
+            "exclude the optional dependencies adding more than this size "
+            "(in bytes, or with a K, M or G suffix)",
+        ),
+        (
+            "optional-allowlist=",
+            None,
+            "comma-separated list of optional dependencies never excluded, "
+            "with their submodules (alone, all others are excluded)",
+        ),
+    ]
+    boolean_options = [
+        "no-compress",
+        "include_msvcr",
+        "silent",
+        "incremental",
+        "hardlink",
+        "indexed-archive",
+        "trace-startup",
+        "prune-modules",
+        "hot-archive",
+        "static-guards",
+        "optional-report",
     ]
-    boolean_options = ["no-compress", "include_msvcr", "silent"]
 
     def add_to_path(self, name):
         source_dir = getattr(self, name.lower())
@@ -198,6 +337,12 @@ class build_exe(distutils.core.Command):
             "bin_path_excludes",
             "zip_include_packages",
             "zip_exclude_packages",
+            "import_profiles",
+            "prune_allowlist",
+            "lazy_packages",
+            "lazy_excludes",
+            "optional_allowlist",
+            "explain",
         ]
 
         for option in self.list_options:
@@ -210,10 +355,25 @@ class build_exe(distutils.core.Command):
         self.path = None
         self.include_msvcr = None
         self.silent = None
+        self.cache_dir = None
+        self.jobs = 1
+        self.incremental = False
+        self.hardlink = False
+        self.indexed_archive = False
+        self.trace_startup = False
+        self.prune_modules = False
+        self.hot_archive = False
+        self.runtime_config = None
+        self.static_guards = False
+        self.size_report = None
+        self.graph_output = None
+        self.optional_report = False
+        self.optional_size_limit = None
 
     def finalize_options(self):
         self.set_undefined_options("build", ("build_exe", "build_exe"))
         self.optimize = int(self.optimize)
+        self.jobs = int(self.jobs)
 
         if self.silent is None:
             self.silent = False
@@ -221,6 +381,8 @@ class build_exe(distutils.core.Command):
         # Make sure all options of multiple values are lists
         for option in self.list_options:
             setattr(self, option, normalize_to_list(getattr(self, option)))
+        if not isinstance(self.runtime_config, dict):
+            self.runtime_config = normalize_to_list(self.runtime_config)
 
     def run(self):
         metadata = self.distribution.metadata
@@ -253,6 +415,26 @@ class build_exe(distutils.core.Command):
             metadata=metadata,
             zipIncludePackages=self.zip_include_packages,
             zipExcludePackages=self.zip_exclude_packages,
+            cacheDir=self.cache_dir,
+            jobs=self.jobs,
+            incremental=self.incremental,
+            hardlink=self.hardlink,
+            indexedArchive=self.indexed_archive,
+            traceStartup=self.trace_startup,
+            importProfiles=self.import_profiles,
+            pruneModules=self.prune_modules,
+            pruneAllowlist=self.prune_allowlist,
+            hotArchive=self.hot_archive,
+            lazyPackages=self.lazy_packages,
+            lazyExcludes=self.lazy_excludes,
+            runtimeConfig=self.runtime_config,
+            staticGuards=self.static_guards,
+            sizeReport=self.size_report,
+            graphOutput=self.graph_output,
+            explainModules=self.explain,
+            optionalReport=self.optional_report,
+            optionalSizeLimit=self.optional_size_limit,
+            optionalAllowlist=self.optional_allowlist,
         )
 
         # keep freezer around so that its data case be used in bdist_mac phase
@@ -346,6 +528,12 @@ class install_exe(distutils.core.Command):
         if not self.skip_build:
             self.run_command("build_exe")
         self.outfiles = self.copy_tree(self.build_dir, self.install_dir)
+        for name in BUILD_RECORD_NAMES:
+            path = os.path.join(self.install_dir, name)
+            if path in self.outfiles:
+                self.outfiles.remove(path)
+                if os.path.exists(path):
+                    os.remove(path)
         if sys.platform != "win32":
             base_dir = os.path.dirname(os.path.dirname(self.install_dir))
             bin_dir = os.path.join(base_dir, "bin")
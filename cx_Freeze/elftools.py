@@ -0,0 +1,379 @@
+"""
+Reading the dynamic section of ELF files and resolving the shared libraries
+they need the same way the dynamic loader (ld.so) does, without running
+ldd for every file.
+"""
+
+from collections import deque
+import os
+import struct
+import sys
+import sysconfig
+import threading
+from typing import Dict, List, Optional, Tuple
+
+__all__ = ["ELFError", "ELFFile", "LibraryResolver"]
+
+# values from elf.h
+PT_LOAD = 1
+PT_DYNAMIC = 2
+PT_INTERP = 3
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_STRSZ = 10
+DT_SONAME = 14
+DT_RPATH = 15
+DT_RUNPATH = 29
+
+ELF_MAGIC = b"\x7fELF"
+LD_SO_CACHE = "/etc/ld.so.cache"
+LD_SO_CACHE_MAGIC_NEW = b"glibc-ld.so.cache1.1"
+LD_SO_CACHE_MAGIC_OLD = b"ld.so-1.7.0"
+
+
+class ELFError(Exception):
+    pass
+
+
+class ELFFile:
+    """
+    The parts of an ELF file which matter for dynamic linking: the class
+    and machine (an object can only load libraries that match both), the
+    interpreter and the DT_NEEDED, DT_RPATH and DT_RUNPATH entries.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.elf_class = 0
+        self.machine = 0
+        self.interpreter: Optional[str] = None
+        self.needed: List[str] = []
+        self.rpath: List[str] = []
+        self.runpath: List[str] = []
+        # the unexpanded values of DT_RPATH and DT_RUNPATH
+        self.raw_rpath: Optional[str] = None
+        self.raw_runpath: Optional[str] = None
+        self._order = "<"
+        # file offsets of the DT_RPATH and DT_RUNPATH entries and of their
+        # strings and the ranges of the other strings of the dynamic section
+        self._path_entries: List[Tuple[int, int, int]] = []
+        self._other_strings: List[Tuple[int, int]] = []
+        try:
+            with open(path, "rb") as fp:
+                self._read(fp)
+        except (OSError, struct.error) as exc:
+            raise ELFError(f"cannot read {path}: {exc}") from exc
+
+    def _read(self, fp) -> None:
+        ident = fp.read(16)
+        if len(ident) < 16 or not ident.startswith(ELF_MAGIC):
+            raise ELFError(f"not an ELF file: {self.path}")
+        self.elf_class = ident[4]
+        if self.elf_class not in (1, 2) or ident[5] not in (1, 2):
+            raise ELFError(f"unsupported ELF file: {self.path}")
+        order = self._order = "<" if ident[5] == 1 else ">"
+        if self.elf_class == 1:
+            header_format = order + "HHIIIIIHHHHHH"
+            phdr_format = order + "IIIIIIII"
+            dyn_format = order + "iI"
+        else:
+            header_format = order + "HHIQQQIHHHHHH"
+            phdr_format = order + "IIQQQQQQ"
+            dyn_format = order + "qQ"
+        header = struct.unpack(
+            header_format, fp.read(struct.calcsize(header_format))
+        )
+        self.machine = header[1]
+        phoff, phentsize, phnum = header[4], header[8], header[9]
+
+        # program headers: the loadable segments are needed to translate the
+        # address of the string table into a file offset
+        loads = []
+        dynamic = None
+        phdr_size = struct.calcsize(phdr_format)
+        for i in range(phnum):
+            fp.seek(phoff + i * phentsize)
+            values = struct.unpack(phdr_format, fp.read(phdr_size))
+            if self.elf_class == 1:
+                p_type, offset, vaddr, _, filesz = values[:5]
+            else:
+                p_type, _, offset, vaddr, _, filesz = values[:6]
+            if p_type == PT_LOAD:
+                loads.append((vaddr, offset, filesz))
+            elif p_type == PT_DYNAMIC:
+                dynamic = (offset, filesz)
+            elif p_type == PT_INTERP:
+                fp.seek(offset)
+                self.interpreter = os.fsdecode(
+                    fp.read(filesz).split(b"\0", 1)[0]
+                )
+        if dynamic is None:
+            return  # statically linked
+
+        # dynamic section: string values are offsets into the string table
+        entries = []
+        strtab = strsz = None
+        dyn_size = struct.calcsize(dyn_format)
+        fp.seek(dynamic[0])
+        data = fp.read(dynamic[1])
+        for pos in range(0, len(data) - dyn_size + 1, dyn_size):
+            tag, value = struct.unpack_from(dyn_format, data, pos)
+            if tag == DT_NULL:
+                break
+            if tag == DT_STRTAB:
+                strtab = value
+            elif tag == DT_STRSZ:
+                strsz = value
+            elif tag in (DT_NEEDED, DT_SONAME, DT_RPATH, DT_RUNPATH):
+                entries.append((tag, value, dynamic[0] + pos))
+        if strtab is None or strsz is None:
+            return
+        for vaddr, offset, filesz in loads:
+            if vaddr <= strtab < vaddr + filesz:
+                strtab_offset = strtab - vaddr + offset
+                fp.seek(strtab_offset)
+                strings = fp.read(strsz)
+                break
+        else:
+            raise ELFError(f"string table not found in {self.path}")
+
+        for tag, value, entry_offset in entries:
+            raw_string = strings[value:].split(b"\0", 1)[0]
+            string = os.fsdecode(raw_string)
+            if tag in (DT_RPATH, DT_RUNPATH):
+                self._path_entries.append(
+                    (entry_offset, strtab_offset + value, len(raw_string))
+                )
+            else:
+                self._other_strings.append(
+                    (strtab_offset + value, len(raw_string))
+                )
+            if tag == DT_NEEDED:
+                self.needed.append(string)
+            elif tag == DT_RPATH:
+                self.raw_rpath = string
+                self.rpath.extend(self._expand_path_list(string))
+            elif tag == DT_RUNPATH:
+                self.raw_runpath = string
+                self.runpath.extend(self._expand_path_list(string))
+
+    def _expand_path_list(self, value: str) -> List[str]:
+        """Split a DT_RPATH or DT_RUNPATH value and expand $ORIGIN et al."""
+        origin = os.path.dirname(os.path.abspath(self.path))
+        lib = "lib64" if self.elf_class == 2 else "lib"
+        platform = os.uname().machine
+        paths = []
+        for path in value.split(":"):
+            if not path:
+                continue
+            for name, replacement in (
+                ("ORIGIN", origin),
+                ("LIB", lib),
+                ("PLATFORM", platform),
+            ):
+                path = path.replace("${%s}" % name, replacement)
+                path = path.replace("$" + name, replacement)
+            paths.append(os.path.normpath(path))
+        return paths
+
+    def set_search_path(self, value: str, tag: Optional[int] = None) -> bool:
+        """
+        Replace the values of the DT_RPATH and DT_RUNPATH entries of the file
+        (in place) by the given value and change their tag, if given. The
+        string table cannot be extended, so this is only possible if the file
+        has such entries and their strings are at least as long as the new
+        value and not shared with other entries; return False otherwise.
+        """
+        if not self._path_entries:
+            return False
+        data = os.fsencode(value)
+        for _, string_offset, length in self._path_entries:
+            if len(data) > length:
+                return False
+            for other_offset, other_length in self._other_strings:
+                if (
+                    other_offset <= string_offset + length
+                    and string_offset <= other_offset + other_length
+                ):
+                    return False
+        tag_format = self._order + ("i" if self.elf_class == 1 else "q")
+        try:
+            with open(self.path, "r+b") as fp:
+                for entry_offset, string_offset, length in self._path_entries:
+                    fp.seek(string_offset)
+                    fp.write(data + b"\0" * (length - len(data)))
+                    if tag is not None:
+                        fp.seek(entry_offset)
+                        fp.write(struct.pack(tag_format, tag))
+        except OSError as exc:
+            raise ELFError(f"cannot write {self.path}: {exc}") from exc
+        return True
+
+    def is_compatible(self, other: "ELFFile") -> bool:
+        """Return True if this file can be loaded by the other file."""
+        return (
+            self.elf_class == other.elf_class and self.machine == other.machine
+        )
+
+
+def _read_ld_so_cache(path: str = LD_SO_CACHE) -> Dict[str, List[str]]:
+    """
+    Return the contents of the cache of ldconfig as a mapping of library
+    names to the paths found for them, in the order of the cache (the cache
+    may contain entries for several architectures; these are told apart by
+    reading the candidate files themselves).
+    """
+    try:
+        with open(path, "rb") as fp:
+            data = fp.read()
+    except OSError:
+        return {}
+    libraries: Dict[str, List[str]] = {}
+
+    def get_string(offset: int) -> str:
+        return os.fsdecode(data[offset : data.index(b"\0", offset)])
+
+    try:
+        start = data.find(LD_SO_CACHE_MAGIC_NEW)
+        if start >= 0:
+            # header: magic, nlibs, len_strings, flags, padding, extension
+            # offset and unused; entries: flags, key, value, osversion and
+            # hwcap; strings are relative to the start of the header
+            nlibs = struct.unpack_from("=I", data, start + 20)[0]
+            for i in range(nlibs):
+                _, key, value, _, _ = struct.unpack_from(
+                    "=iIIIQ", data, start + 48 + i * 24
+                )
+                name = get_string(start + key)
+                path = get_string(start + value)
+                libraries.setdefault(name, []).append(path)
+        elif data.startswith(LD_SO_CACHE_MAGIC_OLD):
+            # header: magic (padded to 12 bytes) and nlibs; entries: flags,
+            # key and value; strings are relative to the end of the entries
+            nlibs = struct.unpack_from("=I", data, 12)[0]
+            strings = 16 + nlibs * 12
+            for i in range(nlibs):
+                _, key, value = struct.unpack_from("=iII", data, 16 + i * 12)
+                name = get_string(strings + key)
+                libraries.setdefault(name, []).append(
+                    get_string(strings + value)
+                )
+    except (struct.error, ValueError):
+        return {}
+    return libraries
+
+
+class LibraryResolver:
+    """
+    Resolve the shared libraries needed by ELF files, searching (like
+    ld.so) the DT_RPATH of the requesting object and of the objects which
+    loaded it, LD_LIBRARY_PATH, the DT_RUNPATH of the requesting object,
+    the cache of ldconfig and the default directories. The resolver may be
+    used by several threads at once.
+    """
+
+    def __init__(
+        self,
+        library_path: Optional[List[str]] = None,
+        cache_path: str = LD_SO_CACHE,
+    ):
+        if library_path is None:
+            value = os.environ.get("LD_LIBRARY_PATH", "")
+            library_path = [p for p in value.split(os.pathsep) if p]
+        self.library_path = library_path
+        self.cache_path = cache_path
+        self._ld_so_cache: Optional[Dict[str, List[str]]] = None
+        self._files: Dict[str, Optional[ELFFile]] = {}
+        self._lock = threading.Lock()
+        multiarch = sysconfig.get_config_var("MULTIARCH")
+        self.default_dirs = ["/lib64", "/usr/lib64", "/lib", "/usr/lib"]
+        if multiarch:
+            self.default_dirs[:0] = [
+                f"/lib/{multiarch}",
+                f"/usr/lib/{multiarch}",
+            ]
+
+    def _get_file(self, path: str) -> Optional[ELFFile]:
+        """Return the (cached) parsed ELF file or None if not an ELF file."""
+        with self._lock:
+            if path in self._files:
+                return self._files[path]
+        # parsed without holding the lock: another thread may parse the same
+        # file, then the first one parsed is kept
+        try:
+            elf_file = ELFFile(path)
+        except ELFError:
+            elf_file = None
+        with self._lock:
+            return self._files.setdefault(path, elf_file)
+
+    def _get_ld_so_cache(self) -> Dict[str, List[str]]:
+        with self._lock:
+            if self._ld_so_cache is None:
+                self._ld_so_cache = _read_ld_so_cache(self.cache_path)
+            return self._ld_so_cache
+
+    def _find_library(
+        self, name: str, requester: ELFFile, inherited_rpath: List[str]
+    ) -> Optional[str]:
+        if "/" in name:
+            candidates = [name]
+        else:
+            dirs = []
+            if not requester.runpath:
+                dirs.extend(inherited_rpath)
+            dirs.extend(self.library_path)
+            dirs.extend(requester.runpath)
+            candidates = [os.path.join(d, name) for d in dirs]
+            candidates.extend(self._get_ld_so_cache().get(name, []))
+            candidates.extend(os.path.join(d, name) for d in self.default_dirs)
+        for candidate in candidates:
+            if not os.path.isfile(candidate):
+                continue
+            elf_file = self._get_file(candidate)
+            if elf_file is not None and elf_file.is_compatible(requester):
+                return candidate
+        return None
+
+    def get_dependent_files(self, path: str) -> Tuple[List[str], List[str]]:
+        """
+        Return the paths of all the shared libraries loaded (directly or
+        indirectly) by the ELF file, in load order, excluding the dynamic
+        loader itself, and the names of the libraries which could not be
+        found. Files which are not dynamically linked ELF files have no
+        dependencies.
+        """
+        root = self._get_file(path)
+        if root is None:
+            return [], []
+        # the dynamic loader is a dependency of libc but it is never copied
+        interpreters = set()
+        for elf_file in (root, self._get_file(sys.executable)):
+            if elf_file is not None and elf_file.interpreter:
+                interpreters.add(os.path.basename(elf_file.interpreter))
+        loaded = {os.path.basename(path)}
+        found_paths = set()
+        dependent_files: List[str] = []
+        missing: List[str] = []
+        # breadth first, like ld.so; the DT_RPATH of an object is only used
+        # (for itself and the objects it loads) if it has no DT_RUNPATH
+        queue = deque([(root, [] if root.runpath else root.rpath)])
+        while queue:
+            elf_file, rpath = queue.popleft()
+            for name in elf_file.needed:
+                if name in loaded or os.path.basename(name) in interpreters:
+                    continue
+                loaded.add(name)
+                found = self._find_library(name, elf_file, rpath)
+                if found is None:
+                    missing.append(name)
+                    continue
+                if found in found_paths:
+                    continue
+                found_paths.add(found)
+                dependent_files.append(found)
+                dependency = self._get_file(found)
+                inherited = [] if dependency.runpath else dependency.rpath
+                queue.append((dependency, inherited + rpath))
+        return dependent_files, missing
@@ -2,18 +2,29 @@
 Base class for finding modules.
 """
 
+import ast
+from concurrent.futures import Future, ProcessPoolExecutor
 import dis
 from importlib.abc import ExecutionLoader
 import importlib.machinery
+import importlib.util
 import logging
+import marshal
+import multiprocessing
 import os
 import sys
 from types import CodeType
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Set, Tuple, Union
 import opcode
 
+from cx_Freeze.cache import ScanCache
 from cx_Freeze.common import code_object_replace
-from cx_Freeze.module import Module
+from cx_Freeze.guards import (
+    evaluate_guard,
+    find_import_guards,
+    find_optional_imports,
+)
+from cx_Freeze.module import DistributionIndex, Module
 
 
 BUILD_LIST = opcode.opmap["BUILD_LIST"]
@@ -27,11 +38,324 @@ STORE_NAME = opcode.opmap["STORE_NAME"]
 STORE_GLOBAL = opcode.opmap["STORE_GLOBAL"]
 STORE_OPS = (STORE_NAME, STORE_GLOBAL)
 
-DeferredList = List[Tuple[Module, Module, List[str]]]
+# the analyses of the import statements made from the syntax tree of the
+# source files (see cx_Freeze.guards) and the words which must be found in the
+# source of a module for the analysis to find anything
+ANALYSES = {
+    "guards": (b"TYPE_CHECKING", b"sys.platform", b"os.name", b"version_info"),
+    "optional": (b"except",),
+}
+
+# the results of the analyses: the guards and the optional imports by line
+Analysis = Tuple[Dict[int, tuple], Set[int]]
+
+DeferredList = List[Tuple[Module, Module, List[str], bool]]
 
 __all__ = ["Module", "ModuleFinder"]
 
 
+def _get_code_keys(code: CodeType) -> Set[tuple]:
+    """
+    Return the keys identifying the code object and the code objects of its
+    function & class definitions (their first line and their bytecode).
+    """
+    keys = {(code.co_firstlineno, code.co_code)}
+    for constant in code.co_consts:
+        if isinstance(constant, type(code)):
+            keys.update(_get_code_keys(constant))
+    return keys
+
+
+def _scan_code_ops(
+    code: CodeType,
+    top_level: bool = True,
+    analysis: Optional[Analysis] = None,
+    analysed_keys: Optional[Set[tuple]] = None,
+) -> List[tuple]:
+    """
+    Scan code, returning the operations relevant to the finder in the order
+    in which they are found: imports as (IMPORT_NAME, name,
+    relative_import_index, from_list, guard, optional), import * statements
+    as (IMPORT_STAR,) and, at the top level, stores as (STORE_NAME, name).
+    The guard of an import is the condition of the code in which it is
+    found (or None) and optional is True if it handles ImportError, given
+    by line number by the analysis of the source (see cx_Freeze.guards).
+    If the keys of the code objects compiled from the source analysed are
+    given (see _get_code_keys), the other code objects are scanned without
+    the analysis. The code objects from function & class definitions are
+    scanned after the code itself.
+    """
+    ops = []
+    arguments = []
+    if analysed_keys is not None and (
+        (code.co_firstlineno, code.co_code) not in analysed_keys
+    ):
+        guards, optional = {}, set()
+    else:
+        guards, optional = analysis or ({}, set())
+    line_starts = dict(dis.findlinestarts(code)) if analysis else {}
+    line = None
+    for index, op, arg in dis._unpack_opargs(code.co_code):
+        line = line_starts.get(index, line)
+
+        # keep track of constants (these are used for importing)
+        # immediately restart loop so arguments are retained
+        if op == LOAD_CONST:
+            arguments.append(code.co_consts[arg])
+            continue
+
+        # import statement: record the module name and its arguments
+        if op == IMPORT_NAME:
+            name = code.co_names[arg]
+            if len(arguments) >= 2:
+                relative_import_index, from_list = arguments[-2:]
+            else:
+                relative_import_index = -1
+                from_list = arguments[0] if arguments else []
+            ops.append(
+                (
+                    IMPORT_NAME,
+                    name,
+                    relative_import_index,
+                    from_list,
+                    guards.get(line),
+                    line in optional,
+                )
+            )
+
+        # import * statement: only relevant at the top level
+        elif op == IMPORT_STAR and top_level:
+            ops.append((IMPORT_STAR,))
+
+        # store operation: track only top level
+        elif top_level and op in STORE_OPS:
+            ops.append((STORE_NAME, code.co_names[arg]))
+
+        # reset arguments; these are only needed for import statements so
+        # ignore them in all other cases!
+        arguments = []
+
+    # Scan the code objects from function & class definitions
+    for constant in code.co_consts:
+        if isinstance(constant, type(code)):
+            ops.extend(
+                _scan_code_ops(constant, False, analysis, analysed_keys)
+            )
+    return ops
+
+
+def _compile_file(
+    path: str, optimize_flag: int, analyses: Tuple[str, ...] = ()
+) -> Tuple[Optional[CodeType], Optional[Analysis]]:
+    """
+    Compile the source file, returning None if the syntax is invalid, and
+    make the requested analyses of its import statements (see ANALYSES)
+    from its syntax tree, which is then compiled, so the source is parsed
+    only once; only the files which may have something found are analysed.
+    """
+    loader = importlib.machinery.SourceFileLoader("", path)
+    try:
+        source = loader.get_data(path)
+        analyses = tuple(
+            name
+            for name in analyses
+            if any(word in source for word in ANALYSES[name])
+        )
+        if not analyses:
+            code = loader.source_to_code(source, path, _optimize=optimize_flag)
+            return code, None
+        tree = ast.parse(source, path)
+        code = compile(
+            tree, path, "exec", dont_inherit=True, optimize=optimize_flag
+        )
+    except SyntaxError:
+        return None, None
+    guards = find_import_guards(tree) if "guards" in analyses else {}
+    optional = find_optional_imports(tree) if "optional" in analyses else set()
+    return code, (guards, optional)
+
+
+def _compile_and_scan(
+    path: str, optimize_flag: int, analyses: Tuple[str, ...] = ()
+) -> Optional[Tuple[bytes, List[tuple]]]:
+    """
+    Compile the source file and scan the resulting code; this runs in the
+    worker processes, so the code object is returned marshalled.
+    """
+    code, analysis = _compile_file(path, optimize_flag, analyses)
+    if code is None:
+        return None
+    return marshal.dumps(code), _scan_code_ops(code, analysis=analysis)
+
+
+def _has_main_guard(path: str) -> bool:
+    """Return True if the script has an 'if __name__ == "__main__":'
+    statement at module level."""
+    try:
+        with open(path, "rb") as fp:
+            tree = ast.parse(fp.read(), path)
+    except (OSError, SyntaxError, ValueError):
+        return False
+    for node in tree.body:
+        if not (
+            isinstance(node, ast.If)
+            and isinstance(node.test, ast.Compare)
+            and len(node.test.ops) == 1
+            and isinstance(node.test.ops[0], ast.Eq)
+        ):
+            continue
+        operands = (node.test.left, node.test.comparators[0])
+        if not any(
+            isinstance(n, ast.Name) and n.id == "__name__" for n in operands
+        ):
+            continue
+        for operand in operands:
+            try:
+                if ast.literal_eval(operand) == "__main__":
+                    return True
+            except ValueError:
+                pass
+    return False
+
+
+def _get_mp_context():
+    """
+    Return the multiprocessing context used to start the worker processes,
+    or None if they cannot be started safely. Workers are forked where
+    possible, since spawned workers import the main module again: this is
+    usually a setup script, which would then run the build again, unless
+    its code runs under a __main__ guard. Forking is not safe on macOS
+    (with the system frameworks and threads), where Python spawns workers
+    by default since 3.8.
+    """
+    if (
+        "fork" in multiprocessing.get_all_start_methods()
+        and sys.platform != "darwin"
+    ):
+        return multiprocessing.get_context("fork")
+    main_file = getattr(sys.modules.get("__main__"), "__file__", None)
+    if main_file is None or _has_main_guard(main_file):
+        return multiprocessing.get_context("spawn")
+    return None
+
+
+class _DirectoryListing:
+    """The names found in a directory, as listed by the path index."""
+
+    __slots__ = ("names", "files", "dirs")
+
+    def __init__(self, path: str):
+        self.names: List[str] = []
+        self.files: Set[str] = set()
+        self.dirs: Set[str] = set()
+        with os.scandir(path) as it:
+            for entry in it:
+                self.names.append(entry.name)
+                try:
+                    if entry.is_dir():
+                        self.dirs.add(entry.name)
+                    else:
+                        self.files.add(entry.name)
+                except OSError:
+                    continue
+
+
+class _PathIndex:
+    """
+    Index of the path entries searched by the finder. Each directory is
+    listed only once per build and specs are resolved from these listings,
+    following the same rules as the FileFinder used by the import system;
+    entries which are not directories (zip files, for instance) are passed
+    to the real PathFinder instead.
+    """
+
+    def __init__(self):
+        self._listings: Dict[str, Optional[_DirectoryListing]] = {}
+        self._loaders = [
+            (suffix, loader)
+            for loader, suffixes in (
+                (
+                    importlib.machinery.ExtensionFileLoader,
+                    importlib.machinery.EXTENSION_SUFFIXES,
+                ),
+                (
+                    importlib.machinery.SourceFileLoader,
+                    importlib.machinery.SOURCE_SUFFIXES,
+                ),
+                (
+                    importlib.machinery.SourcelessFileLoader,
+                    importlib.machinery.BYTECODE_SUFFIXES,
+                ),
+            )
+            for suffix in suffixes
+        ]
+
+    def list_dir(self, path: str) -> Optional[_DirectoryListing]:
+        """Return the listing of the directory or None if not a directory."""
+        try:
+            return self._listings[path]
+        except KeyError:
+            pass
+        try:
+            listing = _DirectoryListing(path)
+        except OSError:
+            listing = None
+        self._listings[path] = listing
+        return listing
+
+    def find_spec(
+        self, name: str, path: Optional[List[str]]
+    ) -> Optional[importlib.machinery.ModuleSpec]:
+        """Find the spec of the named module in the given path entries."""
+        tail = name.rpartition(".")[2]
+        namespace_path = []
+        if path is None:
+            path = sys.path
+        for entry in path:
+            if not isinstance(entry, str):
+                continue
+            if entry == "":
+                entry = os.getcwd()
+            listing = self.list_dir(entry)
+            if listing is None:
+                if not os.path.isfile(entry):
+                    continue
+                spec = importlib.machinery.PathFinder.find_spec(name, [entry])
+                if spec is None:
+                    continue
+                if spec.loader is not None:
+                    return spec
+                namespace_path.extend(spec.submodule_search_locations or [])
+                continue
+            if tail in listing.dirs:
+                package_dir = os.path.join(entry, tail)
+                package_listing = self.list_dir(package_dir)
+                if package_listing is not None:
+                    for suffix, loader in self._loaders:
+                        init_name = "__init__" + suffix
+                        if init_name in package_listing.files:
+                            origin = os.path.join(package_dir, init_name)
+                            return importlib.util.spec_from_file_location(
+                                name,
+                                origin,
+                                loader=loader(name, origin),
+                                submodule_search_locations=[package_dir],
+                            )
+                    namespace_path.append(package_dir)
+            for suffix, loader in self._loaders:
+                file_name = tail + suffix
+                if file_name in listing.files:
+                    origin = os.path.join(entry, file_name)
+                    return importlib.util.spec_from_file_location(
+                        name, origin, loader=loader(name, origin)
+                    )
+        if namespace_path:
+            spec = importlib.machinery.ModuleSpec(name, None, is_package=True)
+            spec.submodule_search_locations = namespace_path
+            return spec
+        return None
+
+
 class ModuleFinder:
     def __init__(
         self,
@@ -44,6 +368,10 @@ class ModuleFinder:
         zip_include_packages: Optional[List[str]] = None,
         constants_module=None,
         zip_includes: Optional[List[str]] = None,
+        cache_dir: Optional[str] = None,
+        jobs: int = 1,
+        static_guards: bool = False,
+        optional_imports: bool = False,
     ):
         self.include_files = include_files or []
         self.excludes = dict.fromkeys(excludes or [])
@@ -55,14 +383,46 @@ class ModuleFinder:
         self.zip_include_packages = zip_include_packages or []
         self.constants_module = constants_module
         self.zip_includes = zip_includes or []
+        self.cache_dir = cache_dir
+        self.jobs = jobs if jobs > 0 else (os.cpu_count() or 1)
+        self._mp_context = None
+        if self.jobs > 1:
+            self._mp_context = _get_mp_context()
+            if self._mp_context is None:
+                self.jobs = 1
+        self.static_guards = static_guards
+        self.optional_imports = optional_imports
         self.modules = []
         self.aliases = {}
         self.exclude_dependent_files = {}
+        # the modules whose hooks included the files (see IncludeFiles)
+        self.include_file_hooks: Dict[str, str] = {}
+        # the imports found, as (caller, module, kind) and whether they are
+        # optional, that is made only where ImportError is handled; the kinds
+        # are those of ImportGraph (see graph.py)
+        self.edges: Dict[Tuple[str, str, str], bool] = {}
         self._modules = dict.fromkeys(
             excludes or []
         )  # type: Dict[str, Optional[Module]]
         self._builtin_modules = dict.fromkeys(sys.builtin_module_names)
         self._bad_modules = {}
+        self._scan_cache = ScanCache(cache_dir) if cache_dir else None
+        # the files generated for a single build are not cached
+        self._uncached_paths: Set[str] = set()
+        self._analyses = tuple(
+            name
+            for name, enabled in (
+                ("guards", static_guards),
+                ("optional", optional_imports),
+            )
+            if enabled
+        )
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._closed = False
+        self._pending: Dict[str, Future] = {}
+        self._path_index = _PathIndex()
+        self._dist_index = DistributionIndex(self.path)
+        self._hook_module: Optional[Module] = None
         self._hooks = __import__("cx_Freeze", fromlist=["hooks"]).hooks
         self._hooks.initialize(self)
         self._add_base_modules()
@@ -102,6 +462,9 @@ class ModuleFinder:
         module = self._modules.get(name)
         if module is None:
             module = Module(name, path, file_name, parent)
+            if parent is None:
+                module.dist_files = self._dist_index.get_dist_files(name)
+            module.distribution = self._dist_index.get_distribution_name(name)
             self._modules[name] = module
             self.modules.append(module)
             if name in self._bad_modules:
@@ -121,6 +484,51 @@ class ModuleFinder:
             module.file = file_name
         return module
 
+    def _compile_source(
+        self, name: str, path: str
+    ) -> Tuple[CodeType, List[tuple]]:
+        """
+        Return the code object compiled from the source file and the
+        operations found when scanning it, using the scan cache or the
+        result computed in advance by a worker process, if available.
+        """
+        scan_cache = self._scan_cache
+        if path in self._uncached_paths:
+            scan_cache = None
+        if scan_cache is not None:
+            cached = scan_cache.get(
+                path, self.optimize_flag, self._analyses
+            )
+            if cached is not None:
+                return cached
+        future = self._pending.pop(path, None)
+        if future is None:
+            code, analysis = _compile_file(
+                path, self.optimize_flag, self._analyses
+            )
+        else:
+            result = future.result()
+            code = None if result is None else marshal.loads(result[0])
+        if code is None:
+            logging.debug("Invalid syntax in [%s]", name)
+            raise ImportError(f"Invalid syntax in {path}", name=name)
+        if future is None:
+            ops = _scan_code_ops(code, analysis=analysis)
+        else:
+            ops = result[1]
+        if scan_cache is not None:
+            scan_cache.put(path, self.optimize_flag, code, ops, self._analyses)
+        return code, ops
+
+    def _add_edge(
+        self, caller: Module, module: Module, kind: str, optional: bool
+    ) -> None:
+        """Record the import of the module by the caller; the import is
+        optional only if the caller imports it only where ImportError is
+        handled."""
+        key = (caller.name, module.name, kind)
+        self.edges[key] = optional and self.edges.get(key, True)
+
     def _determine_parent(self, caller: Optional[Module]) -> Optional[Module]:
         """Determine the parent to use when searching packages."""
         if caller is not None:
@@ -135,6 +543,7 @@ class ModuleFinder:
         package_module: Module,
         from_list: List[str],
         deferred_imports: DeferredList,
+        optional: bool = False,
     ) -> None:
         """
         Ensure that the from list is satisfied. This is only necessary for
@@ -143,13 +552,19 @@ class ModuleFinder:
         in order to avoid spurious errors about missing modules.
         """
         if package_module.in_import and caller is not package_module:
-            deferred_imports.append((caller, package_module, from_list))
+            deferred_imports.append(
+                (caller, package_module, from_list, optional)
+            )
         else:
             for name in from_list:
                 if name in package_module.global_names:
                     continue
                 sub_module_name = f"{package_module.name}.{name}"
-                self._import_module(sub_module_name, deferred_imports, caller)
+                sub_module = self._import_module(
+                    sub_module_name, deferred_imports, caller
+                )
+                if sub_module is not None:
+                    self._add_edge(caller, sub_module, "from-list", optional)
 
     def _get_parent_by_name(self, name: str) -> Optional[Module]:
         """Return the parent module given the name of a module."""
@@ -169,16 +584,18 @@ class ModuleFinder:
         suffixes = importlib.machinery.all_suffixes()
 
         for path in module.path:
-            try:
-                filenames = os.listdir(path)
-            except OSError:
+            listing = self._path_index.list_dir(path)
+            if listing is None:
                 continue
 
-            for filename in filenames:
-                fullname = os.path.join(path, filename)
-                if os.path.isdir(fullname):
-                    init_file = os.path.join(fullname, "__init__.py")
-                    if not os.path.exists(init_file):
+            for filename in listing.names:
+                if filename in listing.dirs:
+                    sub_listing = self._path_index.list_dir(
+                        os.path.join(path, filename)
+                    )
+                    if sub_listing is None or (
+                        "__init__.py" not in sub_listing.files
+                    ):
                         continue
                     name = filename
                 else:
@@ -211,6 +628,9 @@ class ModuleFinder:
                         )
                 else:
                     module.global_names.add(name)
+                    self._add_edge(
+                        module, sub_module, "package-expansion", False
+                    )
                     if sub_module.path and recursive:
                         self._import_all_sub_modules(
                             sub_module, deferred_imports, recursive
@@ -222,7 +642,12 @@ class ModuleFinder:
         """Import any sub modules that were deferred, if applicable."""
         while deferred_imports:
             new_deferred_imports: DeferredList = []
-            for caller, package_module, sub_module_names in deferred_imports:
+            for (
+                caller,
+                package_module,
+                sub_module_names,
+                optional,
+            ) in deferred_imports:
                 if package_module.in_import and skip_in_import:
                     continue
                 self._ensure_from_list(
@@ -230,6 +655,7 @@ class ModuleFinder:
                     package_module,
                     sub_module_names,
                     new_deferred_imports,
+                    optional,
                 )
             deferred_imports = new_deferred_imports
             skip_in_import = True
@@ -374,9 +800,7 @@ class ModuleFinder:
         else:
             # Find modules to load
             try:
-                # It's recommended to clear the caches first.
-                importlib.machinery.PathFinder.invalidate_caches()
-                spec = importlib.machinery.PathFinder.find_spec(name, path)
+                spec = self._path_index.find_spec(name, path)
             except Exception:
                 spec = None
             if spec is None:
@@ -403,17 +827,12 @@ class ModuleFinder:
                 path = spec.origin
                 module = self._add_module(name, file_name=path, parent=parent)
 
+        scanned_code = scanned_ops = None
         if isinstance(loader, importlib.machinery.SourceFileLoader):
             logging.debug("Adding module [%s] [SOURCE]", name)
             # Load & compile Python source code
-            source_bytes = loader.get_data(path)
-            try:
-                module.code = loader.source_to_code(
-                    source_bytes, path, _optimize=self.optimize_flag
-                )
-            except SyntaxError:
-                logging.debug("Invalid syntax in [%s]", name)
-                raise ImportError(f"Invalid syntax in {path}", name=name)
+            module.code, scanned_ops = self._compile_source(name, path)
+            scanned_code = module.code
         elif isinstance(loader, importlib.machinery.SourcelessFileLoader):
             logging.debug("Adding module [%s] [BYTECODE]", name)
             # Load Python bytecode
@@ -429,11 +848,21 @@ class ModuleFinder:
         self._run_hook("load", module.name, module)
 
         if module.code is not None:
+            # Scan the module code for import statements; the operations
+            # scanned before are reused unless a hook replaced the code
+            if module.code is not scanned_code:
+                scanned_ops = None
+                if scanned_code is not None and self._analyses:
+                    scanned_ops = self._scan_replaced_code(
+                        path, scanned_code, module.code
+                    )
+            elif self.jobs > 1:
+                self._prefetch_imports(scanned_ops)
             if self.replace_paths:
                 module.code = self._replace_paths_in_code(module)
-
-            # Scan the module code for import statements
-            self._scan_code(module.code, module, deferred_imports)
+            self._scan_code(
+                module.code, module, deferred_imports, ops=scanned_ops
+            )
 
             # Verify __package__ in use
             module.code = self._replace_package_in_code(module)
@@ -441,6 +870,56 @@ class ModuleFinder:
         module.in_import = False
         return module
 
+    def _prefetch_imports(self, ops: List[tuple]) -> None:
+        """
+        Submit the source files of the modules imported absolutely by the
+        scanned code to the worker processes, so they are compiled and
+        scanned while the importing module is processed; only top level
+        modules and submodules of packages already found are considered.
+        """
+        for op, *args in ops:
+            if op != IMPORT_NAME or args[1] != 0:
+                continue
+            if args[3] is not None and evaluate_guard(args[3]) is False:
+                continue
+            name = args[0]
+            if name in self._modules or name in self._builtin_modules:
+                continue
+            parent_name, _, _ = name.rpartition(".")
+            if parent_name:
+                parent = self._modules.get(parent_name)
+                if parent is None or parent.path is None:
+                    continue
+                path = parent.path
+            else:
+                path = self.path
+            try:
+                spec = self._path_index.find_spec(name, path)
+            except Exception:
+                continue
+            if spec is not None and isinstance(
+                spec.loader, importlib.machinery.SourceFileLoader
+            ):
+                self._submit_source(spec.origin)
+
+    def _prefetch_package(self, module: Module) -> None:
+        """
+        Submit the source files of the package and its subpackages to the
+        worker processes, so they are compiled and scanned in parallel while
+        the package is imported, one submodule at a time, in the usual order.
+        """
+        source_suffixes = tuple(importlib.machinery.SOURCE_SUFFIXES)
+        for package_dir in module.path:
+            for dir_path, dir_names, file_names in os.walk(package_dir):
+                dir_names[:] = [
+                    n
+                    for n in sorted(dir_names)
+                    if os.path.exists(os.path.join(dir_path, n, "__init__.py"))
+                ]
+                for file_name in sorted(file_names):
+                    if file_name.endswith(source_suffixes):
+                        self._submit_source(os.path.join(dir_path, file_name))
+
     def _replace_package_in_code(self, module: Module) -> CodeType:
         """
         Replace the value of __package__ directly in the code,
@@ -519,47 +998,95 @@ class ModuleFinder:
     def _run_hook(self, hook: str, module_name: str, *args) -> None:
         """
         Run hook (load or missing) for the given module if one is present.
+        The modules the hook includes are recorded as imported by the module
+        (or by the caller of the missing module).
         """
         name = "{}_{}".format(hook, module_name.replace(".", "_"))
         method = getattr(self._hooks, name, None)
         if method is not None:
-            method(self, *args)
+            hook_module = self._hook_module
+            self._hook_module = args[0]
+            try:
+                method(self, *args)
+            finally:
+                self._hook_module = hook_module
+
+    def _submit_source(self, path: str) -> None:
+        """Submit the source file to be compiled and scanned by a worker;
+        once the finder is closed, source files are compiled in-process."""
+        if self._closed or path in self._pending:
+            return
+        if self._scan_cache is not None and self._scan_cache.contains(
+            path, self.optimize_flag, self._analyses
+        ):
+            return
+        if self._executor is None:
+            if sys.version_info[:2] < (3, 7):
+                self._executor = ProcessPoolExecutor(max_workers=self.jobs)
+            else:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.jobs, mp_context=self._mp_context
+                )
+        self._pending[path] = self._executor.submit(
+            _compile_and_scan, path, self.optimize_flag, self._analyses
+        )
+
+    def _scan_replaced_code(
+        self, path: str, source_code: CodeType, code: CodeType
+    ) -> List[tuple]:
+        """
+        Return the operations found when scanning the code which a hook put
+        in place of the code compiled from the source file, analysing the
+        source again: the guards and optional imports found by line number
+        still apply to the code objects kept from the compiled code, but not
+        to those which the hook added.
+        """
+        _, analysis = _compile_file(path, self.optimize_flag, self._analyses)
+        analysed_keys = _get_code_keys(source_code)
+        return _scan_code_ops(
+            code, analysis=analysis, analysed_keys=analysed_keys
+        )
 
     def _scan_code(
         self,
         code,
         module: Module,
         deferred_imports: DeferredList,
-        top_level: bool = True,
+        ops: Optional[List[tuple]] = None,
     ):
         """
         Scan code, looking for imported modules and keeping track of the
         constants that have been created in order to better tell which
-        modules are truly missing.
+        modules are truly missing. The operations may be given when the
+        code was already scanned (e.g. when it was found in the cache).
+        Imports in code which does not run on this platform, according to
+        their guards, are skipped and recorded in the module.
         """
-        arguments = []
+        if ops is None:
+            ops = _scan_code_ops(code)
         imported_module = None
-        for _index, op, arg in dis._unpack_opargs(code.co_code):
-
-            # keep track of constants (these are used for importing)
-            # immediately restart loop so arguments are retained
-            if op == LOAD_CONST:
-                arguments.append(code.co_consts[arg])
-                continue
+        for op, *args in ops:
 
             # import statement: attempt to import module
             if op == IMPORT_NAME:
-                name = code.co_names[arg]
-                if len(arguments) >= 2:
-                    relative_import_index, from_list = arguments[-2:]
-                else:
-                    relative_import_index = -1
-                    from_list = arguments[0] if arguments else []
-                if name not in module.exclude_names:
+                name, relative_import_index, from_list, guard, optional = args
+                if guard is not None and evaluate_guard(guard) is False:
+                    imported_module = None
+                    if relative_import_index > 0:
+                        name = "." * relative_import_index + name
+                    module.dead_imports.add(name)
+                elif name not in module.exclude_names:
                     imported_module = self._import_module(
                         name, deferred_imports, module, relative_import_index
                     )
                     if imported_module is not None:
+                        if name in self.aliases:
+                            kind = "alias"
+                        elif from_list == ("*",):
+                            kind = "star"
+                        else:
+                            kind = "import"
+                        self._add_edge(module, imported_module, kind, optional)
                         if (
                             from_list
                             and from_list != ("*",)
@@ -570,29 +1097,16 @@ class ModuleFinder:
                                 imported_module,
                                 from_list,
                                 deferred_imports,
+                                optional,
                             )
 
             # import * statement: copy all global names
-            elif (
-                op == IMPORT_STAR and top_level and imported_module is not None
-            ):
+            elif op == IMPORT_STAR and imported_module is not None:
                 module.global_names.update(imported_module.global_names)
 
             # store operation: track only top level
-            elif top_level and op in STORE_OPS:
-                name = code.co_names[arg]
-                module.global_names.add(name)
-
-            # reset arguments; these are only needed for import statements so
-            # ignore them in all other cases!
-            arguments = []
-
-        # Scan the code objects from function & class definitions
-        for constant in code.co_consts:
-            if isinstance(constant, type(code)):
-                self._scan_code(
-                    constant, module, deferred_imports, top_level=False
-                )
+            elif op == STORE_NAME:
+                module.global_names.add(args[0])
 
     def AddAlias(self, name: str, alias_for: str) -> None:
         """
@@ -604,6 +1118,20 @@ class ModuleFinder:
     def AddConstant(self, name: str, value: str) -> None:
         self.constants_module.values[name] = value
 
+    def Close(self) -> None:
+        """
+        Stop the worker processes used to compile and scan source files in
+        parallel, discarding any work that was submitted but is not needed;
+        the modules found later are compiled in-process.
+        """
+        self._closed = True
+        if self._executor is not None:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            self._executor.shutdown()
+            self._executor = None
+
     def ExcludeDependentFiles(self, filename: str) -> None:
         self.exclude_dependent_files[filename] = None
 
@@ -612,10 +1140,18 @@ class ModuleFinder:
         self.excludes[name] = None
         self._modules[name] = None
 
-    def IncludeFile(self, path: str, name: Optional[str] = None) -> Module:
-        """Include the named file as a module in the frozen executable."""
+    def IncludeFile(
+        self, path: str, name: Optional[str] = None, cache: bool = True
+    ) -> Module:
+        """
+        Include the named file as a module in the frozen executable; files
+        generated for a single build should not be stored in the scan cache
+        (cache=False), where they would never be found again.
+        """
         if name is None:
             name = os.path.splitext(os.path.basename(path))[0]
+        if not cache:
+            self._uncached_paths.add(path)
         deferred_imports: DeferredList = []
         module = self._load_module(name, path, deferred_imports)
         self._import_deferred_imports(deferred_imports)
@@ -629,6 +1165,8 @@ class ModuleFinder:
     ) -> None:
         """Include the files in the given directory in the target build."""
         self.include_files.append((source_path, target_path))
+        if self._hook_module is not None:
+            self.include_file_hooks[source_path] = self._hook_module.name
         if not copy_dependent_files:
             self.ExcludeDependentFiles(source_path)
 
@@ -636,6 +1174,8 @@ class ModuleFinder:
         """Include the named module in the frozen executable."""
         deferred_imports: DeferredList = []
         module = self._import_module(name, deferred_imports)
+        if module is not None and self._hook_module is not None:
+            self._add_edge(self._hook_module, module, "hook", False)
         self._import_deferred_imports(deferred_imports, skip_in_import=True)
         return module
 
@@ -645,7 +1185,11 @@ class ModuleFinder:
         """
         deferred_imports: DeferredList = []
         module = self._import_module(name, deferred_imports)
+        if self._hook_module is not None:
+            self._add_edge(self._hook_module, module, "hook", False)
         if module.path:
+            if self.jobs > 1:
+                self._prefetch_package(module)
             self._import_all_sub_modules(module, deferred_imports)
         self._import_deferred_imports(deferred_imports, skip_in_import=True)
         return module
@@ -664,6 +1208,20 @@ class ModuleFinder:
                 "This is not necessarily a problem - the modules "
                 "may not be needed on this platform.\n"
             )
+        names = {
+            name
+            for module in self.modules
+            for name in module.dead_imports
+            if not name.startswith(".")
+            and self._modules.get(name) is None
+            and name not in self._bad_modules
+        }
+        if names:
+            print(
+                "Modules skipped, imported only in code which does not run "
+                "on this platform:"
+            )
+            print(", ".join(sorted(names)), end="\n\n")
 
     def SetOptimizeFlag(self, optimize_flag):
         """Set a new value of optimize flag and returns the previous value."""
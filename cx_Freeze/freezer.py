@@ -2,7 +2,9 @@
 Base class for freezing scripts into executables.
 """
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import datetime
+import functools
 from distutils.dist import DistributionMetadata
 import distutils.sysconfig
 from importlib.util import MAGIC_NUMBER
@@ -14,22 +16,47 @@ import socket
 import stat
 import string
 import struct
+import subprocess
 import sys
 import sysconfig
 import tempfile
 import time
-from typing import Any, Dict, List, Optional
+from types import CodeType
+from typing import Any, Dict, List, Optional, Tuple, Union
 import uuid
 import zipfile
 
+from .archive import ArchiveWriter, IndexedArchiveWriter
+from .cache import DependencyCache
 from .common import (
     ConfigError,
     get_resource_file_path,
+    parse_size,
     process_path_specs,
     validate_args,
 )
+from .copytools import copy_file, list_tree
 from .darwintools import DarwinFile, MachOReference, DarwinFileTracker
+from .elftools import DT_RPATH, ELFError, ELFFile, LibraryResolver
 from .finder import ModuleFinder
+from .graph import ImportGraph
+from .importprofile import (
+    find_unused_modules,
+    read_import_order,
+    read_import_profiles,
+)
+from .manifest import MANIFEST_NAME, BuildManifest
+from .runtimeconfig import (
+    format_runtime_config,
+    parse_runtime_config,
+    write_runtime_config,
+)
+from .sizereport import (
+    SIZE_REPORT_NAME,
+    SizeReport,
+    iter_indexed_archive,
+    iter_zip_entries,
+)
 
 if sys.platform == "win32":
     import cx_Freeze.util
@@ -40,6 +67,9 @@ STRINGREPLACE = list(
     string.whitespace + string.punctuation.replace(".", "").replace("_", "")
 )
 
+# the library search path set in executables on Linux (see _SetSearchPath)
+EXE_SEARCH_PATH = "$ORIGIN/lib:$ORIGIN"
+
 
 class Freezer:
     def __init__(
@@ -65,6 +95,26 @@ class Freezer:
         includeMSVCR: bool = False,
         zipIncludePackages: Optional[List[str]] = None,
         zipExcludePackages: Optional[List[str]] = ["*"],
+        cacheDir: Optional[str] = None,
+        jobs: int = 1,
+        incremental: bool = False,
+        hardlink: bool = False,
+        indexedArchive: bool = False,
+        traceStartup: bool = False,
+        importProfiles: Optional[List[str]] = None,
+        pruneModules: bool = False,
+        pruneAllowlist: Optional[List[str]] = None,
+        hotArchive: bool = False,
+        lazyPackages: Optional[List[str]] = None,
+        lazyExcludes: Optional[List[str]] = None,
+        runtimeConfig: Optional[Union[Dict[str, Any], List[str]]] = None,
+        staticGuards: bool = False,
+        sizeReport: Optional[str] = None,
+        graphOutput: Optional[str] = None,
+        explainModules: Optional[List[str]] = None,
+        optionalReport: bool = False,
+        optionalSizeLimit: Optional[Union[int, str]] = None,
+        optionalAllowlist: Optional[List[str]] = None,
     ):
         self.executables = list(executables)
         self.constantsModule = constantsModule or ConstantsModule()
@@ -93,6 +143,28 @@ class Freezer:
         self.metadata = metadata
         self.zipIncludePackages = list(zipIncludePackages or [])
         self.zipExcludePackages = list(zipExcludePackages or [])
+        self.cacheDir = cacheDir
+        self.jobs = jobs if jobs > 0 else (os.cpu_count() or 1)
+        self.incremental = incremental
+        self.hardlink = hardlink
+        self.indexedArchive = indexedArchive
+        self.traceStartup = traceStartup
+        self.importProfiles = list(importProfiles or [])
+        self.pruneModules = pruneModules
+        self.pruneAllowlist = list(pruneAllowlist or [])
+        self.hotArchive = hotArchive
+        self.lazyPackages = list(lazyPackages or [])
+        self.lazyExcludes = list(lazyExcludes or [])
+        self.runtimeConfig = parse_runtime_config(runtimeConfig)
+        self.staticGuards = staticGuards
+        self.sizeReport = sizeReport
+        self.graphOutput = graphOutput
+        self.explainModules = list(explainModules or [])
+        self.optionalReport = optionalReport
+        self.optionalSizeLimit = optionalSizeLimit
+        if optionalSizeLimit is not None:
+            self.optionalSizeLimit = parse_size(optionalSizeLimit)
+        self.optionalAllowlist = list(optionalAllowlist or [])
         self._VerifyConfiguration()
 
     def _AddVersionResource(self, exe):
@@ -127,6 +199,10 @@ class Freezer:
         includeMode=False,
         relativeSource=False,
         machOReference: Optional[MachOReference] = None,
+        searchPath: Optional[List[str]] = None,
+        mayLink: bool = True,
+        isExe: bool = False,
+        owner: Optional[str] = None,
     ):
         normalizedSource = os.path.normcase(os.path.normpath(source))
         normalizedTarget = os.path.normcase(os.path.normpath(target))
@@ -143,16 +219,23 @@ class Freezer:
             return
         if normalizedSource == normalizedTarget:
             return
-        self._RemoveFile(target)
         targetDir = os.path.dirname(target)
-        self._CreateDirectory(targetDir)
-        if not self.silent:
-            print(f"copying {source} -> {target}")
-        shutil.copyfile(source, target)
-        shutil.copystat(source, target)
-        if includeMode:
-            shutil.copymode(source, target)
+        if self.manifest is not None and self.manifest.is_copy_current(
+            source, target
+        ):
+            self.manifest.keep(target)
+        else:
+            self._CreateDirectory(targetDir)
+            if not self.silent:
+                print(f"copying {source} -> {target}")
+            args = (source, target, includeMode, mayLink, isExe)
+            if self.pendingCopies is not None:
+                self.pendingCopies.append(args)
+            else:
+                self._CopyFileData(*args)
         self.files_copied.add(normalizedTarget)
+        if owner is not None:
+            self.fileOwners[normalizedTarget] = owner
 
         newDarwinFile = None
         if sys.platform == "darwin":
@@ -197,10 +280,11 @@ class Freezer:
                         machOReference=newDarwinFile.getMachOReferenceForPath(
                             path=dependent_file
                         ),
+                        owner=owner,
                     )
             else:
                 for dependent_file in self._GetDependentFiles(
-                    source, darwinFile=newDarwinFile
+                    source, darwinFile=newDarwinFile, searchPath=searchPath
                 ):
                     if (
                         relativeSource
@@ -219,14 +303,187 @@ class Freezer:
                         target,
                         copyDependentFiles,
                         relativeSource=relativeSource,
+                        searchPath=searchPath,
+                        owner=owner,
                     )
 
+    def _CopyFileData(
+        self, source, target, includeMode=False, mayLink=True, isExe=False
+    ):
+        """Copy the file and record the copy."""
+        searchPathSet = self._CopyFileContents(
+            source, target, includeMode, mayLink, isExe
+        )
+        self._RecordCopy(source, target, searchPathSet)
+
+    def _CopyFileContents(
+        self, source, target, includeMode=False, mayLink=True, isExe=False
+    ):
+        """Copy the file using the fastest method available and return False
+        if the library search path of the copy could not be set; files which
+        are modified after being copied (mayLink=False or when the library
+        search path of ELF files is set) are never hard links. Only the
+        target is changed, so that this can be called by threads."""
+        self._RemoveFile(target)
+        searchPath = None
+        if self.elfResolver is not None:
+            searchPath = self._GetOriginSearchPath(source, isExe)
+            if searchPath is not None:
+                mayLink = False
+        copy_file(source, target, self.hardlink and mayLink, includeMode)
+        if searchPath is not None:
+            return self._SetSearchPath(target, searchPath, isExe)
+        return True
+
+    def _RecordCopy(self, source, target, searchPathSet):
+        """Record the copy made by _CopyFileContents."""
+        if not searchPathSet:
+            self.originRPath = False
+        if self.manifest is not None:
+            self.manifest.record_copy(source, target)
+
+    @staticmethod
+    def _GetOriginSearchPath(source, isExe):
+        """Return the library search path to set in the copy of the ELF file
+        (if it has one that must be changed) so that the libraries copied
+        with it are found relative to its location, not where they were
+        found at build time, without setting LD_LIBRARY_PATH. Executables get
+        a DT_RPATH with their directory and the lib directory, which is used
+        for all the libraries they load which have no DT_RUNPATH; libraries
+        keep their $ORIGIN relative entries and get their own directory."""
+        try:
+            elfFile = ELFFile(source)
+        except ELFError:
+            return None
+        if elfFile.raw_runpath is not None:
+            rawValue = elfFile.raw_runpath
+        elif elfFile.raw_rpath is not None:
+            rawValue = elfFile.raw_rpath
+        else:
+            return None
+        if isExe:
+            if elfFile.raw_rpath == EXE_SEARCH_PATH:
+                return None
+            return EXE_SEARCH_PATH
+        paths = [p for p in rawValue.split(":") if p]
+        originPaths = [
+            p for p in paths if p.startswith(("$ORIGIN", "${ORIGIN}"))
+        ]
+        if originPaths == paths:
+            return None
+        if not {"$ORIGIN", "${ORIGIN}"}.intersection(originPaths):
+            originPaths.append("$ORIGIN")
+        return ":".join(originPaths)
+
+    @staticmethod
+    def _SetSearchPath(target, value, isExe):
+        """Set the library search path of the copied ELF file in place and
+        return True, or return False if it cannot be set."""
+        mode = os.stat(target).st_mode
+        try:
+            if not mode & stat.S_IWUSR:
+                os.chmod(target, mode | stat.S_IWUSR)
+            elfFile = ELFFile(target)
+            tag = DT_RPATH if isExe else None
+            if elfFile.set_search_path(value, tag):
+                return True
+        except (ELFError, OSError):
+            pass
+        finally:
+            if not mode & stat.S_IWUSR:
+                os.chmod(target, mode)
+        print(
+            "*** WARNING *** unable to set the library search path of",
+            target,
+        )
+        return False
+
+    def _CopyPackageData(self, sourceDir, targetDir, ignore):
+        """Copy the data files of a package like shutil.copytree() does,
+        using a pool of threads; the files which are up to date are skipped
+        (in incremental builds, where the target directory exists)."""
+        copies = []
+        for source, target in list_tree(sourceDir, targetDir, ignore):
+            if self.manifest is not None and self.manifest.is_copy_current(
+                source, target
+            ):
+                self.manifest.keep(target)
+            else:
+                copies.append((source, target))
+        self._CopyFilesConcurrently(copies)
+
+    def _CopyPendingFiles(self):
+        """Perform the copies deferred by _CopyFile, using a pool of threads;
+        the target directories have already been created."""
+        pendingCopies = self.pendingCopies
+        self.pendingCopies = None
+        self._CopyFilesConcurrently(pendingCopies)
+
+    def _CopyFilesConcurrently(self, copies):
+        """Copy the files given by the arguments of _CopyFileData using a
+        pool of threads (if there is more than one job); the threads only
+        copy the files, the copies are recorded here."""
+        if not copies:
+            return
+        if self.jobs == 1 or len(copies) == 1:
+            for args in copies:
+                self._CopyFileData(*args)
+            return
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [
+                executor.submit(self._CopyFileContents, *args)
+                for args in copies
+            ]
+            for args, future in zip(copies, futures):
+                self._RecordCopy(args[0], args[1], future.result())
+
     def _CreateDirectory(self, path):
         if not os.path.isdir(path):
             if not self.silent:
                 print("creating directory %s" % path)
             os.makedirs(path)
 
+    def _ExcludeOptionalModules(self):
+        """Report the optional dependencies, the modules imported only where
+        ImportError is handled, with the size of the modules which are
+        included only because of each of them and, according to the size
+        limit and the allowlist, exclude those modules. The modules named in
+        the options and the scripts are never optional."""
+        modules = {module.name: module for module in self.finder.modules}
+        graph = self._GetImportGraph()
+        dependencies = []
+        for name, callers in graph.get_optional_dependencies().items():
+            names = graph.get_exclusive_modules([name])
+            size = sum(self._GetModuleSize(modules[n]) for n in names)
+            dependencies.append((size, name, callers, names))
+        dependencies.sort(key=lambda d: (-d[0], d[1]))
+        excluded = []
+        for size, name, callers, names in dependencies:
+            if any(
+                name == n or name.startswith(n + ".")
+                for n in self.optionalAllowlist
+            ):
+                continue
+            if self.optionalSizeLimit is None:
+                if self.optionalAllowlist:
+                    excluded.append(name)
+            elif size > self.optionalSizeLimit:
+                excluded.append(name)
+        excludedNames = graph.get_exclusive_modules(excluded)
+        self.excludeModules.update(dict.fromkeys(sorted(excludedNames)))
+        if self.silent or not dependencies:
+            return
+        print(
+            f"{len(dependencies)} optional dependencies (imported only where "
+            "ImportError is handled):"
+        )
+        for size, name, callers, names in dependencies:
+            action = ", excluded" if name in excluded else ""
+            print(
+                f"  {size / 1024:10.1f} KB  {name} ({len(names)} modules"
+                f"{action}) imported by {', '.join(callers)}"
+            )
+
     def _FreezeExecutable(self, exe):
         finder = self.finder
         finder.IncludeFile(exe.main_script, exe.main_module_name)
@@ -284,10 +541,26 @@ class Freezer:
             target_path,
             copyDependentFiles=False,
             includeMode=True,
+            mayLink=False,
+            isExe=True,
         )
         if not os.access(target_path, os.W_OK):
             mode = os.stat(target_path).st_mode
             os.chmod(target_path, mode | stat.S_IWUSR)
+        runtime_config = dict(self.runtimeConfig)
+        runtime_config.update(exe.runtime_config)
+        if write_runtime_config(
+            target_path, format_runtime_config(runtime_config)
+        ):
+            if self.manifest is not None:
+                self.manifest.record_copy(exe.base, target_path)
+        if self.elfResolver is not None:
+            try:
+                rpath = ELFFile(target_path).raw_rpath
+            except ELFError:
+                rpath = None
+            if rpath != EXE_SEARCH_PATH:
+                self.originRPath = False
 
         if self.includeMSVCR:
             self._IncludeMSVCR(exe)
@@ -371,83 +644,128 @@ class Freezer:
                 "/usr/lib64",
             ]
 
-    def _GetDependentFiles(self, path, darwinFile: DarwinFile = None) -> List:
+    def _GetDependentFiles(
+        self,
+        path,
+        darwinFile: DarwinFile = None,
+        searchPath: Optional[List[str]] = None,
+    ) -> List:
         """Return the file's dependencies using platform-specific tools (the
-        imagehlp library on Windows, otool on Mac OS X and ldd on Linux);
-        limit this list by the exclusion lists as needed"""
+        imagehlp library on Windows, otool on Mac OS X and the ELF reader of
+        cx_Freeze.elftools on Linux);
+        limit this list by the exclusion lists as needed; on Windows, the
+        directories in searchPath are also searched for dependencies"""
         path = os.path.normcase(path)
         dependentFiles = self.dependentFiles.get(path, [])
         if not dependentFiles:
-            if sys.platform == "win32":
-                if path.endswith((".exe", ".dll", ".pyd")):
-                    origPath = os.environ["PATH"]
-                    os.environ["PATH"] = (
-                        origPath + os.pathsep + os.pathsep.join(sys.path)
+            result = self._FindDependentFiles(path, darwinFile, searchPath)
+            dependentFiles = self._RecordDependentFiles(
+                path, searchPath, *result
+            )
+        return dependentFiles
+
+    def _FindDependentFiles(
+        self,
+        path,
+        darwinFile: DarwinFile = None,
+        searchPath: Optional[List[str]] = None,
+    ) -> Tuple[List[str], List[str], bool]:
+        """Return the dependencies of the file (with normalized case), the
+        names of those which cannot be found and whether they come from the
+        dependency cache, without recording them; except on Mac OS X, this
+        changes nothing in the freezer, so that it can be called by the
+        threads of _ResolveDependentFiles"""
+        missing = []
+        dependentFiles = []
+        cached = None
+        if self.dependencyCache is not None:
+            cached = self.dependencyCache.get(path, searchPath)
+        if cached is not None:
+            dependentFiles, missing = cached
+        elif sys.platform == "win32":
+            if path.endswith((".exe", ".dll", ".pyd")):
+                dllPath = os.pathsep.join(
+                    [os.environ["PATH"]] + (searchPath or []) + sys.path
+                )
+                try:
+                    dependentFiles = cx_Freeze.util.GetDependentFiles(
+                        path, dllPath
                     )
-                    try:
-                        dependentFiles = cx_Freeze.util.GetDependentFiles(path)
-                    except cx_Freeze.util.BindError as exc:
-                        # Sometimes this gets called when path is not actually a
-                        # library See issue 88
-                        print("error during GetDependentFiles() of ", end="")
-                        print(f"{path!r}: {exc!s}")
-                    os.environ["PATH"] = origPath
-            elif sys.platform == "darwin":
-                # if darwinFile is None (which means that _GetDependentFiles is being called
-                # outside of _CopyFile -- e.g., one of the preliminary calls in _FreezeExecutable),
-                # create a temporary DarwinFile object for the path, just so we can read
-                # its dependencies
-                if darwinFile is None:
-                    darwinFile = DarwinFile(
-                        originalFilePath=path, referencingFile=None
+                except cx_Freeze.util.BindError as exc:
+                    # Sometimes this gets called when path is not actually a
+                    # library See issue 88
+                    print("error during GetDependentFiles() of ", end="")
+                    print(f"{path!r}: {exc!s}")
+        elif sys.platform == "darwin":
+            # if darwinFile is None (which means that _GetDependentFiles is being called
+            # outside of _CopyFile -- e.g., one of the preliminary calls in _FreezeExecutable),
+            # create a temporary DarwinFile object for the path, just so we can read
+            # its dependencies
+            if darwinFile is None:
+                darwinFile = DarwinFile(
+                    originalFilePath=path, referencingFile=None
+                )
+            dependentFiles = darwinFile.getDependentFilePaths()
+
+            # cache the MachOReferences to the dependencies, so they can be
+            # called up later in _CopyFile if copying a dependency without
+            # an explicit reference provided (to assist in resolving @rpaths)
+            for reference in darwinFile.getMachOReferenceList():
+                if reference.isResolved():
+                    self.darwinTracker.cacheReferenceTo(
+                        sourcePath=reference.resolvedReferencePath,
+                        machOReference=reference
                     )
-                dependentFiles = darwinFile.getDependentFilePaths()
-
-                # cache the MachOReferences to the dependencies, so they can be
-                # called up later in _CopyFile if copying a dependency without
-                # an explicit reference provided (to assist in resolving @rpaths)
-                for reference in darwinFile.getMachOReferenceList():
-                    if reference.isResolved():
-                        self.darwinTracker.cacheReferenceTo(
-                            sourcePath=reference.resolvedReferencePath,
-                            machOReference=reference
-                        )
-            else:
-                if not os.access(path, os.X_OK):
-                    self.dependentFiles[path] = []
-                    return []
-                command = f"ldd {path!r}"
-                splitString = " => "
-                dependentFileIndex = 1
-                for line in os.popen(command):
-                    parts = line.expandtabs().strip().split(splitString)
-                    if len(parts) != 2:
-                        continue
-                    dependentFile = parts[dependentFileIndex].strip()
-                    if dependentFile == os.path.basename(path):
-                        continue
-                    if dependentFile in ("not found", "(file not found)"):
-                        fileName = parts[0]
-                        if fileName not in self.linkerWarnings:
-                            self.linkerWarnings[fileName] = None
-                            print("WARNING: cannot find %s" % fileName)
-                        continue
-                    if dependentFile.startswith("("):
-                        continue
-                    pos = dependentFile.find(" (")
-                    if pos >= 0:
-                        dependentFile = dependentFile[:pos].strip()
-                    if dependentFile:
-                        dependentFiles.append(dependentFile)
-
-            dependentFiles = [
-                os.path.normcase(f)
-                for f in dependentFiles
-                if self._ShouldCopyFile(f)
-            ]
-            self.dependentFiles[path] = dependentFiles
+        else:
+            dependentFiles, missing = self.elfResolver.get_dependent_files(
+                path
+            )
+        return dependentFiles, missing, cached is not None
+
+    def _RecordDependentFiles(
+        self,
+        path,
+        searchPath: Optional[List[str]],
+        dependentFiles: List[str],
+        missing: List[str],
+        fromCache: bool,
+    ) -> List:
+        """Record the dependencies of the file found by _FindDependentFiles,
+        warning about those which cannot be found, and return those which
+        should be copied."""
+        if not fromCache and self.dependencyCache is not None:
+            self.dependencyCache.put(path, dependentFiles, missing, searchPath)
+        for fileName in missing:
+            if fileName not in self.linkerWarnings:
+                self.linkerWarnings[fileName] = None
+                print("WARNING: cannot find %s" % fileName)
+
+        dependentFiles = [
+            os.path.normcase(f)
+            for f in dependentFiles
+            if self._ShouldCopyFile(f)
+        ]
+        self.dependentFiles[path] = dependentFiles
         return dependentFiles
 
+    @staticmethod
+    def _GetExtensionSearchPath(module) -> Optional[List[str]]:
+        """Return the directories searched for the dependencies of the
+        extension module besides the usual ones: the path of its package."""
+        if module.parent is not None:
+            return module.parent.path
+        return None
+
+    @staticmethod
+    def _GetModuleSize(module):
+        """Return the size of the module as stored: the size of its code
+        once marshalled or the size of the file of an extension module."""
+        if module.code is not None:
+            return len(marshal.dumps(module.code))
+        if module.file is not None and os.path.isfile(module.file):
+            return os.path.getsize(module.file)
+        return 0
+
     def _GetModuleFinder(self, argsSource=None):
         if argsSource is None:
             argsSource = self
@@ -461,14 +779,110 @@ class Freezer:
             self.zipIncludePackages,
             self.constantsModule,
             self.zipIncludes,
+            cache_dir=self.cacheDir,
+            jobs=self.jobs,
+            static_guards=self.staticGuards,
+            optional_imports=self._HasOptionalPolicy(),
         )
         finder.SetOptimizeFlag(self.optimizeFlag)
-        for name in self.includes:
-            finder.IncludeModule(name)
-        for name in self.packages:
-            finder.IncludePackage(name)
+        try:
+            for name in self.includes:
+                finder.IncludeModule(name)
+            for name in self.packages:
+                finder.IncludePackage(name)
+        except BaseException:
+            finder.Close()
+            raise
         return finder
 
+    def _GetImportGraph(self):
+        """Return the graph of the imports between the modules which are
+        not excluded, whose roots are the scripts, the modules named in the
+        options and the encodings package, whose modules needed depend on
+        the locale."""
+        names = [
+            module.name
+            for module in self.finder.modules
+            if module.name not in self.excludeModules
+        ]
+        roots = set(self.includes)
+        roots.add("__startup__")
+        for exe in self.executables:
+            roots.add(exe.main_module_name)
+            roots.add(exe.init_module_name)
+        for name in names:
+            if name.partition(".")[0] == "encodings" or any(
+                name == p or name.startswith(p + ".") for p in self.packages
+            ):
+                roots.add(name)
+        return ImportGraph(names, self.finder.edges, roots)
+
+    def _GetImportOrder(self):
+        """Return the rank of each module in the order of import given by
+        the import profiles, and the names of the top level modules and
+        packages which go to the hot archive (if written): those imported
+        according to the profiles, except those imported while starting,
+        before the hot archive is put in sys.path. Packages are not split
+        between archives, as their __path__ would only refer to one of
+        them, and the main script goes with its initscript, which loads it
+        from its own archive."""
+        order, startupNames = read_import_order(self.importProfiles)
+        for exe in self.executables:
+            if exe.init_module_name in order:
+                index = order.index(exe.init_module_name)
+                order.insert(index + 1, exe.main_module_name)
+        rank = {name: index for index, name in enumerate(order)}
+        startupTopNames = {name.partition(".")[0] for name in startupNames}
+        hotNames = {
+            name.partition(".")[0]
+            for name in order
+            if name.partition(".")[0] not in startupTopNames
+        }
+        return rank, hotNames
+
+    def _GetBootstrapModuleNames(self, modules):
+        """Return the names of the modules which are imported before the
+        finder of the indexed archive is installed (by Python during
+        initialization and by __startup__) and must therefore remain in the
+        zip file. These are found by importing __startup__ in an isolated
+        interpreter, since the modules found by following all of the imports
+        statically are many more than those actually needed; the encodings
+        package is always kept since the codecs needed depend on the locale.
+        """
+        script = (
+            "import sys; sys.path.insert(0, sys.argv[1]); "
+            "import __startup__; print('\\n'.join(sys.modules))"
+        )
+        initScriptDir = os.path.dirname(
+            get_resource_file_path("initscripts", "__startup__", ".py")
+        )
+        try:
+            output = subprocess.check_output(
+                [sys.executable, "-I", "-S", "-c", script, initScriptDir],
+                universal_newlines=True,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            # store everything in the zip file, as without the option
+            return {module.name for module in modules}
+        names = set(output.split())
+        names.update(
+            module.name
+            for module in modules
+            if module.name.split(".")[0] == "encodings"
+        )
+        return names
+
+    @staticmethod
+    def _GetPycData(header: bytes, code: CodeType) -> bytes:
+        return header + marshal.dumps(code)
+
+    def _HasOptionalPolicy(self):
+        return bool(
+            self.optionalReport
+            or self.optionalSizeLimit is not None
+            or self.optionalAllowlist
+        )
+
     def _IncludeMSVCR(self, exe):
         targetDir = self.targetDir
         for fullName in self.files_copied:
@@ -495,9 +909,103 @@ class Freezer:
                 print("m", end="")
             print(" {:<25} {}\n".format(module.name, module.file or ""))
 
+    def _PruneModules(self):
+        """Report the modules found which were never imported according to
+        the import profiles and, if requested, exclude them. The modules
+        named in the options and the scripts are always kept, as are the
+        modules in the allowlist, with their submodules, and the encodings
+        package, whose modules needed depend on the locale."""
+        used = read_import_profiles(self.importProfiles)
+        used.update(self.includes)
+        used.update(self.packages)
+        used.add("__startup__")
+        for exe in self.executables:
+            used.add(exe.main_module_name)
+            used.add(exe.init_module_name)
+        unused = find_unused_modules(
+            [module.name for module in self.finder.modules],
+            used,
+            self.pruneAllowlist + ["encodings"],
+        )
+        if self.pruneModules:
+            self.excludeModules.update(dict.fromkeys(unused))
+        if not self.silent and unused:
+            action = "excluded" if self.pruneModules else "not excluded"
+            print(
+                f"{len(unused)} modules were never imported according to "
+                f"the import profiles ({action}):"
+            )
+            for name in unused:
+                print("  ", name)
+
+    def _ResolveDependentFiles(self):
+        """Determine the dependencies of the extension modules and included
+        files and, recursively, of their dependencies, using a pool of
+        threads, before any of them are copied; the copies then find the
+        dependencies already resolved."""
+        sources = []
+        for module in self.finder.modules:
+            if module.name in self.excludeModules:
+                continue
+            # the extension modules of packages in the file system are
+            # copied with the package data, without their dependencies
+            if (
+                module.code is None
+                and module.file is not None
+                and not module.in_file_system
+            ):
+                searchPath = self._GetExtensionSearchPath(module)
+                sources.append((module.file, searchPath))
+        for sourceFileName, _ in self.finder.include_files:
+            if os.path.isdir(sourceFileName):
+                for path, dirNames, fileNames in os.walk(sourceFileName):
+                    for name in (".svn", "CVS"):
+                        if name in dirNames:
+                            dirNames.remove(name)
+                    for fileName in fileNames:
+                        sources.append((os.path.join(path, fileName), None))
+            else:
+                sources.append((sourceFileName, None))
+
+        excludeDependentFiles = self.finder.exclude_dependent_files
+        resolved = set()
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = {}
+
+            def submit(source, searchPath):
+                normalizedSource = os.path.normcase(source)
+                if (
+                    normalizedSource in resolved
+                    or source in excludeDependentFiles
+                ):
+                    return
+                resolved.add(normalizedSource)
+                future = executor.submit(
+                    self._FindDependentFiles,
+                    normalizedSource,
+                    searchPath=searchPath,
+                )
+                futures[future] = (normalizedSource, searchPath)
+
+            # the threads only find the dependencies; they are recorded here
+            for source, searchPath in sources:
+                submit(source, searchPath)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source, searchPath = futures.pop(future)
+                    dependentFiles = self._RecordDependentFiles(
+                        source, searchPath, *future.result()
+                    )
+                    for dependentFile in dependentFiles:
+                        submit(dependentFile, searchPath)
+
     def _RemoveFile(self, path):
         if os.path.exists(path):
-            os.chmod(path, stat.S_IWRITE)
+            # the file may be a hard link, whose mode is shared with the
+            # source; only Windows requires write access to remove a file
+            if sys.platform == "win32":
+                os.chmod(path, stat.S_IWRITE)
             os.remove(path)
 
     def _RemoveVersionNumbers(self, libName):
@@ -591,8 +1099,83 @@ class Freezer:
                     "package {} cannot be both included and "
                     "excluded from zip file".format(name)
                 )
+        if self.pruneModules and not self.importProfiles:
+            raise ConfigError(
+                "modules cannot be pruned without import profiles"
+            )
+        if self.hotArchive and not self.importProfiles:
+            raise ConfigError(
+                "the hot archive cannot be written without import profiles"
+            )
+        if self.hotArchive and self.indexedArchive:
+            raise ConfigError(
+                "the hot archive cannot be used with the indexed archive"
+            )
+
+    @staticmethod
+    def _GetExtensionFileName(module):
+        """Return the name of the file to which an extension module found in
+        a package stored in the zip file is copied (in the directory of the
+        zip file)."""
+        parts = module.name.split(".")[:-1]
+        parts.append(os.path.basename(module.file))
+        return ".".join(parts)
+
+    def _WriteImportGraph(self):
+        """Explain why the modules to explain are included, by the shortest
+        chain of imports leading to them from the main scripts (or else from
+        the other roots), and which modules would not be included if they
+        were excluded, and write the graph of the imports, with these
+        explanations, to the graph output (if given)."""
+        graph = self._GetImportGraph()
+        sources = [exe.main_module_name for exe in self.executables]
+        explanations = {}
+        for name in self.explainModules:
+            if name not in graph.names:
+                if not self.silent:
+                    print(f"{name} is not included")
+                continue
+            explanation = explanations[name] = graph.explain(name, sources)
+            if self.silent:
+                continue
+            steps = [
+                step["module"]
+                if step["kind"] == "root"
+                else f"{step['module']} ({step['kind']})"
+                for step in explanation["path"]
+            ]
+            others = [n for n in explanation["excluded"] if n != name]
+            print(f"{name} is included through: {' -> '.join(steps)}")
+            print(
+                f"  excluding it would also exclude {len(others)} modules"
+                + (": " + ", ".join(others) if others else "")
+            )
+        if self.graphOutput:
+            if not self.silent:
+                print("writing import graph", self.graphOutput)
+            graph.write(self.graphOutput, explanations)
 
     def _WriteModules(self, fileName, finder):
+        # the extension modules of packages stored in the zip file are
+        # recorded so that they can be found at runtime without a search
+        extensionModules = {}
+        for module in finder.modules:
+            if (
+                module.code is None
+                and module.file is not None
+                and module.parent is not None
+                and not module.in_file_system
+                and module.name not in self.excludeModules
+            ):
+                name = self._GetExtensionFileName(module)
+                extensionModules[module.name] = name
+        self.constantsModule.values["EXTENSION_MODULES"] = extensionModules
+        if self.traceStartup:
+            self.constantsModule.values["TRACE_STARTUP"] = True
+        if self.lazyPackages:
+            # the modules of these packages are executed when first used
+            self.constantsModule.values["LAZY_PACKAGES"] = self.lazyPackages
+            self.constantsModule.values["LAZY_EXCLUDES"] = self.lazyExcludes
         self.constantsModule.Create(finder)
         modules = [
             m for m in finder.modules if m.name not in self.excludeModules
@@ -611,14 +1194,74 @@ class Freezer:
             compress_type = zipfile.ZIP_DEFLATED
         else:
             compress_type = zipfile.ZIP_STORED
-        outFile = zipfile.PyZipFile(fileName, "w", compress_type)
+        outFile = ArchiveWriter(
+            fileName, compress_type, self.jobs, self.manifest
+        )
+        packageDataCopied = set()
+
+        # with the indexed archive, only the modules needed to install its
+        # finder are stored in the zip file
+        indexedArchive = None
+        indexedArchiveName = os.path.join(targetDir, "library.cxa")
+        if self.indexedArchive:
+            bootstrapNames = self._GetBootstrapModuleNames(modules)
+            indexedArchive = IndexedArchiveWriter(
+                indexedArchiveName, self.manifest
+            )
+        else:
+            self._RemoveFile(indexedArchiveName)
+
+        # with import profiles, the modules are stored in the order in which
+        # they are imported, so that they are read sequentially when
+        # starting; with the hot archive, those imported are stored in a
+        # separate archive, put in front of sys.path by __startup__
+        hotFile = None
+        hotFileName = os.path.join(targetDir, "library_hot.zip")
+        hotNames = set()
+        if self.importProfiles:
+            rank, hotNames = self._GetImportOrder()
+            modules.sort(key=lambda m: (rank.get(m.name, len(rank)), m.name))
+        if self.hotArchive:
+            hotFile = ArchiveWriter(
+                hotFileName, compress_type, self.jobs, self.manifest
+            )
+        else:
+            self._RemoveFile(hotFileName)
 
         filesToCopy = []
         ignorePatterns = shutil.ignore_patterns(
             "*.py", "*.pyc", "*.pyo", "__pycache__"
         )
+
+        # the directories of the subpackages excluded (by pruning) are not
+        # copied with the data of their parent package
+        excludedDirs = {
+            os.path.normcase(os.path.dirname(module.file))
+            for module in finder.modules
+            if module.name in self.excludeModules
+            and module.path is not None
+            and module.file is not None
+        }
+        if excludedDirs:
+            ignoreFiles = ignorePatterns
+
+            def ignorePatterns(path, names):
+                ignored = set(ignoreFiles(path, names))
+                ignored.update(
+                    name
+                    for name in names
+                    if os.path.normcase(os.path.join(path, name))
+                    in excludedDirs
+                )
+                return ignored
+
         for module in modules:
 
+            # the constants module is written once all the files are copied
+            # (see _WriteConstantsModule)
+            if module.name == self.constantsModule.module_name:
+                continue
+
             # determine if the module should be written to the file system;
             # a number of packages make the assumption that files that they
             # require will be found in a location relative to where
@@ -639,13 +1282,28 @@ class Freezer:
                 parts = module.name.split(".")
                 targetPackageDir = os.path.join(targetDir, *parts)
                 sourcePackageDir = os.path.dirname(module.file)
-                if not os.path.exists(targetPackageDir):
+                normalizedTarget = os.path.normcase(
+                    os.path.normpath(targetPackageDir)
+                )
+                self.packageDirs[normalizedTarget] = module.name
+                if self.manifest is not None:
+                    # the data of subpackages is copied with their parent
+                    parentName = module.name.rpartition(".")[0]
+                    if parentName not in packageDataCopied:
+                        if not self.silent:
+                            print(
+                                "Copying data from package",
+                                module.name + "...",
+                            )
+                        self._CopyPackageData(
+                            sourcePackageDir, targetPackageDir, ignorePatterns
+                        )
+                    packageDataCopied.add(module.name)
+                elif not os.path.exists(targetPackageDir):
                     if not self.silent:
                         print("Copying data from package", module.name + "...")
-                    shutil.copytree(
-                        sourcePackageDir,
-                        targetPackageDir,
-                        ignore=ignorePatterns,
+                    self._CopyPackageData(
+                        sourcePackageDir, targetPackageDir, ignorePatterns
                     )
 
             # if an extension module is found in a package that is to be
@@ -657,9 +1315,9 @@ class Freezer:
                 and module.file is not None
                 and not include_in_file_system
             ):
-                parts = module.name.split(".")[:-1]
-                parts.append(os.path.basename(module.file))
-                target = os.path.join(targetDir, ".".join(parts))
+                target = os.path.join(
+                    targetDir, self._GetExtensionFileName(module)
+                )
                 filesToCopy.append((module, target))
 
             # starting with Python 3.3 the pyc file format contains the source
@@ -677,7 +1335,9 @@ class Freezer:
                     header = MAGIC_NUMBER + struct.pack("<ii", mtime, size)
                 else:
                     header = MAGIC_NUMBER + struct.pack("<iii", 0, mtime, size)
-                data = header + marshal.dumps(module.code)
+                getData = functools.partial(
+                    self._GetPycData, header, module.code
+                )
 
             # if the module should be written to the file system, do so
             if include_in_file_system and module.file is not None:
@@ -691,84 +1351,313 @@ class Freezer:
                         target_name,
                         copyDependentFiles=True,
                         relativeSource=True,
+                        owner=module.name,
                     )
                 else:
                     if module.path is not None:
                         parts.append("__init__")
                     target_name = os.path.join(targetDir, *parts) + ".pyc"
-                    with open(target_name, "wb") as fp:
-                        fp.write(data)
+                    outFile.write_file(target_name, getData, module.file)
+                    normalizedTarget = os.path.normcase(
+                        os.path.normpath(target_name)
+                    )
+                    self.fileOwners[normalizedTarget] = module.name
 
-            # otherwise, write to the zip file
+            # otherwise, write to the indexed archive or the zip file
+            elif (
+                module.code is not None
+                and indexedArchive is not None
+                and module.name not in bootstrapNames
+            ):
+                indexedArchive.add_module(
+                    module.name, module.path is not None, module.code
+                )
             elif module.code is not None:
                 zipTime = time.localtime(mtime)[:6]
                 fileName = "/".join(module.name.split("."))
                 if module.path:
                     fileName += "/__init__"
                 zinfo = zipfile.ZipInfo(fileName + ".pyc", zipTime)
-                zinfo.compress_type = compress_type
-                outFile.writestr(zinfo, data)
+                if (
+                    hotFile is not None
+                    and module.name.partition(".")[0] in hotNames
+                ):
+                    hotFile.add_data(zinfo, getData)
+                else:
+                    outFile.add_data(zinfo, getData)
 
-            # put the distribution files metadata in the zip file
+            # put the distribution files metadata in the zip file, with the
+            # first module written which is provided by the distribution or
+            # requires it
             if module.dist_files:
                 for filepath, arcname in module.dist_files:
-                    if arcname not in outFile.namelist():
-                        outFile.write(filepath, arcname)
+                    if arcname not in self.distFileOwners:
+                        self.distFileOwners[arcname] = module.name
+                        outFile.add_file(filepath, arcname)
 
-        # write any files to the zip file that were requested specially
+        # write any files to the zip file that were requested specially; the
+        # data of the hot packages goes along with their modules, where it is
+        # looked up relative to __file__ or by the loader
         for sourceFileName, targetFileName in finder.zip_includes:
+            topLevelName = targetFileName.replace("\\", "/").split("/")[0]
+            if hotFile is not None and topLevelName in hotNames:
+                targetFile = hotFile
+            else:
+                targetFile = outFile
             if os.path.isdir(sourceFileName):
                 for dirPath, _, fileNames in os.walk(sourceFileName):
                     basePath = dirPath[len(sourceFileName) :]
                     targetPath = targetFileName + basePath.replace("\\", "/")
                     for name in fileNames:
-                        outFile.write(
+                        targetFile.add_file(
                             os.path.join(dirPath, name),
                             targetPath + "/" + name,
                         )
             else:
-                outFile.write(sourceFileName, targetFileName)
+                targetFile.add_file(sourceFileName, targetFileName)
 
-        outFile.close()
+        self.archives = [outFile, hotFile, indexedArchive]
 
         # Copy Python extension modules from the list built above.
-        origPath = os.environ["PATH"]
         for module, target in filesToCopy:
-            try:
-                if module.parent is not None:
-                    path = os.pathsep.join([origPath] + module.parent.path)
-                    os.environ["PATH"] = path
-                self._CopyFile(
-                    module.file,
-                    target,
-                    copyDependentFiles=True,
-                    relativeSource=True,
-                )
-            finally:
-                os.environ["PATH"] = origPath
+            self._CopyFile(
+                module.file,
+                target,
+                copyDependentFiles=True,
+                relativeSource=True,
+                searchPath=self._GetExtensionSearchPath(module),
+                owner=module.name,
+            )
+
+    def _WriteConstantsModule(self):
+        """Write the constants module to the zip file and close the archives.
+        This is done once all the files are copied, since only then is it
+        known whether the library search path was set in all of them."""
+        if self.elfResolver is not None:
+            # the executables find the libraries copied with them by
+            # themselves, without setting LD_LIBRARY_PATH
+            self.constantsModule.values["ORIGIN_RPATH"] = self.originRPath
+        module = self.constantsModule.Create(self.finder)
+        mtime = int(time.time())
+        if sys.version_info[:2] < (3, 7):
+            header = MAGIC_NUMBER + struct.pack("<ii", mtime, 0)
+        else:
+            header = MAGIC_NUMBER + struct.pack("<iii", 0, mtime, 0)
+        zinfo = zipfile.ZipInfo(
+            module.name + ".pyc", time.localtime(mtime)[:6]
+        )
+        outFile = self.archives[0]
+        outFile.add_data(
+            zinfo, functools.partial(self._GetPycData, header, module.code)
+        )
+        for archive in self.archives:
+            if archive is not None:
+                archive.close()
+
+    def _WriteSizeReport(self):
+        """Write the size report of the build (see SizeReport) as JSON to
+        the target directory, where it is found by cxfreeze-diff to compare
+        builds, and to the size report file, if given, printing a summary of
+        it. The items are attributed to the modules which caused their
+        inclusion: the modules stored in the archives or in the file system
+        with the data files of their packages, the extension modules with the
+        libraries they depend on and, for the files included by hooks, the
+        modules whose hooks included them."""
+        modules = {module.name: module for module in self.finder.modules}
+        hooks = self._GetImportGraph().get_hooks()
+
+        def normalize(path):
+            return os.path.normcase(os.path.normpath(path))
+
+        libDir = os.path.join(self.targetDir, "lib")
+        archives = {
+            normalize(os.path.join(libDir, name))
+            for name in ("library.zip", "library_hot.zip")
+        }
+        indexedArchive = normalize(os.path.join(libDir, "library.cxa"))
+        executables = {
+            normalize(os.path.join(self.targetDir, exe.target_name))
+            for exe in self.executables
+        }
+        reportName = os.path.join(self.targetDir, SIZE_REPORT_NAME)
+        skipped = {
+            os.path.abspath(reportName),
+            os.path.abspath(os.path.join(self.targetDir, MANIFEST_NAME)),
+        }
+        if self.sizeReport:
+            skipped.add(os.path.abspath(self.sizeReport))
+        targetDir = normalize(self.targetDir)
+
+        def findParent(path, paths):
+            while len(path) > len(targetDir):
+                if path in paths:
+                    return path
+                path = os.path.dirname(path)
+            return None
+
+        report = SizeReport()
+
+        def add(path, kind, size, compressedSize, moduleName, **kwargs):
+            module = modules.get(moduleName)
+            kwargs.setdefault("hook", hooks.get(moduleName))
+            report.add(
+                path,
+                kind,
+                size,
+                compressedSize,
+                moduleName,
+                module.distribution if module is not None else None,
+                **kwargs,
+            )
+
+        for dirPath, dirNames, fileNames in os.walk(self.targetDir):
+            dirNames.sort()
+            for fileName in sorted(fileNames):
+                fullName = os.path.join(dirPath, fileName)
+                if os.path.abspath(fullName) in skipped:
+                    continue
+                path = normalize(fullName)
+                relative = os.path.relpath(fullName, self.targetDir)
+                relative = relative.replace(os.sep, "/")
+                if path in archives:
+                    for name, size, compressedSize in iter_zip_entries(
+                        fullName
+                    ):
+                        if name.endswith(".pyc"):
+                            kind = "module"
+                            moduleName = name[: -len(".pyc")]
+                            if moduleName.endswith("/__init__"):
+                                moduleName = os.path.dirname(moduleName)
+                            moduleName = moduleName.replace("/", ".")
+                        else:
+                            kind = "data"
+                            moduleName = self.distFileOwners.get(name)
+                        add(
+                            f"{relative}/{name}",
+                            kind,
+                            size,
+                            compressedSize,
+                            moduleName,
+                        )
+                    continue
+                if path == indexedArchive:
+                    for name, size in iter_indexed_archive(fullName):
+                        add(f"{relative}/{name}", "module", size, None, name)
+                    continue
+                kwargs = {}
+                moduleName = self.fileOwners.get(path)
+                hookTarget = findParent(path, self.hookTargets)
+                if hookTarget is not None:
+                    hook = self.hookTargets[hookTarget]
+                    moduleName = moduleName or hook
+                    kwargs["hook"] = hook
+                packageDir = findParent(path, self.packageDirs)
+                if packageDir is not None:
+                    moduleName = moduleName or self.packageDirs[packageDir]
+                    directory = os.path.relpath(packageDir, targetDir)
+                    kwargs["directory"] = directory.replace(os.sep, "/")
+                module = modules.get(moduleName)
+                if path in executables:
+                    kind = "executable"
+                elif fileName.endswith(".pyc"):
+                    kind = "module"
+                elif (
+                    module is not None
+                    and module.code is None
+                    and module.file is not None
+                    and os.path.basename(module.file) == fileName
+                ):
+                    kind = "extension"
+                elif (
+                    fileName.endswith((".dll", ".dylib", ".pyd", ".so"))
+                    or ".so." in fileName
+                ):
+                    kind = "library"
+                else:
+                    kind = "data"
+                size = os.path.getsize(fullName)
+                add(relative, kind, size, None, moduleName, **kwargs)
+
+        report.write(reportName)
+        if self.sizeReport:
+            report.write(self.sizeReport)
+            if not self.silent:
+                print("writing size report", self.sizeReport)
+                print(report.format_summary(), end="")
 
     def Freeze(self):
         self.finder = None
         self.excludeModules = {}
         self.dependentFiles = {}  # type: Dict[Any, List]
         self.files_copied = set()
+        # the modules which caused the inclusion of the files copied, by
+        # normalized target path, the packages written to the file system
+        # and the modules whose hooks included files, by normalized target
+        # path of the directory or file (for the size report)
+        self.fileOwners = {}  # type: Dict[str, str]
+        self.packageDirs = {}  # type: Dict[str, str]
+        self.hookTargets = {}  # type: Dict[str, str]
+        # the modules with which the distribution files were written, by
+        # archive name
+        self.distFileOwners = {}  # type: Dict[str, str]
         self.linkerWarnings = {}
         self.msvcRuntimeDir = None
 
         self.darwinTracker = None  # type: Optional[DarwinFileTracker]
         if sys.platform == "darwin":
             self.darwinTracker = DarwinFileTracker()
+        self.elfResolver = None  # type: Optional[LibraryResolver]
+        if sys.platform not in ("win32", "darwin"):
+            self.elfResolver = LibraryResolver()
+        self.originRPath = True
+        self.archives = []  # type: List[Optional[Any]]
+        # the dependencies of Mach-O files are tracked by DarwinFile objects
+        # which need to be created for each build
+        self.dependencyCache = None  # type: Optional[DependencyCache]
+        if self.cacheDir is not None and sys.platform != "darwin":
+            self.dependencyCache = DependencyCache(self.cacheDir)
+
+        self.pendingCopies = None  # type: Optional[List]
+        self.manifest = None  # type: Optional[BuildManifest]
+        if self.incremental:
+            self.manifest = BuildManifest(self.targetDir)
 
         self.finder = self._GetModuleFinder()
-        for executable in self.executables:
-            self._FreezeExecutable(executable)
+        try:
+            for executable in self.executables:
+                self._FreezeExecutable(executable)
+        finally:
+            # the worker processes of the finder are no longer needed once
+            # all the modules are found
+            self.finder.Close()
+        if self.importProfiles:
+            self._PruneModules()
+        if self._HasOptionalPolicy():
+            self._ExcludeOptionalModules()
+        if self.graphOutput or self.explainModules:
+            self._WriteImportGraph()
+
+        # with multiple jobs, resolve all the dependencies first and then
+        # copy the extension modules, included files and their dependencies
+        # concurrently (the dependencies of Mach-O files are resolved while
+        # copying, as they need to be tracked by DarwinFile objects)
+        if self.jobs > 1:
+            if sys.platform != "darwin":
+                self._ResolveDependentFiles()
+            self.pendingCopies = []
         targetDir = self.targetDir
         zipTargetDir = os.path.join(targetDir, "lib")
         fileName = os.path.join(zipTargetDir, "library.zip")
-        self._RemoveFile(fileName)
+        if self.manifest is None:
+            self._RemoveFile(fileName)
         self._WriteModules(fileName, self.finder)
 
         for sourceFileName, targetFileName in self.finder.include_files:
+            owner = self.finder.include_file_hooks.get(sourceFileName)
+            if owner is not None:
+                fullName = os.path.join(targetDir, targetFileName)
+                normalizedName = os.path.normcase(os.path.normpath(fullName))
+                self.hookTargets[normalizedName] = owner
             if os.path.isdir(sourceFileName):
                 # Copy directories by recursing into them.
                 # Can't use shutil.copytree because we may need dependencies
@@ -790,6 +1679,7 @@ class Freezer:
                             fullTargetName,
                             copyDependentFiles=True,
                             relativeSource=True,
+                            owner=owner,
                         )
             else:
                 # Copy regular files.
@@ -799,10 +1689,21 @@ class Freezer:
                     fullName,
                     copyDependentFiles=True,
                     relativeSource=True,
+                    owner=owner,
                 )
+        self._CopyPendingFiles()
+
         # do a final pass to clean up dependency references in Mach-O files.
         if sys.platform == "darwin":
             self.darwinTracker.finalizeReferences()
+        self._WriteConstantsModule()
+
+        if self.manifest is not None:
+            for path in self.manifest.remove_stale():
+                if not self.silent:
+                    print("removing stale file", path)
+            self.manifest.save()
+        self._WriteSizeReport()
         return
 
 
@@ -813,6 +1714,7 @@ class Executable:
     _internal_name: str
     _name: str
     _ext: str
+    _runtime_config: Dict[str, Any]
 
     def __init__(
         self,
@@ -825,6 +1727,7 @@ class Executable:
         shortcut_dir: Optional[str] = None,
         copyright: Optional[str] = None,
         trademarks: Optional[str] = None,
+        runtime_config: Optional[Union[Dict[str, Any], List[str]]] = None,
         *,
         initScript: Optional[str] = None,
         targetName: Optional[str] = None,
@@ -848,6 +1751,7 @@ class Executable:
         )
         self.copyright = copyright
         self.trademarks = trademarks
+        self.runtime_config = runtime_config
 
     def __repr__(self):
         return f"<Executable script={self.main_script}>"
@@ -883,6 +1787,14 @@ class Executable:
     def main_module_name(self) -> str:
         return f"{self._internal_name}__main__"
 
+    @property
+    def runtime_config(self) -> Dict[str, Any]:
+        return self._runtime_config
+
+    @runtime_config.setter
+    def runtime_config(self, config):
+        self._runtime_config = parse_runtime_config(config)
+
     @property
     def target_name(self) -> str:
         return self._name + self._ext
@@ -952,7 +1864,7 @@ class ConstantsModule:
         today = datetime.datetime.today()
         source_timestamp = 0
         for module in finder.modules:
-            if module.file is None:
+            if module.file is None or module.name == self.module_name:
                 continue
             if module.source_is_zip_file:
                 continue
@@ -975,7 +1887,7 @@ class ConstantsModule:
         filename = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4()}.py")
         with open(filename, "w") as fp:
             fp.write("\n".join(source_parts))
-        module = finder.IncludeFile(filename, self.module_name)
+        module = finder.IncludeFile(filename, self.module_name, cache=False)
         os.remove(filename)
         return module
 
@@ -0,0 +1,266 @@
+"""
+The graph of the imports between the modules found by the finder (see
+ModuleFinder.edges), used to explain why modules are included (the shortest
+chain of imports leading to them and the modules which go with them) and to
+find the optional dependencies, imported only where ImportError is handled.
+"""
+
+from collections import deque
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+__all__ = ["EDGE_KINDS", "ImportGraph"]
+
+Edges = Dict[Tuple[str, str, str], bool]
+Path = List[Tuple[str, str]]
+
+# the kinds of edges: the import statements (import x), the names of the
+# from list which are submodules (from x import y), the import * statements
+# (from x import *), the imports of aliases (see ModuleFinder.AddAlias), the
+# modules included by the hooks of the modules and the submodules of the
+# packages included with all of their submodules; every module is also
+# implicitly imported by its parent package ("parent" in the paths)
+EDGE_KINDS = (
+    "import",
+    "from-list",
+    "star",
+    "alias",
+    "hook",
+    "package-expansion",
+)
+
+
+def _matches(name: str, names: Iterable[str]) -> bool:
+    """Return True if the module is one of the names or a submodule."""
+    return any(name == n or name.startswith(n + ".") for n in names)
+
+
+class ImportGraph:
+    """
+    The modules and the imports between them, as (caller, module, kind)
+    and whether they are optional; every module also depends on its parent
+    package. The roots are the modules given and the modules which none of
+    the others import (the scripts, for example).
+    """
+
+    def __init__(
+        self, names: Iterable[str], edges: Edges, roots: Iterable[str] = ()
+    ):
+        self.names: Set[str] = set(names)
+        self.imports: Dict[str, List[Tuple[str, str, bool]]] = {
+            name: [] for name in self.names
+        }
+        self.callers: Dict[str, List[Tuple[str, str, bool]]] = {
+            name: [] for name in self.names
+        }
+        for (caller, name, kind), optional in sorted(edges.items()):
+            if caller == name or not self.names.issuperset((caller, name)):
+                continue
+            self.imports[caller].append((name, kind, optional))
+            self.callers[name].append((caller, kind, optional))
+        self.roots: Set[str] = {n for n in self.names if not self.callers[n]}
+        self.roots.update(n for n in roots if n in self.names)
+
+    def _iter_imports(self, name: str):
+        """Yield the modules the module imports, with the kind of the import
+        and whether it is optional, starting with its parent package."""
+        parent = name.rpartition(".")[0]
+        if parent in self.names:
+            yield parent, "parent", False
+        yield from self.imports[name]
+
+    def _get_reachable(self, follow: Callable[[str, bool], bool]) -> Set[str]:
+        """Return the modules reachable from the roots, following only the
+        imports of the modules (given their name and whether they are
+        optional) for which follow returns True."""
+        reached = set()
+        stack = sorted(n for n in self.roots if follow(n, False))
+        while stack:
+            name = stack.pop()
+            if name in reached:
+                continue
+            reached.add(name)
+            for imported, _, optional in self._iter_imports(name):
+                if imported not in reached and follow(imported, optional):
+                    stack.append(imported)
+        return reached
+
+    def get_shortest_path(
+        self, name: str, sources: Optional[Iterable[str]] = None
+    ) -> Optional[Path]:
+        """Return the shortest chain of imports from the sources (by default,
+        the roots) to the module, as the modules and the kind of the import
+        of each one ("root" for the first), or None if there is none."""
+        if sources is None:
+            sources = self.roots
+        sources = sorted(n for n in sources if n in self.names)
+        previous: Dict[str, Optional[Tuple[str, str]]] = dict.fromkeys(
+            sources
+        )
+        queue = deque(sources)
+        while queue:
+            current = queue.popleft()
+            if current == name:
+                break
+            for imported, kind, _ in self._iter_imports(current):
+                if imported not in previous:
+                    previous[imported] = (current, kind)
+                    queue.append(imported)
+        if name not in previous:
+            return None
+        path = []
+        while previous[name] is not None:
+            caller, kind = previous[name]
+            path.append((name, kind))
+            name = caller
+        path.append((name, "root"))
+        path.reverse()
+        return path
+
+    def get_hooks(self) -> Dict[str, str]:
+        """Return the modules whose hooks caused the inclusion of the other
+        modules, according to the shortest chains of imports leading to
+        them, for the modules which were included by a hook."""
+        hooks = {}
+        reached = set(self.roots)
+        queue = deque(sorted(self.roots))
+        while queue:
+            current = queue.popleft()
+            for imported, kind, _ in self._iter_imports(current):
+                if imported in reached:
+                    continue
+                reached.add(imported)
+                if kind == "hook":
+                    hooks[imported] = current
+                elif current in hooks:
+                    hooks[imported] = hooks[current]
+                queue.append(imported)
+        return hooks
+
+    def get_excluded_modules(self, names: Iterable[str]) -> Set[str]:
+        """Return the modules which would not be included if the given
+        modules were excluded, with their submodules: those and the modules
+        which are imported only through them."""
+        names = list(names)
+        reached = self._get_reachable(lambda name, optional: True)
+        return reached - self._get_reachable(
+            lambda name, optional: not _matches(name, names)
+        )
+
+    def get_optional_dependencies(self) -> Dict[str, List[str]]:
+        """Return the modules included only because they are imported
+        optionally, with the modules which import them optionally; their
+        submodules are left out, being excluded along with them."""
+        required = self._get_reachable(lambda name, optional: not optional)
+        dependencies = {}
+        for name in sorted(self.names - required):
+            callers = [c for c, _, optional in self.callers[name] if optional]
+            if callers and not _matches(name, dependencies):
+                dependencies[name] = sorted(set(callers))
+        return dependencies
+
+    def get_exclusive_modules(self, names: Iterable[str]) -> Set[str]:
+        """Return the modules which would not be included if the optional
+        imports of the given modules and their submodules were not made."""
+        names = list(names)
+        reached = self._get_reachable(lambda name, optional: True)
+        return reached - self._get_reachable(
+            lambda name, optional: not (optional and _matches(name, names))
+        )
+
+    def explain(
+        self, name: str, sources: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
+        """Return why the module is included, as the shortest chain of
+        imports leading to it from the sources, or else from the roots, and
+        which modules would not be included if it were excluded."""
+        path = None
+        if sources is not None:
+            path = self.get_shortest_path(name, sources)
+        if path is None:
+            path = self.get_shortest_path(name)
+        return {
+            "path": [{"module": n, "kind": kind} for n, kind in path or []],
+            "excluded": sorted(self.get_excluded_modules([name])),
+        }
+
+    def to_dict(
+        self, explanations: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """Return the graph (and the explanations of explain, by module) as
+        a dictionary which can be dumped as JSON."""
+        data = {
+            "modules": sorted(self.names),
+            "roots": sorted(self.roots),
+            "edges": [
+                {
+                    "caller": caller,
+                    "module": name,
+                    "kind": kind,
+                    "optional": optional,
+                }
+                for caller in sorted(self.imports)
+                for name, kind, optional in self.imports[caller]
+            ],
+        }
+        if explanations:
+            data["explanations"] = explanations
+        return data
+
+    def to_dot(
+        self, explanations: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> str:
+        """Return the graph in the DOT language of Graphviz, with the roots
+        in bold, the optional imports dashed and, for the explanations of
+        explain, the chains of imports in red and the modules which would
+        not be included filled in grey."""
+        explanations = explanations or {}
+        highlighted = set()
+        excluded = set()
+        for explanation in explanations.values():
+            path = [step["module"] for step in explanation["path"]]
+            highlighted.update(zip(path, path[1:]))
+            excluded.update(explanation["excluded"])
+        lines = ["digraph imports {", "  node [shape=box];"]
+        for name in sorted(self.names):
+            attributes = []
+            if name in self.roots:
+                attributes.append("style=bold")
+            if name in excluded:
+                attributes.append('style=filled, fillcolor="grey"')
+            if attributes:
+                lines.append(f'  "{name}" [{", ".join(attributes)}];')
+        edges = set()
+        for caller in sorted(self.imports):
+            for name, kind, optional in self.imports[caller]:
+                if (caller, name) in edges:
+                    continue
+                edges.add((caller, name))
+                attributes = [f'label="{kind}"']
+                if optional:
+                    attributes.append("style=dashed")
+                if (caller, name) in highlighted:
+                    attributes.append("color=red")
+                lines.append(
+                    f'  "{caller}" -> "{name}" [{", ".join(attributes)}];'
+                )
+        for caller, name in sorted(highlighted - edges):
+            lines.append(
+                f'  "{caller}" -> "{name}" [label="parent", color=red];'
+            )
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    def write(
+        self,
+        path: str,
+        explanations: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> None:
+        """Write the graph to the file, in the DOT language if its extension
+        is .dot or .gv and as JSON otherwise."""
+        if path.lower().endswith((".dot", ".gv")):
+            contents = self.to_dot(explanations)
+        else:
+            contents = json.dumps(self.to_dict(explanations), indent=1)
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.write(contents)
@@ -0,0 +1,318 @@
+"""
+Static analysis of the conditions guarding the import statements, such as
+"if sys.platform == 'win32':" or "if TYPE_CHECKING:", used by the finder to
+skip the imports in code which never runs on the platform the executables
+are built for, and of the import statements which are optional, that is
+which are in the body of a try statement handling ImportError.
+
+Guards are stored as nested tuples (so that they can be cached with the
+scanned code) of the following forms:
+    ("compare", subject, operator, value)  e.g. sys.platform == "win32"
+    ("startswith", subject, prefixes)      e.g. sys.platform.startswith("w")
+    ("TYPE_CHECKING",)                     typing.TYPE_CHECKING
+    ("not", guard), ("and", *guards), ("or", *guards)
+    ("unknown",)                           any other condition
+where subject is one of "sys.platform", "os.name" or "sys.version_info".
+"""
+
+import ast
+import operator
+import os
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+__all__ = ["evaluate_guard", "find_import_guards", "find_optional_imports"]
+
+UNKNOWN = ("unknown",)
+
+SUBJECTS = ("sys.platform", "os.name", "sys.version_info")
+
+OPERATORS = {
+    ast.Eq: "==",
+    ast.NotEq: "!=",
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+    ast.In: "in",
+    ast.NotIn: "not in",
+}
+
+OPERATOR_FUNCTIONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda a, b: a in b,
+    "not in": lambda a, b: a not in b,
+}
+
+# the operators to use when the subject is on the right side
+REFLECTED_OPERATORS = {"<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+# the exceptions which, when handled, make the imports of a try optional
+IMPORT_ERRORS = (
+    "ImportError",
+    "ModuleNotFoundError",
+    "Exception",
+    "BaseException",
+)
+
+# the values of the subjects on the platform the executables are built for
+BUILD_TARGET = {
+    "sys.platform": sys.platform,
+    "os.name": os.name,
+    "sys.version_info": tuple(sys.version_info),
+}
+
+
+def _get_dotted_name(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        value = _get_dotted_name(node.value)
+        if value is not None:
+            return f"{value}.{node.attr}"
+    return None
+
+
+def _get_constant(node: ast.AST) -> Any:
+    """Return the value of a string or tuple constant, or raise
+    ValueError."""
+    try:
+        value = ast.literal_eval(node)
+    except (TypeError, SyntaxError):
+        raise ValueError(node) from None
+    if isinstance(value, (str, tuple)):
+        return value
+    raise ValueError(value)
+
+
+def _parse_guard(node: ast.AST, names: Dict[str, Tuple]) -> Tuple:
+    """Return the guard for the condition (see the module docstring); the
+    names are the module level variables set to a guard."""
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        guard = _parse_guard(node.operand, names)
+        return UNKNOWN if guard == UNKNOWN else ("not", guard)
+    if isinstance(node, ast.BoolOp):
+        kind = "and" if isinstance(node.op, ast.And) else "or"
+        return (kind,) + tuple(_parse_guard(v, names) for v in node.values)
+    name = _get_dotted_name(node)
+    if name is not None:
+        if name in ("TYPE_CHECKING", "typing.TYPE_CHECKING"):
+            return ("TYPE_CHECKING",)
+        return names.get(name, UNKNOWN)
+    if isinstance(node, ast.Compare) and len(node.ops) == 1:
+        op = OPERATORS.get(type(node.ops[0]))
+        left, right = node.left, node.comparators[0]
+        if op is None:
+            return UNKNOWN
+        subject = _get_dotted_name(left)
+        if subject not in SUBJECTS and op not in ("in", "not in"):
+            subject = _get_dotted_name(right)
+            left, right = right, left
+            op = REFLECTED_OPERATORS.get(op, op)
+        if subject not in SUBJECTS:
+            return UNKNOWN
+        try:
+            return ("compare", subject, op, _get_constant(right))
+        except ValueError:
+            return UNKNOWN
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "startswith"
+        and len(node.args) == 1
+        and not node.keywords
+    ):
+        subject = _get_dotted_name(node.func.value)
+        if subject in ("sys.platform", "os.name"):
+            try:
+                return ("startswith", subject, _get_constant(node.args[0]))
+            except ValueError:
+                return UNKNOWN
+    return UNKNOWN
+
+
+def _iter_statements(statements: List[ast.stmt]) -> Iterator[ast.stmt]:
+    """Yield the statements and the statements they contain."""
+    for node in statements:
+        yield node
+        for field in ("body", "orelse", "handlers", "finalbody"):
+            yield from _iter_statements(getattr(node, field, []))
+        for case in getattr(node, "cases", []):
+            yield from _iter_statements(case.body)
+
+
+def _iter_assigned_names(node: ast.stmt) -> Iterator[str]:
+    """Yield the names of the variables the statement assigns (except
+    within expressions, such as by assignment expressions)."""
+    if isinstance(node, ast.Assign):
+        targets = node.targets
+    elif isinstance(
+        node, (ast.AugAssign, ast.AnnAssign, ast.For, ast.AsyncFor)
+    ):
+        targets = [node.target]
+    elif isinstance(node, (ast.With, ast.AsyncWith)):
+        targets = [item.optional_vars for item in node.items]
+    elif isinstance(node, (ast.Import, ast.ImportFrom)):
+        for alias in node.names:
+            yield (alias.asname or alias.name).partition(".")[0]
+        return
+    elif isinstance(
+        node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+    ):
+        yield node.name
+        return
+    else:
+        return
+    for target in targets:
+        if isinstance(target, ast.Name):
+            yield target.id
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                if isinstance(element, ast.Name):
+                    yield element.id
+
+
+def _find_guard_names(tree: ast.Module) -> Dict[str, Tuple]:
+    """Return the module level variables set to a guard, such as
+    WINDOWS = sys.platform == "win32", and never assigned again."""
+    counts = {}
+    for node in _iter_statements(tree.body):
+        for name in _iter_assigned_names(node):
+            counts[name] = counts.get(name, 0) + 1
+    names = {}
+    for node in tree.body:
+        if (
+            isinstance(node, ast.Assign)
+            and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name)
+            and counts[node.targets[0].id] == 1
+        ):
+            guard = _parse_guard(node.value, names)
+            if guard != UNKNOWN:
+                names[node.targets[0].id] = guard
+    return names
+
+
+def _visit(
+    statements: List[ast.stmt],
+    guards: List[Tuple],
+    names: Dict[str, Tuple],
+    found: Dict[int, Optional[Tuple]],
+) -> None:
+    for node in statements:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            guard = ("and",) + tuple(guards) if guards else None
+            if node.lineno not in found:
+                found[node.lineno] = guard
+            elif found[node.lineno] is not None and guard is not None:
+                # imports on the same line run if either guard holds
+                found[node.lineno] = ("or", found[node.lineno], guard)
+            else:
+                found[node.lineno] = None
+        elif isinstance(node, ast.If):
+            guard = _parse_guard(node.test, names)
+            if guard == UNKNOWN:
+                _visit(node.body, guards, names, found)
+                _visit(node.orelse, guards, names, found)
+            else:
+                _visit(node.body, guards + [guard], names, found)
+                _visit(node.orelse, guards + [("not", guard)], names, found)
+        else:
+            # compound statements (match statements have cases)
+            for field in ("body", "orelse", "handlers", "finalbody"):
+                _visit(getattr(node, field, []), guards, names, found)
+            for case in getattr(node, "cases", []):
+                _visit(case.body, guards, names, found)
+
+
+def find_import_guards(tree: ast.Module) -> Dict[int, Tuple]:
+    """Return the guards of the import statements of the module, keyed by
+    line number, for the import statements in guarded code only."""
+    found = {}
+    _visit(tree.body, [], _find_guard_names(tree), found)
+    return {line: guard for line, guard in found.items() if guard is not None}
+
+
+def _handles_import_error(node: ast.Try) -> bool:
+    for handler in node.handlers:
+        if handler.type is None:
+            return True
+        types = handler.type
+        if isinstance(types, ast.Tuple):
+            types = types.elts
+        else:
+            types = [types]
+        for exc_type in types:
+            name = _get_dotted_name(exc_type)
+            if name and name.rpartition(".")[2] in IMPORT_ERRORS:
+                return True
+    return False
+
+
+def find_optional_imports(tree: ast.Module) -> Set[int]:
+    """Return the line numbers of the import statements which are optional,
+    in the body of a try statement handling ImportError (directly or by
+    handling one of its base classes)."""
+    found = set()
+    required = set()
+
+    def visit(statements: List[ast.stmt], optional: bool) -> None:
+        for node in statements:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                (found if optional else required).add(node.lineno)
+            elif isinstance(node, ast.Try) or type(node).__name__ == "TryStar":
+                visit(node.body, optional or _handles_import_error(node))
+                for handler in node.handlers:
+                    visit(handler.body, optional)
+                visit(node.orelse, optional)
+                visit(node.finalbody, optional)
+            else:
+                for field in ("body", "orelse", "handlers", "finalbody"):
+                    visit(getattr(node, field, []), optional)
+                for case in getattr(node, "cases", []):
+                    visit(case.body, optional)
+
+    visit(tree.body, False)
+    return found - required
+
+
+def evaluate_guard(
+    guard: Tuple, target: Optional[Dict[str, Any]] = None
+) -> Optional[bool]:
+    """Return the value of the guard on the platform the executables are
+    built for (or on the given target), or None if it cannot be known."""
+    if target is None:
+        target = BUILD_TARGET
+    kind = guard[0]
+    if kind == "TYPE_CHECKING":
+        return False
+    if kind == "compare":
+        _, subject, op, value = guard
+        try:
+            return OPERATOR_FUNCTIONS[op](target[subject], value)
+        except (KeyError, TypeError):
+            return None
+    if kind == "startswith":
+        _, subject, prefixes = guard
+        try:
+            return target[subject].startswith(prefixes)
+        except (KeyError, TypeError, AttributeError):
+            return None
+    if kind == "not":
+        value = evaluate_guard(guard[1], target)
+        return None if value is None else not value
+    if kind in ("and", "or"):
+        values = [evaluate_guard(g, target) for g in guard[1:]]
+        if kind == "and":
+            if False in values:
+                return False
+            return None if None in values else True
+        if True in values:
+            return True
+        return None if None in values else False
+    return None
@@ -0,0 +1,103 @@
+"""
+The import profiles written by the executables built with the trace_startup
+option (see StartupTracer in initscripts/__startup__.py), used to find the
+modules included in a build which are never imported when it runs and to
+store the modules in the archives in the order in which they are imported.
+"""
+
+import glob
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from .common import ConfigError
+
+__all__ = ["read_import_order", "read_import_profiles", "find_unused_modules"]
+
+
+def _add_parents(names: Set[str]) -> None:
+    for name in list(names):
+        while "." in name:
+            name = name.rpartition(".")[0]
+            names.add(name)
+
+
+def _read_profiles(paths: Iterable[str]) -> Iterator[Dict]:
+    """Yield the given profiles and the profiles found in the given
+    directories, with the records of the modules imported successfully in
+    the order in which their import started."""
+    for path in paths:
+        if os.path.isdir(path):
+            file_names = sorted(glob.glob(os.path.join(path, "*.json")))
+        else:
+            file_names = [path]
+        for file_name in file_names:
+            try:
+                with open(file_name, encoding="utf-8") as fp:
+                    data = json.load(fp)
+                imports = [
+                    record
+                    for record in data.get("imports", [])
+                    if "error" not in record
+                ]
+                imports.sort(key=lambda record: record.get("start_us", 0))
+                profile = {
+                    "modules": list(data.get("modules", [])),
+                    "modules_before_tracer": list(
+                        data.get("modules_before_tracer", [])
+                    ),
+                    "imports": [record["name"] for record in imports],
+                }
+            except (OSError, ValueError, AttributeError, KeyError) as exc:
+                raise ConfigError(
+                    f"Cannot read import profile {file_name!r}: {exc}"
+                ) from None
+            yield profile
+
+
+def read_import_profiles(paths: Iterable[str]) -> Set[str]:
+    """Return the names of the modules imported according to the given
+    profiles, or to the profiles found in the given directories, including
+    the packages which contain them."""
+    names = set()
+    for profile in _read_profiles(paths):
+        names.update(profile["modules"])
+        names.update(profile["modules_before_tracer"])
+        names.update(profile["imports"])
+    _add_parents(names)
+    return names
+
+
+def read_import_order(paths: Iterable[str]) -> Tuple[List[str], Set[str]]:
+    """Return the names of the modules imported once the tracer was
+    installed according to the given profiles, in the order in which they
+    were first imported (by the first profile which imported them), and the
+    names of the modules imported before, while starting. The import of a
+    submodule starts before the import of its parent packages, but they are
+    loaded first, so they come first."""
+    order = {}
+    before = set()
+    for profile in _read_profiles(paths):
+        before.update(profile["modules_before_tracer"])
+        for name in profile["imports"]:
+            parts = name.split(".")
+            for i in range(1, len(parts) + 1):
+                order.setdefault(".".join(parts[:i]), len(order))
+    return [name for name in order if name not in before], before
+
+
+def find_unused_modules(
+    module_names: Iterable[str], used: Set[str], allowlist: Iterable[str]
+) -> List[str]:
+    """Return the names of the modules which are neither used nor allowed by
+    the allowlist, which names modules kept along with their submodules; the
+    packages containing the modules kept are kept as well."""
+    prefixes = tuple(name + "." for name in allowlist)
+    allowed = set(allowlist)
+    kept = {
+        name
+        for name in module_names
+        if name in used or name in allowed or name.startswith(prefixes)
+    }
+    _add_parents(kept)
+    return sorted(name for name in module_names if name not in kept)
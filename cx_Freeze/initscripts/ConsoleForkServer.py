@@ -0,0 +1,450 @@
+"""
+Initialization script for cx_Freeze which runs the main script in a process
+forked from a server that has already started Python and imported the
+modules the application needs, instead of starting from scratch each time.
+This is meant for command line tools invoked very often, on POSIX systems.
+
+The first invocation starts the server in the background, then runs the
+script normally. The server listens on a UNIX domain socket, private to the
+user and specific to the build of the executable, and exits after being idle
+for a while. Later invocations send their arguments, environment, working
+directory and standard streams to the server, which forks a process to run
+the script with them, and exit with the exit status of that process; they
+fall back to running the script normally if the server is not available.
+
+The server is configured with constants (see the constants option):
+FORK_SERVER_PRELOAD, the names of the modules to import in the server
+separated by spaces or commas, and FORK_SERVER_IDLE_TIMEOUT, the number of
+seconds after which an idle server exits (600 by default). Setting the
+environment variable CX_FREEZE_FORK_SERVER to 0 disables the server.
+"""
+
+import os
+import sys
+
+import BUILD_CONSTANTS
+import __startup__
+
+sys.frozen = True
+
+__startup__.set_data_environment()
+
+IDLE_TIMEOUT = float(getattr(BUILD_CONSTANTS, "FORK_SERVER_IDLE_TIMEOUT", 600))
+HANDSHAKE_TIMEOUT = 60.0
+FORWARDED_SIGNALS = ("SIGINT", "SIGTERM", "SIGHUP", "SIGQUIT", "SIGUSR1")
+
+# messages sent by the server: the pid of the process running the script,
+# its exit status (negative if killed by a signal) or a version mismatch
+MSG_PID = b"P"
+MSG_STATUS = b"S"
+MSG_MISMATCH = b"V"
+MSG_SIZE = 5
+
+
+def _get_preload_modules():
+    value = getattr(BUILD_CONSTANTS, "FORK_SERVER_PRELOAD", None) or ()
+    if isinstance(value, str):
+        value = value.replace(",", " ").split()
+    return list(value)
+
+
+def _get_version():
+    """Return a string which changes whenever the executable is rebuilt."""
+    parts = [os.path.realpath(sys.executable)]
+    paths = [sys.executable] + [p for p in sys.path if p.endswith(".zip")]
+    zip_dir = __startup__._get_zip_dir()
+    if zip_dir is not None:
+        # the archives are rewritten alone by incremental builds
+        for name in (
+            __startup__.INDEXED_ARCHIVE_NAME,
+            __startup__.HOT_ARCHIVE_NAME,
+        ):
+            path = os.path.join(zip_dir, name)
+            if path not in paths and os.path.exists(path):
+                paths.append(path)
+    for path in paths:
+        st = os.stat(path)
+        parts.append(f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}")
+    return "|".join(parts)
+
+
+def _get_socket_path(version):
+    """Return the path of the socket of the server, in a directory only
+    accessible by the user, or None if there is no such directory."""
+    import zlib
+
+    base_dir = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get(
+        "TMPDIR", "/tmp"
+    )
+    uid = os.getuid()
+    socket_dir = os.path.join(base_dir, f"cx_Freeze-{uid}")
+    try:
+        os.mkdir(socket_dir, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(socket_dir)
+    if st.st_uid != uid or st.st_mode & 0o077 or not os.path.isdir(socket_dir):
+        return None
+    name = os.path.basename(sys.executable)
+    digest = zlib.crc32(version.encode(errors="surrogateescape"))
+    path = os.path.join(socket_dir, f"{name}-{digest:08x}.sock")
+    if len(os.fsencode(path)) > 100:
+        return None
+    return path
+
+
+def _exit_status(code):
+    """Return the exit status for the code of SystemExit, like Python."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code & 0xFF
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _run_main():
+    __startup__.run_main(__name__, __loader__)
+
+
+def _recv_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError("connection closed")
+        data += chunk
+    return data
+
+
+# client
+
+
+def _run_in_server():
+    """Run the script in a process forked from the server and return its
+    exit status or None if the script was not run (the server is not
+    running, in which case it is started, or is not usable)."""
+    import array
+    import marshal
+    import signal
+    import socket
+    import struct
+
+    version = _get_version()
+    path = _get_socket_path(version)
+    if path is None:
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            server_running = False
+        else:
+            server_running = True
+        if not server_running:
+            _start_server(path, version)
+            return None
+        sock.settimeout(HANDSHAKE_TIMEOUT)
+        request = marshal.dumps(
+            (version, sys.argv, dict(os.environb), os.getcwdb())
+        )
+        fds = array.array("i", [0, 1, 2])
+        sock.sendmsg(
+            [struct.pack("<I", len(request))],
+            [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)],
+        )
+        sock.sendall(request)
+        try:
+            kind, pid = struct.unpack("<ci", _recv_exactly(sock, MSG_SIZE))
+        except (EOFError, OSError, struct.error):
+            return None
+        if kind != MSG_PID:
+            return None
+
+        # the script is running: forward signals to it and wait for it
+        def forward(signum, _):
+            try:
+                os.killpg(pid, signum)
+            except OSError:
+                pass
+
+        for name in FORWARDED_SIGNALS:
+            signal.signal(getattr(signal, name), forward)
+        sock.settimeout(None)
+        try:
+            kind, status = struct.unpack("<ci", _recv_exactly(sock, MSG_SIZE))
+        except (EOFError, OSError):
+            # the script has run, at least partly: do not run it again
+            return 1
+        return status
+    finally:
+        sock.close()
+
+
+def _start_server(path, version):
+    """Start the server in the background, in a process forked from this
+    one before running anything and detached from it."""
+    pid = os.fork()
+    if pid:
+        os.waitpid(pid, 0)
+        return
+    try:
+        os.setsid()
+        if os.fork():
+            os._exit(0)
+        os.chdir("/")
+        null_fd = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(null_fd, fd)
+        os.close(null_fd)
+        _serve(path, version)
+    finally:
+        os._exit(0)
+
+
+# server
+
+
+def _bind(path):
+    """Return the listening socket or None if a server is already running."""
+    import socket
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        listener.bind(path)
+    except OSError:
+        # the socket of a server which did not exit cleanly?
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            listener.bind(path)
+        else:
+            listener.close()
+            return None
+        finally:
+            probe.close()
+    listener.listen(64)
+    return listener
+
+
+def _receive_request(conn, version):
+    """Return the file descriptors and the request sent by the client, or
+    None if the request cannot be served by this server."""
+    import array
+    import marshal
+    import socket
+    import struct
+
+    if hasattr(socket, "SO_PEERCRED"):
+        creds = conn.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+        _, uid, _ = struct.unpack("3i", creds)
+        if uid != os.getuid():
+            return None
+    conn.settimeout(HANDSHAKE_TIMEOUT)
+    fds = array.array("i")
+    data, ancdata, _, _ = conn.recvmsg(4, socket.CMSG_SPACE(3 * fds.itemsize))
+    for level, kind, cmsg_data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cmsg_data[: len(cmsg_data) // 4 * 4])
+    try:
+        if len(data) != 4 or len(fds) != 3:
+            return None
+        (size,) = struct.unpack("<I", data)
+        client_version, argv, env, cwd = marshal.loads(
+            _recv_exactly(conn, size)
+        )
+        if client_version != version:
+            conn.sendall(struct.pack("<ci", MSG_MISMATCH, 0))
+            return None
+    except BaseException:
+        for fd in fds:
+            os.close(fd)
+        raise
+    conn.settimeout(None)
+    return list(fds), argv, env, cwd
+
+
+def _serve(path, version):
+    import selectors
+    import signal
+    import socket
+    import struct
+    import time
+
+    listener = _bind(path)
+    if listener is None:
+        return
+    socket_stat = os.stat(path)
+    wakeup_r, wakeup_w = socket.socketpair()
+    wakeup_w.setblocking(False)
+    signal.set_wakeup_fd(wakeup_w.fileno())
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+
+    # connections are accepted once the modules are imported; clients
+    # connecting in the meantime wait for them instead of starting servers
+    for name in _get_preload_modules():
+        try:
+            __import__(name)
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    selector.register(wakeup_r, selectors.EVENT_READ)
+    workers = {}  # pid -> connection to the client
+    last_active = time.monotonic()
+    try:
+        while True:
+            timeout = None
+            if not workers:
+                timeout = last_active + IDLE_TIMEOUT - time.monotonic()
+                if timeout <= 0:
+                    break
+            for key, _ in selector.select(timeout):
+                if key.fileobj is wakeup_r:
+                    wakeup_r.recv(4096)
+                    continue
+                if key.fileobj is not listener:
+                    # the client went away before the script ended
+                    selector.unregister(key.fileobj)
+                    try:
+                        os.killpg(key.data, signal.SIGHUP)
+                    except OSError:
+                        pass
+                    continue
+                conn, _ = listener.accept()
+                try:
+                    request = _receive_request(conn, version)
+                except (OSError, EOFError, ValueError, TypeError):
+                    request = None
+                if request is None:
+                    conn.close()
+                    continue
+                fds = request[0]
+                pid = os.fork()
+                if pid == 0:
+                    selector.close()
+                    listener.close()
+                    wakeup_r.close()
+                    wakeup_w.close()
+                    for other_conn in workers.values():
+                        other_conn.close()
+                    conn.close()
+                    _run_worker(*request)
+                for fd in fds:
+                    os.close(fd)
+                try:
+                    conn.sendall(struct.pack("<ci", MSG_PID, pid))
+                except OSError:
+                    pass
+                workers[pid] = conn
+                selector.register(conn, selectors.EVENT_READ, pid)
+
+            # report the exit status of the processes which ended
+            for pid in list(workers):
+                ended_pid, wait_status = os.waitpid(pid, os.WNOHANG)
+                if ended_pid == 0:
+                    continue
+                conn = workers.pop(pid)
+                if os.WIFSIGNALED(wait_status):
+                    status = -os.WTERMSIG(wait_status)
+                else:
+                    status = os.WEXITSTATUS(wait_status)
+                try:
+                    conn.sendall(struct.pack("<ci", MSG_STATUS, status))
+                except OSError:
+                    pass
+                if conn.fileno() in selector.get_map():
+                    selector.unregister(conn)
+                conn.close()
+                last_active = time.monotonic()
+    finally:
+        # unless it was replaced by the socket of another server
+        try:
+            if os.path.samestat(os.stat(path), socket_stat):
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+def _run_worker(fds, argv, env, cwd):
+    """Run the script in the process forked by the server, with the standard
+    streams, environment, working directory and arguments of the client."""
+    import atexit
+    import signal
+
+    status = 1
+    try:
+        os.setpgid(0, 0)
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        for target_fd, fd in enumerate(fds):
+            os.dup2(fd, target_fd)
+            os.close(fd)
+        sys.stdin = sys.__stdin__ = open(0, closefd=False)
+        sys.stdout = sys.__stdout__ = open(
+            1, "w", 1 if os.isatty(1) else -1, closefd=False
+        )
+        sys.stderr = sys.__stderr__ = open(
+            2, "w", 1, errors="backslashreplace", closefd=False
+        )
+        os.environ.clear()
+        os.environb.update(env)
+        os.chdir(cwd)
+        sys.argv = argv
+        try:
+            _run_main()
+            status = 0
+        except SystemExit as exc:
+            status = _exit_status(exc.code)
+        except KeyboardInterrupt:
+            sys.excepthook(*sys.exc_info())
+            status = -signal.SIGINT
+        except BaseException:  # pylint: disable=broad-except
+            sys.excepthook(*sys.exc_info())
+        atexit._run_exitfuncs()
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:  # pylint: disable=broad-except
+                pass
+        if status < 0:
+            signal.signal(-status, signal.SIG_DFL)
+            os.kill(os.getpid(), -status)
+        os._exit(status)
+
+
+def _can_use_server():
+    if os.environ.get("CX_FREEZE_FORK_SERVER") == "0":
+        return False
+    if not hasattr(os, "fork") or not hasattr(os, "setpgid"):
+        return False
+    import socket
+
+    return hasattr(socket, "AF_UNIX") and hasattr(socket, "SCM_RIGHTS")
+
+
+def run():
+    status = None
+    if _can_use_server():
+        try:
+            status = _run_in_server()
+        except OSError:
+            pass
+    if status is None:
+        _run_main()
+        return
+    if status < 0:
+        import signal
+
+        # the script was killed by a signal, and so is this process
+        signal.signal(-status, signal.SIG_DFL)
+        os.kill(os.getpid(), -status)
+        status = 128 - status
+    raise SystemExit(status)
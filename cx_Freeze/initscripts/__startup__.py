@@ -1,8 +1,10 @@
 """
-This is the first script that is run when cx_Freeze starts up. It simply
-determines the name of the initscript that is to be executed.
+This is the first script that is run when cx_Freeze starts up. It installs
+the finders needed by frozen executables and determines the name of the
+initscript that is to be executed.
 """
 
+import marshal
 import os
 import string
 import sys
@@ -17,8 +19,96 @@ STRINGREPLACE = list(
     string.whitespace + string.punctuation.replace(".", "").replace("_", "")
 )
 
+# the format of the indexed archive, see cx_Freeze/archive.py
+INDEXED_ARCHIVE_NAME = "library.cxa"
+INDEXED_ARCHIVE_MAGIC = b"CXFRZ\x00\x00\x01"
+INDEXED_ARCHIVE_HEADER_SIZE = 24
+INDEXED_ARCHIVE_SLOT_SIZE = 32
+INDEXED_ARCHIVE_PACKAGE = 0x1
+
+# the archive of the modules imported first, see the hot_archive option
+HOT_ARCHIVE_NAME = "library_hot.zip"
+
+
+def _get_zip_path():
+    """Return the path of the zip file in sys.path, if there is one."""
+    for entry in sys.path:
+        if (
+            entry.endswith(".zip")
+            and os.path.basename(entry) != HOT_ARCHIVE_NAME
+        ):
+            return entry
+    return None
+
+
+def _get_zip_dir():
+    """Return the directory of the zip file in sys.path, if there is one."""
+    zip_path = _get_zip_path()
+    if zip_path is None:
+        return None
+    return os.path.dirname(zip_path)
+
+
+def _fix_frozen_packages():
+    """
+    The packages embedded in the base executable as frozen modules (if it
+    was built with them) have an empty __path__; their other modules are
+    found in the zip file or in the lib directory.
+    """
+    zip_path = _get_zip_path()
+    if zip_path is None:
+        return
+    for name, module in list(sys.modules.items()):
+        spec = getattr(module, "__spec__", None)
+        if spec is None or spec.origin != "frozen":
+            continue
+        path = getattr(module, "__path__", None)
+        if path == []:
+            parts = name.split(".")
+            path.append(os.path.join(zip_path, *parts))
+            path.append(os.path.join(os.path.dirname(zip_path), *parts))
+
+
+_fix_frozen_packages()
+
+
+def _install_hot_archive():
+    """
+    Put the archive of the modules imported first, if there is one, in
+    front of sys.path. It is written with the hot_archive option, in the
+    order in which the modules were imported according to the import
+    profiles, so that they are read sequentially from a small file.
+    """
+    zip_dir = _get_zip_dir()
+    if zip_dir is None:
+        return
+    path = os.path.join(zip_dir, HOT_ARCHIVE_NAME)
+    if os.path.isfile(path):
+        sys.path.insert(0, path)
+
+
+_install_hot_archive()
+
 
 class ExtensionFinder(PathFinder):
+    # the file names of the extension modules found in packages stored in
+    # the zip file, as recorded by the freezer in BUILD_CONSTANTS (None if
+    # not recorded, for instance by older versions of cx_Freeze)
+    _file_names = None
+    _file_names_loaded = False
+
+    @classmethod
+    def _get_file_names(cls):
+        if not cls._file_names_loaded:
+            cls._file_names_loaded = True
+            try:
+                import BUILD_CONSTANTS
+
+                cls._file_names = BUILD_CONSTANTS.EXTENSION_MODULES
+            except (ImportError, AttributeError):
+                pass
+        return cls._file_names
+
     @classmethod
     def find_spec(cls, fullname, path=None, target=None):
         """
@@ -26,10 +116,21 @@ class ExtensionFinder(PathFinder):
         are included in the zip file (instead of as files on disk);
         extension modules cannot be found within zip files but are stored in
         the lib subdirectory; if the extension module is found in a package,
-        however, its name has been altered so this finder is needed.
+        however, its name has been altered so this finder is needed. The
+        file names are known at build time, so they are looked up instead of
+        searched for, if recorded.
         """
         if path is None:
             return None
+        file_names = cls._get_file_names()
+        if file_names is not None:
+            file_name = file_names.get(fullname)
+            zip_dir = _get_zip_dir()
+            if file_name is None or zip_dir is None:
+                return None
+            location = os.path.join(zip_dir, file_name)
+            loader = ExtensionFileLoader(fullname, location)
+            return ModuleSpec(fullname, loader, origin=location)
         suffixes = EXTENSION_SUFFIXES
         for entry in sys.path:
             if ".zip" in entry:
@@ -45,6 +146,453 @@ class ExtensionFinder(PathFinder):
 sys.meta_path.append(ExtensionFinder)
 
 
+class IndexedArchiveFinder:
+    """
+    Finder and loader for the modules stored in the indexed archive written
+    next to the zip file when the indexed_archive option is used. The
+    archive is read through mmap, so that its pages are shared between
+    processes, and its hash table is only probed for the modules actually
+    imported, so that the cost of starting does not depend on the number of
+    modules stored. The archive holds only the code of the modules: the
+    data files of their packages are read from the zip file.
+    """
+
+    def __init__(self, path, zip_path=None):
+        import mmap
+
+        self.path = path
+        self.zip_path = zip_path
+        with open(path, "rb") as fp:
+            self._data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[:8] != INDEXED_ARCHIVE_MAGIC:
+            raise ImportError(f"not an indexed archive: {path}")
+        self._num_slots = self._read_int(8, 4)
+        self._table_offset = self._read_int(16, 8)
+
+    def _read_int(self, offset, size):
+        return int.from_bytes(self._data[offset : offset + size], "little")
+
+    def _get_slot(self, index):
+        offset = self._table_offset + index * INDEXED_ARCHIVE_SLOT_SIZE
+        slot = self._data[offset : offset + INDEXED_ARCHIVE_SLOT_SIZE]
+        return (
+            int.from_bytes(slot[0:4], "little"),  # hash
+            int.from_bytes(slot[4:8], "little"),  # flags
+            int.from_bytes(slot[8:12], "little"),  # name offset
+            int.from_bytes(slot[12:16], "little"),  # name length
+            int.from_bytes(slot[16:24], "little"),  # data offset
+            int.from_bytes(slot[24:32], "little"),  # data length
+        )
+
+    def _lookup(self, fullname):
+        name = fullname.encode()
+        value = 0x811C9DC5
+        for byte in name:
+            value = ((value ^ byte) * 0x01000193) & 0xFFFFFFFF
+        mask = self._num_slots - 1
+        index = value & mask
+        while True:
+            slot = self._get_slot(index)
+            name_offset, name_length = slot[2:4]
+            if name_length == 0:
+                return None
+            if (
+                slot[0] == value
+                and self._data[name_offset : name_offset + name_length] == name
+            ):
+                return slot
+            index = (index + 1) & mask
+
+    def names(self):
+        """Return the names of all the modules in the archive."""
+        names = []
+        for index in range(self._num_slots):
+            _, _, name_offset, name_length, _, _ = self._get_slot(index)
+            if name_length:
+                name = self._data[name_offset : name_offset + name_length]
+                names.append(name.decode())
+        return names
+
+    def find_spec(self, fullname, path=None, target=None):
+        slot = self._lookup(fullname)
+        if slot is None:
+            return None
+        is_package = bool(slot[1] & INDEXED_ARCHIVE_PACKAGE)
+        spec = ModuleSpec(
+            fullname,
+            self,
+            origin=self.get_filename(fullname),
+            is_package=is_package,
+        )
+        spec.has_location = True
+        if is_package:
+            spec.submodule_search_locations = [
+                os.path.join(self.path, *fullname.split("."))
+            ]
+        return spec
+
+    def create_module(self, spec):
+        return None
+
+    def exec_module(self, module):
+        code = self.get_code(module.__spec__.name)
+        exec(code, module.__dict__)
+
+    def get_code(self, fullname):
+        slot = self._lookup(fullname)
+        if slot is None:
+            raise ImportError(f"no module named {fullname!r}", name=fullname)
+        data_offset, data_length = slot[4:6]
+        data = self._data[data_offset : data_offset + data_length]
+        return marshal.loads(data)
+
+    def get_filename(self, fullname):
+        slot = self._lookup(fullname)
+        if slot is None:
+            raise ImportError(f"no module named {fullname!r}", name=fullname)
+        parts = fullname.split(".")
+        if slot[1] & INDEXED_ARCHIVE_PACKAGE:
+            parts.append("__init__")
+        return os.path.join(self.path, *parts) + ".pyc"
+
+    def get_source(self, fullname):
+        return None
+
+    def is_package(self, fullname):
+        slot = self._lookup(fullname)
+        if slot is None:
+            raise ImportError(f"no module named {fullname!r}", name=fullname)
+        return bool(slot[1] & INDEXED_ARCHIVE_PACKAGE)
+
+    def read_zip_member(self, name):
+        """Return the data of the member of the zip file (with a name using
+        forward slashes) or raise FileNotFoundError."""
+        import zipfile
+
+        if self.zip_path is not None:
+            with zipfile.ZipFile(self.zip_path) as zip_file:
+                try:
+                    return zip_file.read(name)
+                except KeyError:
+                    pass
+        raise FileNotFoundError(name)
+
+    def get_data(self, path):
+        """Return the contents of the file; the files of the packages in the
+        archive (with paths relative to their __file__, as pkgutil.get_data
+        uses) are stored in the zip file."""
+        prefix = self.path + os.sep
+        if not path.startswith(prefix):
+            with open(path, "rb") as fp:
+                return fp.read()
+        return self.read_zip_member(path[len(prefix) :].replace(os.sep, "/"))
+
+    def get_resource_reader(self, fullname):
+        if self.zip_path is None or not self.is_package(fullname):
+            return None
+        return IndexedArchiveResourceReader(self, fullname)
+
+
+class IndexedArchiveResourceReader:
+    """
+    Reader of the resources of a package in the indexed archive, for
+    importlib.resources; they are the files stored in the directory of the
+    package in the zip file.
+    """
+
+    def __init__(self, finder, fullname):
+        self.finder = finder
+        self.prefix = fullname.replace(".", "/") + "/"
+
+    def _get_names(self):
+        import zipfile
+
+        with zipfile.ZipFile(self.finder.zip_path) as zip_file:
+            return zip_file.namelist()
+
+    def open_resource(self, resource):
+        import io
+
+        return io.BytesIO(self.finder.read_zip_member(self.prefix + resource))
+
+    def resource_path(self, resource):
+        # the resources are not files in the file system
+        raise FileNotFoundError(resource)
+
+    def is_resource(self, name):
+        return self.prefix + name in self._get_names()
+
+    def contents(self):
+        names = []
+        for name in self._get_names():
+            if name.startswith(self.prefix):
+                name = name[len(self.prefix) :].split("/")[0]
+                if name and name not in names:
+                    names.append(name)
+        return names
+
+    def files(self):
+        import zipfile
+
+        return zipfile.Path(self.finder.zip_path, self.prefix)
+
+
+def _install_indexed_archive():
+    """Install the finder of the indexed archive, if there is one."""
+    zip_dir = _get_zip_dir()
+    if zip_dir is None:
+        return None
+    path = os.path.join(zip_dir, INDEXED_ARCHIVE_NAME)
+    if not os.path.isfile(path):
+        return None
+    finder = IndexedArchiveFinder(path, _get_zip_path())
+    sys.meta_path.insert(sys.meta_path.index(PathFinder), finder)
+    return finder
+
+
+INDEXED_ARCHIVE_FINDER = _install_indexed_archive()
+
+
+class LazyFinder:
+    """
+    Finder for the modules of the packages named by the lazy_packages option
+    (except those named by the lazy_excludes option), which finds them with
+    the other finders but executes them only when one of their attributes
+    is first accessed, using importlib.util.LazyLoader. Extension modules,
+    and modules whose loaders do not support it (like zipimporter before
+    Python 3.10), are loaded normally.
+    """
+
+    def __init__(self, names, excludes):
+        from importlib.util import LazyLoader
+
+        self.lazy_loader = LazyLoader
+        self.names = tuple(names)
+        self.excludes = tuple(excludes)
+        self.deferred = []
+
+    @staticmethod
+    def _matches(fullname, names):
+        for name in names:
+            if fullname == name or fullname.startswith(name + "."):
+                return True
+        return False
+
+    def find_spec(self, fullname, path=None, target=None):
+        if not self._matches(fullname, self.names):
+            return None
+        if self._matches(fullname, self.excludes):
+            return None
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, "find_spec", None)
+            if finder is self or find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        if not hasattr(loader, "exec_module") or isinstance(
+            loader, ExtensionFileLoader
+        ):
+            return spec
+        spec.loader = self.lazy_loader(loader)
+        self.deferred.append(fullname)
+        return spec
+
+
+def _install_lazy_finder():
+    """Install the finder of the lazy packages, if there are some."""
+    try:
+        import BUILD_CONSTANTS
+    except ImportError:
+        return None
+    names = getattr(BUILD_CONSTANTS, "LAZY_PACKAGES", None)
+    if not names:
+        return None
+    excludes = getattr(BUILD_CONSTANTS, "LAZY_EXCLUDES", None) or ()
+    finder = LazyFinder(names, excludes)
+    sys.meta_path.insert(0, finder)
+    return finder
+
+
+LAZY_FINDER = _install_lazy_finder()
+
+
+class StartupTracer:
+    """
+    Records the time spent in each phase of the startup of the executable
+    and in the import of each module, as -X importtime does for Python
+    (which frozen executables cannot use, since they ignore the environment),
+    and writes them in JSON at exit, along with all the modules imported,
+    which can be used as an import profile to prune the modules never
+    imported, and the modules of lazy packages whose execution was deferred
+    (with whether they were eventually executed). It is available in the
+    executables built with the trace_startup option, when the environment
+    variable CXFREEZE_TRACE is set to the name of the file to write ("-" for
+    stderr), in which %p is replaced by the process id.
+    """
+
+    def __init__(self, path):
+        import _frozen_importlib
+        from time import perf_counter
+
+        self.path = path
+        self._clock = perf_counter
+        self._bootstrap = _frozen_importlib
+        self._find_and_load = _frozen_importlib._find_and_load
+        self._stack = []
+        self.phases = []
+        init_times = getattr(sys, "_cx_freeze_init_times", None)
+        if init_times is not None:
+            self.phases.append(("initialize_python", init_times[0]))
+            self.phases.append(("startup", init_times[1]))
+        self.mark("tracer")
+        self.preloaded = sorted(sys.modules)
+        self.imports = []
+        _frozen_importlib._find_and_load = self._traced_find_and_load
+
+    def mark(self, phase):
+        """Record the time at which the given phase of the startup begins."""
+        self.phases.append((phase, self._clock()))
+
+    def _traced_find_and_load(self, name, import_):
+        start = self._clock()
+        self._stack.append(0.0)
+        error = None
+        try:
+            return self._find_and_load(name, import_)
+        except BaseException as exc:
+            error = type(exc).__name__
+            raise
+        finally:
+            cumulative = self._clock() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += cumulative
+            record = {
+                "name": name,
+                "level": len(self._stack),
+                "start_us": round((start - self.phases[0][1]) * 1e6),
+                "self_us": round((cumulative - children) * 1e6),
+                "cumulative_us": round(cumulative * 1e6),
+                "source": self._get_source(name),
+            }
+            if error is not None:
+                record["error"] = error
+            self.imports.append(record)
+
+    @staticmethod
+    def _get_source(name):
+        """Return the archive or the file the module was loaded from."""
+        # accessing an attribute of a lazy module would execute it
+        try:
+            spec = object.__getattribute__(sys.modules.get(name), "__spec__")
+        except AttributeError:
+            return None
+        if spec is None:
+            return None
+        loader = spec.loader
+        if LAZY_FINDER is not None and isinstance(
+            loader, LAZY_FINDER.lazy_loader
+        ):
+            loader = loader.loader
+        if isinstance(loader, IndexedArchiveFinder):
+            return loader.path
+        archive = getattr(loader, "archive", None)  # zipimporter
+        if archive is not None:
+            return archive
+        return spec.origin
+
+    def write(self):
+        self.mark("exit")
+        self._bootstrap._find_and_load = self._find_and_load
+        import json
+
+        origin = self.phases[0][1]
+        phases = {n: round((t - origin) * 1e6) for n, t in self.phases}
+        data = {
+            "executable": sys.executable,
+            "argv": sys.argv,
+            "python_version": sys.version,
+            "phases_us": phases,
+            "time_to_main_us": phases.get("main"),
+            "modules_before_tracer": self.preloaded,
+            "imports": self.imports,
+            "modules": sorted(sys.modules),
+        }
+        if LAZY_FINDER is not None:
+            # the modules still deferred were never used
+            deferred = {}
+            for name in LAZY_FINDER.deferred:
+                module_type = type(sys.modules.get(name))
+                deferred[name] = module_type.__name__ != "_LazyModule"
+            data["deferred_modules"] = deferred
+        if self.path == "-":
+            json.dump(data, sys.stderr, indent=1)
+            sys.stderr.write("\n")
+        else:
+            path = self.path.replace("%p", str(os.getpid()))
+            with open(path, "w", encoding="utf-8") as fp:
+                json.dump(data, fp, indent=1)
+
+
+def _install_tracer():
+    """Install the startup tracer, if enabled."""
+    path = os.environ.get("CXFREEZE_TRACE")
+    if not path:
+        return None
+    try:
+        import BUILD_CONSTANTS
+    except ImportError:
+        return None
+    if not getattr(BUILD_CONSTANTS, "TRACE_STARTUP", False):
+        return None
+    import atexit
+
+    tracer = StartupTracer(path)
+    atexit.register(tracer.write)
+    return tracer
+
+
+STARTUP_TRACER = _install_tracer()
+
+
+# the constants giving the directories of the data copied with the
+# executable, relative to it, and the environment variables set to them
+DATA_DIR_CONSTANTS = ("TCL_LIBRARY", "TK_LIBRARY", "PYTZ_TZDATADIR")
+
+
+def set_data_environment():
+    """Set the environment variables giving the directories of the data
+    copied with the executable by the hooks (for tkinter and pytz)."""
+    import BUILD_CONSTANTS
+
+    dir_name = os.path.dirname(sys.executable)
+    for name in DATA_DIR_CONSTANTS:
+        value = getattr(BUILD_CONSTANTS, name, None)
+        if value is not None:
+            os.environ[name] = os.path.join(dir_name, value)
+
+
+def mark_phase(phase):
+    """Record the start of a phase of the startup, if it is traced."""
+    if STARTUP_TRACER is not None:
+        STARTUP_TRACER.mark(phase)
+
+
+def run_main(init_name, loader):
+    """Run the main script of the executable as the __main__ module, given
+    the name of its init script module and the loader of that module."""
+    name = init_name.rpartition("__init__")[0] + "__main__"
+    code = loader.get_code(name)
+    m = __import__("__main__")
+    m.__dict__["__file__"] = code.co_filename
+    mark_phase("main")
+    exec(code, m.__dict__)
+
+
 def run():
     name = os.path.basename(sys.executable)
     if sys.platform == "win32":
@@ -54,15 +602,28 @@ def run():
         for ch in STRINGREPLACE:
             name = name.replace(ch, "_")
     name = os.path.normcase(name)
+    mark_phase("init_script")
     try:
         module = __import__(name + "__init__")
     except ModuleNotFoundError:
+        import zipimport
+
         files = []
-        for k in __loader__._files:
+        names = []
+        for entry in sys.path:
+            if entry.endswith(".zip"):
+                names.extend(zipimport.zipimporter(entry)._files)
+        for k in names:
             if k.endswith("__init__.pyc"):
                 k = k.rpartition("__init__")[0]
                 if k.isidentifier():
                     files.append(k)
+        if INDEXED_ARCHIVE_FINDER is not None:
+            for k in INDEXED_ARCHIVE_FINDER.names():
+                if k.endswith("__init__"):
+                    k = k.rpartition("__init__")[0]
+                    if k.isidentifier():
+                        files.append(k)
         if len(files) != 1:
             raise RuntimeError(
                 "Apparently, the original executable has been renamed to "
@@ -71,4 +632,5 @@ def run():
             ) from None
         name = files[0]
         module = __import__(name + "__init__")
+    mark_phase("init_script_run")
     module.run()
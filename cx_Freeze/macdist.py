@@ -13,6 +13,7 @@ from cx_Freeze.darwintools import (
     DarwinFile,
     DarwinFileTracker,
 )
+from cx_Freeze.sizereport import BUILD_RECORD_NAMES
 
 __all__ = ["bdist_dmg", "bdist_mac"]
 
@@ -413,6 +414,10 @@ class bdist_mac(Command):
         self.mkpath(self.frameworksDir)
 
         self.copy_tree(build.build_exe, self.binDir)
+        for name in BUILD_RECORD_NAMES:
+            path = os.path.join(self.binDir, name)
+            if os.path.exists(path):
+                os.remove(path)
 
         # Copy the icon
         if self.iconfile:
@@ -182,6 +182,173 @@ def prepare_parser():
         "on Windows or placed in the target directory for other platforms "
         "(ignored in Microsoft Store Python app)",
     )
+    parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        metavar="DIR",
+        help="directory of a persistent cache shared between builds; the "
+        "compiled code and the imports found in unchanged source files are "
+        "reused from this cache instead of being recompiled and rescanned, "
+        "as are the shared libraries needed by unchanged binaries",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        dest="jobs",
+        metavar="N",
+        help="number of parallel jobs used to build; 0 means the number of "
+        "CPUs (default: 1)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        dest="incremental",
+        help="skip the files which did not change since the previous build "
+        "into the same target directory and remove the files which are no "
+        "longer part of the build",
+    )
+    parser.add_argument(
+        "--hardlink",
+        action="store_true",
+        dest="hardlink",
+        help="create hard links to the files copied to the target directory "
+        "when possible, instead of copying them; the files must then never "
+        "be modified in the target directory",
+    )
+    parser.add_argument(
+        "--indexed-archive",
+        action="store_true",
+        dest="indexed_archive",
+        help="store the modules in an indexed archive (library.cxa) which is "
+        "read through mmap at startup, instead of the zip file; only the "
+        "modules needed to start remain in the zip file",
+    )
+    parser.add_argument(
+        "--trace-startup",
+        action="store_true",
+        dest="trace_startup",
+        help="let the executables write a trace of their startup and imports, "
+        "in JSON, to the file named by the CXFREEZE_TRACE environment "
+        "variable when it is set",
+    )
+    parser.add_argument(
+        "--import-profiles",
+        dest="import_profiles",
+        metavar="PATHS",
+        help="comma separated list of import profiles (traces written by "
+        "executables built with --trace-startup) or of directories "
+        "containing them; the modules which were never imported according "
+        "to them are reported",
+    )
+    parser.add_argument(
+        "--prune-modules",
+        action="store_true",
+        dest="prune_modules",
+        help="exclude the modules which were never imported according to the "
+        "import profiles",
+    )
+    parser.add_argument(
+        "--prune-allowlist",
+        dest="prune_allowlist",
+        metavar="NAMES",
+        help="comma separated list of modules which are never excluded by "
+        "--prune-modules, with their submodules, such as those loaded "
+        "dynamically only in some cases",
+    )
+    parser.add_argument(
+        "--hot-archive",
+        action="store_true",
+        dest="hot_archive",
+        help="store the modules imported according to the import profiles, "
+        "in the order in which they are imported, in a separate archive "
+        "(library_hot.zip) which is searched first",
+    )
+    parser.add_argument(
+        "--lazy-packages",
+        dest="lazy_packages",
+        metavar="NAMES",
+        help="comma separated list of packages whose modules are executed "
+        "only when one of their attributes is first accessed, instead of "
+        "when imported",
+    )
+    parser.add_argument(
+        "--lazy-excludes",
+        dest="lazy_excludes",
+        metavar="NAMES",
+        help="comma separated list of modules of the lazy packages which are "
+        "executed when imported, with their submodules, such as those with "
+        "side effects when imported",
+    )
+    parser.add_argument(
+        "--runtime-config",
+        dest="runtime_config",
+        metavar="OPTIONS",
+        help="comma separated list of name=value options of the runtime "
+        "configuration of the Python interpreter of the executable: "
+        "optimize, hash_seed, allocator, utf8_mode, faulthandler, "
+        "dont_write_bytecode, unbuffered, warnings, io_encoding and "
+        "environment (the environment variables still honoured, separated "
+        "by spaces)",
+    )
+    parser.add_argument(
+        "--static-guards",
+        action="store_true",
+        dest="static_guards",
+        help="skip the imports in code which does not run on this platform, "
+        "that is under conditions on sys.platform, os.name or "
+        "sys.version_info which are false here, or under TYPE_CHECKING",
+    )
+    parser.add_argument(
+        "--size-report",
+        dest="size_report",
+        metavar="FILE",
+        help="write the size report of the build to this file, as JSON: the "
+        "size and compressed size of each file and archive entry, rolled up "
+        "by top-level package, distribution, hook, package directory and "
+        "kind; a summary of it is printed",
+    )
+    parser.add_argument(
+        "--graph-output",
+        dest="graph_output",
+        metavar="FILE",
+        help="write the graph of the imports between the modules, with "
+        "their kinds (import, from-list, star, alias, hook and "
+        "package-expansion), to this file: in the DOT language if its "
+        "extension is .dot or .gv, else as JSON",
+    )
+    parser.add_argument(
+        "--explain",
+        dest="explain",
+        metavar="NAMES",
+        help="comma separated list of modules for which to show the shortest "
+        "chain of imports from the main script leading to them and the "
+        "modules which would not be included if they were excluded",
+    )
+    parser.add_argument(
+        "--optional-report",
+        action="store_true",
+        dest="optional_report",
+        help="report the optional dependencies, imported only where "
+        "ImportError is handled, with the size of the modules which are "
+        "included only because of each of them",
+    )
+    parser.add_argument(
+        "--optional-size-limit",
+        dest="optional_size_limit",
+        metavar="SIZE",
+        help="exclude the optional dependencies which add more than this "
+        "size, in bytes or with a K, M or G suffix (0 excludes all of them)",
+    )
+    parser.add_argument(
+        "--optional-allowlist",
+        dest="optional_allowlist",
+        metavar="NAMES",
+        help="comma separated list of optional dependencies which are never "
+        "excluded, with their submodules; without --optional-size-limit, "
+        "all the other optional dependencies are excluded",
+    )
     # remove the initial "usage: " of format_usage()
     parser.usage = parser.format_usage()[len("usage: ") :] + DESCRIPTION
     return parser
@@ -198,6 +365,13 @@ def parse_command_line(parser):
     args.packages = normalize_to_list(args.packages)
     args.zip_include_packages = normalize_to_list(args.zip_include_packages)
     args.zip_exclude_packages = normalize_to_list(args.zip_exclude_packages)
+    args.import_profiles = normalize_to_list(args.import_profiles)
+    args.prune_allowlist = normalize_to_list(args.prune_allowlist)
+    args.lazy_packages = normalize_to_list(args.lazy_packages)
+    args.lazy_excludes = normalize_to_list(args.lazy_excludes)
+    args.runtime_config = normalize_to_list(args.runtime_config)
+    args.explain = normalize_to_list(args.explain)
+    args.optional_allowlist = normalize_to_list(args.optional_allowlist)
     replace_paths = []
     if args.replace_paths:
         for directive in args.replace_paths.split(os.pathsep):
@@ -251,5 +425,25 @@ def main():
         silent=args.silent,
         zipIncludePackages=args.zip_include_packages,
         zipExcludePackages=args.zip_exclude_packages,
+        cacheDir=args.cache_dir,
+        jobs=args.jobs,
+        incremental=args.incremental,
+        hardlink=args.hardlink,
+        indexedArchive=args.indexed_archive,
+        traceStartup=args.trace_startup,
+        importProfiles=args.import_profiles,
+        pruneModules=args.prune_modules,
+        pruneAllowlist=args.prune_allowlist,
+        hotArchive=args.hot_archive,
+        lazyPackages=args.lazy_packages,
+        lazyExcludes=args.lazy_excludes,
+        runtimeConfig=args.runtime_config,
+        staticGuards=args.static_guards,
+        sizeReport=args.size_report,
+        graphOutput=args.graph_output,
+        explainModules=args.explain,
+        optionalReport=args.optional_report,
+        optionalSizeLimit=args.optional_size_limit,
+        optionalAllowlist=args.optional_allowlist,
     )
     freezer.Freeze()
@@ -0,0 +1,150 @@
+"""
+The manifest of the files written to the target directory by a build, used
+by incremental builds to skip the files which did not change and to remove
+the files which are no longer part of the build.
+"""
+
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+__all__ = ["BuildManifest", "MANIFEST_NAME"]
+
+MANIFEST_NAME = ".cx_freeze_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def _stat(path: str) -> Optional[List[int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class BuildManifest:
+    """
+    Record of the files written to the target directory by a build, stored
+    as JSON in the target directory and keyed by the path of each file
+    relative to it. Copied files are recorded with the path, size and
+    modification time of their source, generated files with a digest of
+    their contents and archives with a digest of each of their members;
+    each file is also recorded with its own size and modification time, so
+    that a file changed after the build is never considered up to date.
+    """
+
+    def __init__(self, target_dir: str):
+        self.target_dir = os.path.abspath(target_dir)
+        self.path = os.path.join(self.target_dir, MANIFEST_NAME)
+        self.previous: Dict[str, Dict] = self._load()
+        self.files: Dict[str, Dict] = {}
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, encoding="utf-8") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        if data.get("version") != MANIFEST_VERSION:
+            return {}
+        return data.get("files", {})
+
+    def _get_name(self, target: str) -> str:
+        path = os.path.relpath(os.path.abspath(target), self.target_dir)
+        return path.replace(os.sep, "/")
+
+    def _get_previous(self, target: str) -> Optional[Dict]:
+        """Return the previous entry of the file, if it is still current."""
+        entry = self.previous.get(self._get_name(target))
+        if entry is None:
+            return None
+        stat = entry.get("stat")
+        if stat is None or stat != _stat(target):
+            return None
+        return entry
+
+    def _record(self, target: str, entry: Dict) -> None:
+        entry["stat"] = _stat(target)
+        self.files[self._get_name(target)] = entry
+
+    def is_copy_current(self, source: str, target: str) -> bool:
+        """Return True if the target is an up to date copy of the source."""
+        entry = self._get_previous(target)
+        if entry is None or entry.get("source") != os.path.abspath(source):
+            return False
+        stat = entry.get("source_stat")
+        return stat is not None and stat == _stat(source)
+
+    def is_data_current(self, target: str, digest: str) -> bool:
+        """Return True if the target has contents with the given digest."""
+        entry = self._get_previous(target)
+        return entry is not None and entry.get("digest") == digest
+
+    def get_members(self, target: str) -> List[Tuple[str, str]]:
+        """
+        Return the names and digests of the members of the archive, in
+        order, if the archive is current.
+        """
+        entry = self._get_previous(target)
+        if entry is None:
+            return []
+        return [tuple(member) for member in entry.get("members", [])]
+
+    def keep(self, target: str) -> None:
+        """Record the target, left unchanged since the previous build."""
+        name = self._get_name(target)
+        self.files[name] = self.previous[name]
+
+    def record_copy(self, source: str, target: str) -> None:
+        """Record the target as a copy of the source."""
+        source = os.path.abspath(source)
+        self._record(target, dict(source=source, source_stat=_stat(source)))
+
+    def record_data(
+        self, target: str, digest: str, source: Optional[str] = None
+    ) -> None:
+        """Record the target as generated (from source, if given)."""
+        entry = dict(digest=digest)
+        if source is not None:
+            entry["source"] = os.path.abspath(source)
+        self._record(target, entry)
+
+    def record_archive(
+        self, target: str, members: List[Tuple[str, str]]
+    ) -> None:
+        """Record the target as an archive with the given members."""
+        self._record(target, dict(members=[list(m) for m in members]))
+
+    def remove_stale(self) -> List[str]:
+        """
+        Remove the files written by the previous build which are not part
+        of this build (and any directories left empty) and return them.
+        """
+        removed = []
+        for name in self.previous:
+            if name in self.files:
+                continue
+            path = os.path.join(self.target_dir, *name.split("/"))
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            removed.append(path)
+            dir_name = os.path.dirname(path)
+            while dir_name != self.target_dir:
+                try:
+                    os.rmdir(dir_name)
+                except OSError:
+                    break
+                dir_name = os.path.dirname(dir_name)
+        return removed
+
+    def save(self) -> None:
+        """Write the manifest to the target directory."""
+        data = dict(version=MANIFEST_VERSION, files=self.files)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as fp:
+            json.dump(data, fp, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
@@ -2,11 +2,124 @@
 Base class for module.
 """
 
+import re
 from types import CodeType
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import importlib_metadata
 
+__all__ = ["DistributionIndex", "Module"]
+
+
+def _normalize_dist_name(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class DistributionIndex:
+    """
+    Index of the distributions installed in the search path, built once per
+    finder, which maps the names of the top-level modules to the
+    distributions that provide them (using top_level.txt or the RECORD
+    file).
+    """
+
+    def __init__(self, path: Optional[List[str]] = None):
+        # the distributions and the names of those providing the top-level
+        # modules are indexed by normalized name, which is read only here;
+        # their requirements and files are listed once, on first use
+        self._by_name: Dict[str, importlib_metadata.Distribution] = {}
+        self._by_module_name: Dict[str, List[str]] = {}
+        self._requirements: Dict[str, List[str]] = {}
+        self._dist_files: Dict[str, List[Tuple[str, str]]] = {}
+        for dist in importlib_metadata.distributions(path=path):
+            name = dist.metadata["Name"]
+            if not name:
+                continue
+            name = _normalize_dist_name(name)
+            # the first distribution found in the path is the one imported
+            if name in self._by_name:
+                continue
+            self._by_name[name] = dist
+            for module_name in self._get_top_level_names(dist):
+                names = self._by_module_name.setdefault(module_name, [])
+                names.append(name)
+
+    @staticmethod
+    def _get_top_level_names(
+        dist: importlib_metadata.Distribution,
+    ) -> Iterable[str]:
+        top_level = dist.read_text("top_level.txt")
+        if top_level is not None:
+            return {n.strip() for n in top_level.splitlines() if n.strip()}
+        names = set()
+        for file in dist.files or []:
+            first = file.parts[0]
+            if first in ("..", "__pycache__") or first.endswith(
+                (".dist-info", ".egg-info", ".data")
+            ):
+                continue
+            if len(file.parts) == 1:
+                first = first.partition(".")[0]
+            names.add(first)
+        return names
+
+    def get_distribution_name(self, module_name: str) -> Optional[str]:
+        """
+        Return the (normalized) name of the distribution providing the
+        module.
+        """
+        top_level_name = module_name.partition(".")[0]
+        names = self._by_module_name.get(top_level_name)
+        if not names:
+            return None
+        return names[0]
+
+    def _get_requirements(self, name: str) -> List[str]:
+        """Return the installed requirements of the distribution."""
+        requirements = self._requirements.get(name)
+        if requirements is None:
+            requirements = self._requirements[name] = []
+            for requirement in self._by_name[name].requires or []:
+                match = re.match(r"[A-Za-z0-9._-]+", requirement)
+                if match is None:
+                    continue
+                required = _normalize_dist_name(match.group())
+                if required in self._by_name:
+                    requirements.append(required)
+        return requirements
+
+    def _get_files(self, name: str) -> List[Tuple[str, str]]:
+        """Return the metadata files of the distribution."""
+        files = self._dist_files.get(name)
+        if files is None:
+            files = self._dist_files[name] = [
+                (str(file.locate()), file.as_posix())
+                for file in self._by_name[name].files or []
+                if file.match("*.dist-info/*")
+            ]
+        return files
+
+    def get_dist_files(self, module_name: str) -> List[Tuple[str, str]]:
+        """
+        Return the metadata files (as tuples of source path and archive
+        name) of the distributions providing the top-level module and of
+        their requirements; the files of a distribution are returned for
+        each of its modules, and written once, with the first of them which
+        is written (see Freezer._WriteModules).
+        """
+        names = list(self._by_module_name.get(module_name, []))
+        name = _normalize_dist_name(module_name)
+        if name in self._by_name and name not in names:
+            names.append(name)
+        for name in list(names):
+            for required in self._get_requirements(name):
+                if required not in names:
+                    names.append(required)
+        dist_files = []
+        for name in names:
+            dist_files.extend(self._get_files(name))
+        return dist_files
+
 
 class Module:
     """
@@ -28,32 +141,15 @@ class Module:
         self.global_names: set = set()
         self.exclude_names: set = set()
         self.ignore_names: set = set()
+        # modules imported only in code which does not run on this platform
+        self.dead_imports: set = set()
         self.source_is_zip_file: bool = False
         self.in_import: bool = True
         self.store_in_file_system: bool = True
-        # distribution files (metadata)
-        dist_files = []
-        packages = [name]
-        try:
-            requires = importlib_metadata.requires(packages[0])
-        except importlib_metadata.PackageNotFoundError:
-            requires = None
-        if requires is not None:
-            packages += [req.partition(" ")[0] for req in requires]
-        for package_name in packages:
-            try:
-                files = importlib_metadata.files(package_name)
-            except importlib_metadata.PackageNotFoundError:
-                files = None
-            if files is not None:
-                # cache file names to use in write modules
-                for file in files:
-                    if not file.match("*.dist-info/*"):
-                        continue
-                    dist_path = str(file.locate())
-                    arc_path = file.as_posix()
-                    dist_files.append((dist_path, arc_path))
-        self.dist_files: List[Tuple[str, str]] = dist_files
+        # distribution files (metadata), set by the finder
+        self.dist_files: List[Tuple[str, str]] = []
+        # name of the distribution providing the module, set by the finder
+        self.distribution: Optional[str] = None
 
     def __repr__(self) -> str:
         parts = [f"name={self.name!r}"]
@@ -0,0 +1,178 @@
+"""
+The runtime configuration of the Python interpreter of the executables,
+baked into the copy of the base executable when building and applied by
+InitializePython (see source/bases/Common.c) through the PyConfig API, so
+that it can be tuned without wrapping the executables in shell scripts.
+"""
+
+from typing import Any, Dict, List, Optional, Union
+
+from .common import ConfigError
+
+__all__ = [
+    "format_runtime_config",
+    "parse_runtime_config",
+    "write_runtime_config",
+]
+
+# the marker which starts the buffer reserved in the base executables and
+# the size of that buffer (g_RuntimeConfig in source/bases/Common.c)
+RUNTIME_CONFIG_MARKER = b"cx_Freeze runtime configuration"
+RUNTIME_CONFIG_SIZE = 1024
+
+ALLOCATORS = (
+    "default",
+    "debug",
+    "malloc",
+    "malloc_debug",
+    "pymalloc",
+    "pymalloc_debug",
+)
+
+# the environment variables which have the same effect as the options, the
+# only ones which may be honoured at run time (see the environment option)
+ENVIRONMENT_VARIABLES = {
+    "optimize": "PYTHONOPTIMIZE",
+    "hash_seed": "PYTHONHASHSEED",
+    "allocator": "PYTHONMALLOC",
+    "utf8_mode": "PYTHONUTF8",
+    "faulthandler": "PYTHONFAULTHANDLER",
+    "dont_write_bytecode": "PYTHONDONTWRITEBYTECODE",
+    "unbuffered": "PYTHONUNBUFFERED",
+    "warnings": "PYTHONWARNINGS",
+    "io_encoding": "PYTHONIOENCODING",
+}
+
+BOOLEAN_OPTIONS = (
+    "utf8_mode",
+    "faulthandler",
+    "dont_write_bytecode",
+    "unbuffered",
+)
+LIST_OPTIONS = ("warnings", "environment")
+
+TRUE_VALUES = ("1", "true", "yes", "on")
+FALSE_VALUES = ("0", "false", "no", "off")
+
+
+def _parse_value(name: str, value: Any) -> Any:
+    if name not in ENVIRONMENT_VARIABLES and name != "environment":
+        raise ConfigError(f"unknown runtime configuration option {name!r}")
+    if name in BOOLEAN_OPTIONS:
+        if isinstance(value, str):
+            if value.lower() not in TRUE_VALUES + FALSE_VALUES:
+                raise ConfigError(
+                    f"invalid value for runtime configuration option "
+                    f"{name!r} ({value!r})"
+                )
+            return value.lower() in TRUE_VALUES
+        return bool(value)
+    if name in LIST_OPTIONS:
+        if isinstance(value, str):
+            value = value.replace(",", " ").split()
+        values = list(value)
+        if name == "environment":
+            allowed = set(ENVIRONMENT_VARIABLES.values())
+            for env_name in values:
+                if env_name not in allowed:
+                    raise ConfigError(
+                        f"the environment variable {env_name!r} cannot be "
+                        "honoured by the executables"
+                    )
+        return values
+    if name == "optimize":
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            value = -1
+        if value not in (0, 1, 2):
+            raise ConfigError("optimize should be 0, 1 or 2")
+        return value
+    if name == "hash_seed":
+        if value == "random":
+            return value
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            value = -1
+        if not 0 <= value <= 4294967295:
+            raise ConfigError(
+                'hash_seed should be "random" or an integer in range '
+                "[0; 4294967295]"
+            )
+        return value
+    if name == "allocator":
+        if value not in ALLOCATORS:
+            raise ConfigError(
+                f"invalid allocator {value!r}, should be one of: "
+                + ", ".join(ALLOCATORS)
+            )
+    elif not isinstance(value, str) or "\n" in value:
+        raise ConfigError(f"invalid value for {name!r} ({value!r})")
+    return value
+
+
+def parse_runtime_config(
+    config: Optional[Union[Dict[str, Any], List[str]]]
+) -> Dict[str, Any]:
+    """Return the runtime configuration given as a dictionary or as a list
+    of name=value strings (where lists are separated by spaces) as a
+    dictionary of the values of the options, checked for errors."""
+    if not config:
+        return {}
+    if not isinstance(config, dict):
+        items = {}
+        for item in config:
+            name, sep, value = item.partition("=")
+            if not sep:
+                raise ConfigError(
+                    f"runtime configuration should be name=value ({item!r})"
+                )
+            items[name.strip()] = value.strip()
+        config = items
+    return {name: _parse_value(name, value) for name, value in config.items()}
+
+
+def format_runtime_config(config: Dict[str, Any]) -> bytes:
+    """Return the runtime configuration as baked into the executables, one
+    name=value line per option, with the values of the options as they
+    would be given by their environment variables."""
+    lines = []
+    for name, value in sorted(config.items()):
+        if name in BOOLEAN_OPTIONS:
+            if name != "utf8_mode" and not value:
+                continue  # an empty environment variable is not set
+            value = int(value)
+        elif name in LIST_OPTIONS:
+            if not value:
+                continue
+            value = ",".join(value)
+        lines.append(f"{name}={value}\n")
+    data = "".join(lines).encode()
+    if len(data) >= RUNTIME_CONFIG_SIZE - len(RUNTIME_CONFIG_MARKER) - 1:
+        raise ConfigError("runtime configuration is too large")
+    return data
+
+
+def write_runtime_config(path: str, data: bytes) -> bool:
+    """Write the runtime configuration (as returned by format_runtime_config)
+    into the copy of the base executable, replacing any previous one, and
+    return True if the executable was modified."""
+    with open(path, "r+b") as fp:
+        contents = fp.read()
+        offset = contents.find(RUNTIME_CONFIG_MARKER + b"\0")
+        if offset < 0:
+            if data:
+                raise ConfigError(
+                    f"the base executable {path!r} cannot be given a "
+                    "runtime configuration"
+                )
+            return False
+        offset += len(RUNTIME_CONFIG_MARKER) + 1
+        size = RUNTIME_CONFIG_SIZE - len(RUNTIME_CONFIG_MARKER) - 1
+        data = data.ljust(size, b"\0")
+        if contents[offset : offset + size] == data:
+            return False
+        fp.seek(offset)
+        fp.write(data)
+    return True
@@ -0,0 +1,196 @@
+"""
+cxfreeze-diff command line tool
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List
+
+from cx_Freeze.common import ConfigError, parse_size
+from cx_Freeze.sizereport import SizeReport, compare_size_reports, format_size
+
+__all__ = ["main"]
+
+DESCRIPTION = """
+Compare two builds made by cx_Freeze, given their size reports or their
+target directories: report the modules and binaries added and removed and
+what grew, and exit with status 1 if any of the budgets is exceeded.
+"""
+
+
+def prepare_parser():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("old", metavar="OLD", help="the previous build")
+    parser.add_argument("new", metavar="NEW", help="the new build")
+    parser.add_argument(
+        "--max-size",
+        dest="max_size",
+        metavar="SIZE",
+        help="budget of the size on disk of the new build, in bytes or with "
+        "a K, M or G suffix",
+    )
+    parser.add_argument(
+        "--max-growth",
+        dest="max_growth",
+        metavar="SIZE",
+        help="budget of the growth of the size on disk between the builds",
+    )
+    parser.add_argument(
+        "--max-growth-percent",
+        dest="max_growth_percent",
+        type=float,
+        metavar="PERCENT",
+        help="budget of the growth of the size on disk between the builds, "
+        "in percent of the size of the previous build",
+    )
+    parser.add_argument(
+        "--max-package-growth",
+        dest="max_package_growth",
+        metavar="SIZE",
+        help="budget of the growth of the size on disk of each top-level "
+        "package and of each distribution",
+    )
+    parser.add_argument(
+        "--max-modules",
+        dest="max_modules",
+        type=int,
+        metavar="COUNT",
+        help="budget of the number of modules of the new build",
+    )
+    parser.add_argument(
+        "--max-added-modules",
+        dest="max_added_modules",
+        type=int,
+        metavar="COUNT",
+        help="budget of the number of modules added by the new build",
+    )
+    parser.add_argument(
+        "--json",
+        dest="json",
+        metavar="FILE",
+        help="write the differences and the budgets exceeded to this file, "
+        "as JSON",
+    )
+    parser.add_argument(
+        "--limit",
+        dest="limit",
+        type=int,
+        default=20,
+        metavar="COUNT",
+        help="number of entries shown in each section (default: 20)",
+    )
+    return parser
+
+
+def check_budgets(diff: Dict[str, Any], args) -> List[str]:
+    """Return the budgets exceeded by the new build, as messages."""
+    exceeded = []
+    old_size = diff["old_total"]["compressed_size"]
+    new_size = diff["new_total"]["compressed_size"]
+    growth = new_size - old_size
+    if args.max_size is not None and new_size > parse_size(args.max_size):
+        exceeded.append(
+            f"size {format_size(new_size)} exceeds {args.max_size}"
+        )
+    if args.max_growth is not None and growth > parse_size(args.max_growth):
+        exceeded.append(
+            f"growth {format_size(growth)} exceeds {args.max_growth}"
+        )
+    if args.max_growth_percent is not None and old_size:
+        percent = 100.0 * growth / old_size
+        if percent > args.max_growth_percent:
+            exceeded.append(
+                f"growth {percent:.1f}% exceeds {args.max_growth_percent}%"
+            )
+    if args.max_package_growth is not None:
+        limit = parse_size(args.max_package_growth)
+        for key in ("package", "distribution"):
+            for change in diff["totals"][key]:
+                if change["change"] > limit:
+                    exceeded.append(
+                        f"growth of {key} {change['name']} "
+                        f"{format_size(change['change'])} exceeds "
+                        f"{args.max_package_growth}"
+                    )
+    if args.max_modules is not None and diff["new_modules"] > args.max_modules:
+        exceeded.append(
+            f"{diff['new_modules']} modules exceed {args.max_modules}"
+        )
+    added = len(diff["added_modules"])
+    if args.max_added_modules is not None and added > args.max_added_modules:
+        exceeded.append(
+            f"{added} modules added exceed {args.max_added_modules}"
+        )
+    return exceeded
+
+
+def format_diff(diff: Dict[str, Any], limit: int) -> str:
+    """Return the differences between the builds as text."""
+    old_size = diff["old_total"]["compressed_size"]
+    new_size = diff["new_total"]["compressed_size"]
+    growth = new_size - old_size
+    percent = f", {100.0 * growth / old_size:+.1f}%" if old_size else ""
+    lines = [
+        f"size on disk: {format_size(old_size)} -> {format_size(new_size)} "
+        f"({'+' if growth >= 0 else ''}{format_size(growth)}{percent})",
+        f"modules: {diff['old_modules']} -> {diff['new_modules']} "
+        f"({len(diff['added_modules'])} added, "
+        f"{len(diff['removed_modules'])} removed)",
+    ]
+
+    def add_section(title, entries):
+        if not entries:
+            return
+        lines.append(f"{title} ({len(entries)}):")
+        lines.extend(f"  {entry}" for entry in entries[:limit])
+        if len(entries) > limit:
+            lines.append(f"  ... and {len(entries) - limit} more")
+
+    add_section("added modules", diff["added_modules"])
+    add_section("removed modules", diff["removed_modules"])
+    for key in ("added_binaries", "removed_binaries"):
+        add_section(
+            key.replace("_", " "),
+            [
+                f"{format_size(b['size']):>10}  {b['path']}"
+                for b in diff[key]
+            ],
+        )
+    sections = [
+        (f"grown by {key}", diff["totals"][key])
+        for key in ("package", "distribution", "hook")
+    ]
+    sections.append(("grown items", diff["items"]))
+    for title, changes in sections:
+        add_section(
+            title,
+            [
+                f"{'+' + format_size(c['change']):>11}  {c['name']} "
+                f"({format_size(c['old_size'])} -> "
+                f"{format_size(c['new_size'])})"
+                for c in changes
+                if c["change"] > 0
+            ],
+        )
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = prepare_parser()
+    args = parser.parse_args()
+    try:
+        old = SizeReport.load(args.old)
+        new = SizeReport.load(args.new)
+        diff = compare_size_reports(old, new)
+        exceeded = check_budgets(diff, args)
+    except ConfigError as exc:
+        parser.error(str(exc))
+    print(format_diff(diff, args.limit), end="")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fp:
+            json.dump(dict(diff, budgets_exceeded=exceeded), fp, indent=1)
+    for message in exceeded:
+        print("budget exceeded:", message)
+    if exceeded:
+        sys.exit(1)
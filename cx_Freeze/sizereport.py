@@ -0,0 +1,321 @@
+"""
+The size report of a build: the size of each file written to the target
+directory and of each entry of its archives, attributed to the module which
+caused its inclusion and rolled up by top-level package, by distribution,
+by hook and by directory of package, written as JSON with a text summary,
+and the comparison of the reports of two builds (see cxfreeze-diff).
+"""
+
+import json
+import mmap
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import zipfile
+
+from .archive import (
+    INDEXED_ARCHIVE_HEADER,
+    INDEXED_ARCHIVE_MAGIC,
+    INDEXED_ARCHIVE_SLOT,
+)
+from .common import ConfigError
+from .manifest import MANIFEST_NAME
+
+__all__ = [
+    "BUILD_RECORD_NAMES",
+    "SIZE_REPORT_NAME",
+    "SizeReport",
+    "compare_size_reports",
+    "format_size",
+]
+
+# the name of the size report written to the target directory by every build
+SIZE_REPORT_NAME = ".cx_freeze_report.json"
+
+# the files recording the build in the target directory, which are not part
+# of the installed application
+BUILD_RECORD_NAMES = (MANIFEST_NAME, SIZE_REPORT_NAME)
+SIZE_REPORT_VERSION = 1
+
+# the kinds of items which are binaries (the others are modules and data)
+BINARY_KINDS = ("executable", "extension", "library")
+
+# the keys of the items by which their sizes are rolled up
+ROLLUPS = ("package", "distribution", "hook", "directory", "kind")
+
+
+def format_size(size: int) -> str:
+    """Return the size in a human readable form, such as 1.5 MB."""
+    if abs(size) < 1024:
+        return f"{size} B"
+    value = size / 1024
+    for unit in ("KB", "MB"):
+        if abs(value) < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+def iter_zip_entries(path: str) -> Iterator[Tuple[str, int, int]]:
+    """Yield the name, size and compressed size of the entries of the zip
+    file."""
+    with zipfile.ZipFile(path) as zip_file:
+        for info in zip_file.infolist():
+            if not info.is_dir():
+                yield info.filename, info.file_size, info.compress_size
+
+
+def iter_indexed_archive(path: str) -> Iterator[Tuple[str, int]]:
+    """Yield the name and size of the modules of the indexed archive (see
+    IndexedArchiveWriter)."""
+    with open(path, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size < INDEXED_ARCHIVE_HEADER.size:
+            return
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, num_slots, _, table_offset = INDEXED_ARCHIVE_HEADER.unpack(
+                data[: INDEXED_ARCHIVE_HEADER.size]
+            )
+            if magic != INDEXED_ARCHIVE_MAGIC:
+                return
+            for index in range(num_slots):
+                offset = table_offset + index * INDEXED_ARCHIVE_SLOT.size
+                slot = INDEXED_ARCHIVE_SLOT.unpack(
+                    data[offset : offset + INDEXED_ARCHIVE_SLOT.size]
+                )
+                _, _, name_offset, name_size, _, data_size = slot
+                if name_size:
+                    name = data[name_offset : name_offset + name_size]
+                    yield name.decode(), data_size
+
+
+class SizeReport:
+    """
+    The items of a build (the files written to the target directory and the
+    entries of its archives) with their size and their size on disk (the
+    compressed size of the entries of the zip files) and, when known, the
+    module which caused their inclusion, its distribution, the module whose
+    hook included it and the directory of the package they are part of.
+    """
+
+    def __init__(self, items: Optional[List[Dict[str, Any]]] = None):
+        self.items: List[Dict[str, Any]] = list(items or [])
+
+    def add(
+        self,
+        path: str,
+        kind: str,
+        size: int,
+        compressed_size: Optional[int] = None,
+        module: Optional[str] = None,
+        distribution: Optional[str] = None,
+        hook: Optional[str] = None,
+        directory: Optional[str] = None,
+    ) -> None:
+        """Add an item, given its path relative to the target directory
+        (followed by the name of the entry for the entries of archives)."""
+        if compressed_size is None:
+            compressed_size = size
+        self.items.append(
+            {
+                "path": path,
+                "kind": kind,
+                "size": size,
+                "compressed_size": compressed_size,
+                "module": module,
+                "package": module.partition(".")[0] if module else None,
+                "distribution": distribution,
+                "hook": hook,
+                "directory": directory,
+            }
+        )
+
+    def get_total(self) -> Dict[str, int]:
+        """Return the size, size on disk and number of all the items."""
+        return {
+            "size": sum(item["size"] for item in self.items),
+            "compressed_size": sum(
+                item["compressed_size"] for item in self.items
+            ),
+            "items": len(self.items),
+        }
+
+    def get_totals(self, key: str) -> List[Dict[str, Any]]:
+        """Return the size, size on disk and number of the items by value of
+        the key (see ROLLUPS), largest first, except the items without a
+        value."""
+        totals: Dict[str, Dict[str, Any]] = {}
+        for item in self.items:
+            name = item[key]
+            if name is None:
+                continue
+            total = totals.setdefault(
+                name,
+                {"name": name, "size": 0, "compressed_size": 0, "items": 0},
+            )
+            total["size"] += item["size"]
+            total["compressed_size"] += item["compressed_size"]
+            total["items"] += 1
+        return sorted(
+            totals.values(),
+            key=lambda total: (-total["compressed_size"], total["name"]),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the report as a dictionary which can be dumped as JSON."""
+        return {
+            "version": SIZE_REPORT_VERSION,
+            "total": self.get_total(),
+            "totals": {key: self.get_totals(key) for key in ROLLUPS},
+            "items": sorted(self.items, key=lambda item: item["path"]),
+        }
+
+    def format_summary(self, limit: int = 10) -> str:
+        """Return a summary of the report as text: the total and the largest
+        rollups and items, by size on disk."""
+        total = self.get_total()
+        lines = [
+            f"total: {format_size(total['compressed_size'])} on disk, "
+            f"{format_size(total['size'])} uncompressed, "
+            f"{total['items']} items"
+        ]
+        sections = [(key, self.get_totals(key)) for key in ROLLUPS]
+        items = sorted(
+            self.items,
+            key=lambda item: (-item["compressed_size"], item["path"]),
+        )
+        sections.append(
+            ("item", [dict(item, name=item["path"]) for item in items])
+        )
+        for key, totals in sections:
+            if not totals:
+                continue
+            lines.append(f"largest by {key}:")
+            for total in totals[:limit]:
+                lines.append(
+                    f"  {format_size(total['compressed_size']):>10} "
+                    f"{format_size(total['size']):>10}  {total['name']}"
+                )
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Write the report to the file as JSON."""
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(self.to_dict(), fp, indent=1)
+
+    def get_modules(self) -> List[str]:
+        """Return the names of the modules stored in the build."""
+        return sorted(
+            {
+                item["module"]
+                for item in self.items
+                if item["kind"] in ("module", "extension") and item["module"]
+            }
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "SizeReport":
+        """Return the report written to the file or, given a target
+        directory, the report written there by the build; for builds which
+        have no report, the sizes of the files are taken from the manifest
+        of incremental builds (without modules or entries of archives)."""
+        if os.path.isdir(path):
+            report_name = os.path.join(path, SIZE_REPORT_NAME)
+            manifest_name = os.path.join(path, MANIFEST_NAME)
+            if not os.path.exists(report_name) and os.path.exists(
+                manifest_name
+            ):
+                return cls._load_manifest(manifest_name)
+            path = report_name
+        data = cls._load_json(path)
+        if "items" not in data:
+            raise ConfigError(f"{path!r} is not a size report")
+        return cls(data["items"])
+
+    @classmethod
+    def _load_manifest(cls, path: str) -> "SizeReport":
+        report = cls()
+        files = cls._load_json(path).get("files", {})
+        for name, entry in sorted(files.items()):
+            stat = entry.get("stat") if isinstance(entry, dict) else None
+            if stat:
+                report.add(name, "file", stat[0])
+        return report
+
+    @staticmethod
+    def _load_json(path: str) -> Dict[str, Any]:
+        try:
+            with open(path, encoding="utf-8") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError) as exc:
+            raise ConfigError(f"cannot read {path!r}: {exc}") from None
+        if not isinstance(data, dict):
+            raise ConfigError(f"{path!r} is not a size report")
+        return data
+
+
+def _compare_totals(
+    old: List[Dict[str, Any]], new: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Return the changes of the sizes on disk of the rollups (or items),
+    given by name, largest growth first."""
+    old_sizes = {total["name"]: total["compressed_size"] for total in old}
+    new_sizes = {total["name"]: total["compressed_size"] for total in new}
+    changes = []
+    for name in old_sizes.keys() | new_sizes.keys():
+        old_size = old_sizes.get(name, 0)
+        new_size = new_sizes.get(name, 0)
+        if old_size != new_size:
+            changes.append(
+                {
+                    "name": name,
+                    "old_size": old_size,
+                    "new_size": new_size,
+                    "change": new_size - old_size,
+                }
+            )
+    changes.sort(key=lambda change: (-change["change"], change["name"]))
+    return changes
+
+
+def compare_size_reports(old: SizeReport, new: SizeReport) -> Dict[str, Any]:
+    """Return the differences between the reports of two builds: the totals,
+    the modules and binaries added and removed and the changes of the sizes
+    on disk of the items and of their rollups (see ROLLUPS)."""
+    old_items = {item["path"]: item for item in old.items}
+    new_items = {item["path"]: item for item in new.items}
+    old_modules = set(old.get_modules())
+    new_modules = set(new.get_modules())
+
+    def get_binaries(items, paths):
+        return [
+            {"path": path, "size": items[path]["compressed_size"]}
+            for path in sorted(paths)
+            if items[path]["kind"] in BINARY_KINDS
+        ]
+
+    def get_item_totals(items):
+        return [
+            {"name": path, "compressed_size": item["compressed_size"]}
+            for path, item in items.items()
+        ]
+
+    return {
+        "old_total": old.get_total(),
+        "new_total": new.get_total(),
+        "old_modules": len(old_modules),
+        "new_modules": len(new_modules),
+        "added_modules": sorted(new_modules - old_modules),
+        "removed_modules": sorted(old_modules - new_modules),
+        "added_binaries": get_binaries(
+            new_items, new_items.keys() - old_items.keys()
+        ),
+        "removed_binaries": get_binaries(
+            old_items, old_items.keys() - new_items.keys()
+        ),
+        "items": _compare_totals(
+            get_item_totals(old_items), get_item_totals(new_items)
+        ),
+        "totals": {
+            key: _compare_totals(old.get_totals(key), new.get_totals(key))
+            for key in ROLLUPS
+        },
+    }
@@ -5,6 +5,7 @@ Distutils script for cx_Freeze.
 from setuptools import setup, Extension
 import distutils.command.build_ext
 from distutils.sysconfig import get_config_var
+import marshal
 import os
 import subprocess
 import sys
@@ -15,7 +16,100 @@ if sys.version_info < (3, 6, 0):
     sys.exit("Python3 versions lower than 3.6.0 are not supported.")
 
 
+# lists the pure Python modules imported by Python during initialization and
+# by the __startup__ script, which is imported from the directory given
+FROZEN_MODULES_SCRIPT = """
+import sys
+sys.path.insert(0, sys.argv[1])
+import __startup__
+for name, module in sorted(sys.modules.items()):
+    spec = getattr(module, "__spec__", None)
+    if spec is None or spec.name != name:
+        continue  # not a module, or an alias like os.path
+    if spec.origin and spec.origin.endswith(".py"):
+        is_package = int(spec.submodule_search_locations is not None)
+        print(name, spec.origin, is_package, sep="\\t")
+"""
+
+
+def write_frozen_modules(filename):
+    """
+    Write the C source of a table of frozen modules (cx_FrozenModules) with
+    the code of the modules imported when starting frozen executables, so
+    that the base executables can import them without reading library.zip.
+    """
+    initscripts_dir = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "cx_Freeze", "initscripts"
+    )
+    output = subprocess.check_output(
+        [sys.executable, "-I", "-S", "-c", FROZEN_MODULES_SCRIPT]
+        + [initscripts_dir],
+        universal_newlines=True,
+    )
+    lines = [
+        "// generated by setup.py: modules imported when starting",
+        "#include <Python.h>",
+        "",
+    ]
+    modules = {}
+    for line in output.splitlines():
+        name, path, is_package = line.split("\t")
+        modules[name] = (path, is_package)
+    # the codec of the locale is imported before __startup__ runs and the
+    # __path__ of a frozen package is empty, so embed all of the encodings
+    encodings_dir = os.path.dirname(modules["encodings"][0])
+    for encoding_file in os.listdir(encodings_dir):
+        name, ext = os.path.splitext(encoding_file)
+        if ext == ".py" and name != "__init__":
+            path = os.path.join(encodings_dir, encoding_file)
+            modules.setdefault(f"encodings.{name}", (path, "0"))
+    entries = []
+    for i, name in enumerate(sorted(modules)):
+        path, is_package = modules[name]
+        with open(path, "rb") as fp:
+            source = fp.read()
+        parts = name.split(".")
+        if is_package == "1":
+            parts.append("__init__")
+        code = compile(source, "/".join(parts) + ".py", "exec")
+        data = marshal.dumps(code)
+        lines.append(f"static const unsigned char M_{i}[] = {{")
+        for pos in range(0, len(data), 16):
+            values = ",".join(str(b) for b in data[pos : pos + 16])
+            lines.append(f"    {values},")
+        lines.append("};")
+        # before Python 3.11, a negative size marks a package
+        if sys.version_info[:2] >= (3, 11):
+            entries.append(f'{{"{name}", M_{i}, {len(data)}, {is_package}}}')
+        elif is_package == "1":
+            entries.append(f'{{"{name}", M_{i}, -{len(data)}}}')
+        else:
+            entries.append(f'{{"{name}", M_{i}, {len(data)}}}')
+    lines.append("")
+    lines.append("const struct _frozen cx_FrozenModules[] = {")
+    lines.extend(f"    {entry}," for entry in entries)
+    lines.append("    {0}")
+    lines.append("};")
+    with open(filename, "w") as fp:
+        fp.write("\n".join(lines) + "\n")
+
+
 class build_ext(distutils.command.build_ext.build_ext):
+    user_options = distutils.command.build_ext.build_ext.user_options + [
+        (
+            "frozen-modules",
+            None,
+            "embed the modules imported when starting as frozen modules in "
+            "the base executables",
+        ),
+    ]
+    boolean_options = distutils.command.build_ext.build_ext.boolean_options
+    boolean_options = boolean_options + ["frozen-modules"]
+
+    def initialize_options(self):
+        super().initialize_options()
+        self.frozen_modules = False
+
     def build_extension(self, ext):
         if "bases" not in ext.name:
             super().build_extension(ext)
@@ -23,13 +117,30 @@ class build_ext(distutils.command.build_ext.build_ext):
         if WIN32 and self.compiler.compiler_type == "mingw32":
             ext.sources.append("source/bases/manifest.rc")
         os.environ["LD_RUN_PATH"] = "${ORIGIN}/../lib:${ORIGIN}/lib"
+        macros = list(ext.define_macros or [])
+        if self.frozen_modules:
+            macros.append(("CX_FROZEN_MODULES", None))
         objects = self.compiler.compile(
             ext.sources,
             output_dir=self.build_temp,
+            macros=macros,
             include_dirs=ext.include_dirs,
             debug=self.debug,
             depends=ext.depends,
         )
+        if self.frozen_modules:
+            # the generated source is already in the temporary directory, so
+            # its object is written next to it instead of below output_dir
+            frozen_source = os.path.join(self.build_temp, "frozen_modules.c")
+            self.mkpath(self.build_temp)
+            write_frozen_modules(frozen_source)
+            objects += self.compiler.compile(
+                [frozen_source],
+                output_dir="",
+                macros=macros,
+                include_dirs=ext.include_dirs,
+                debug=self.debug,
+            )
         filename = os.path.splitext(self.get_ext_filename(ext.name))[0]
         if self.inplace:
             fullname = os.path.join(os.path.dirname(__file__), filename)
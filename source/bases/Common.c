@@ -6,6 +6,9 @@
 #include <compile.h>
 #include <eval.h>
 #include <osdefs.h>
+#ifndef MS_WINDOWS
+#include <time.h>
+#endif
 
 // define format for sys.path
 // this consists of <dir>/lib/library.zip and <dir>/lib
@@ -20,6 +23,23 @@
 static wchar_t g_ExecutableName[MAXPATHLEN + 1];
 static wchar_t g_ExecutableDirName[MAXPATHLEN + 1];
 
+#if PY_VERSION_HEX >= 0x03080000
+// runtime configuration of the interpreter, written by the freezer after the
+// marker into the copy of the executable as name=value lines (see
+// cx_Freeze/runtimeconfig.py, which must be kept in sync)
+#define CX_RUNTIME_CONFIG_MARKER        "cx_Freeze runtime configuration"
+#define CX_RUNTIME_CONFIG_SIZE          1024
+static volatile char g_RuntimeConfig[CX_RUNTIME_CONFIG_SIZE] =
+        CX_RUNTIME_CONFIG_MARKER;
+static char g_RuntimeOptionsText[CX_RUNTIME_CONFIG_SIZE];
+static int g_PreInitialized = 0;
+#endif
+
+#ifdef CX_FROZEN_MODULES
+// modules imported when starting, generated when building cx_Freeze
+extern const struct _frozen cx_FrozenModules[];
+#endif
+
 
 //-----------------------------------------------------------------------------
 // SetExecutableName()
@@ -111,16 +131,432 @@ static int SetExecutableName(const wchar_t *wargv0)
 }
 
 
+#ifdef CX_FROZEN_MODULES
+//-----------------------------------------------------------------------------
+// SetFrozenModules()
+//   Add the modules embedded in the executable to the frozen modules known to
+// Python, so that they are imported without reading the zip file.
+//-----------------------------------------------------------------------------
+static int SetFrozenModules(void)
+{
+    const struct _frozen *module;
+    struct _frozen *modules;
+    size_t numEmbedded = 0, numDefault = 0;
+
+    for (module = cx_FrozenModules; module->name; module++)
+        numEmbedded++;
+    for (module = PyImport_FrozenModules; module->name; module++)
+        numDefault++;
+    modules = PyMem_RawMalloc(sizeof(struct _frozen) *
+            (numEmbedded + numDefault + 1));
+    if (!modules)
+        return FatalError("Out of memory creating frozen modules!");
+    memcpy(modules, cx_FrozenModules, sizeof(struct _frozen) * numEmbedded);
+    memcpy(modules + numEmbedded, PyImport_FrozenModules,
+            sizeof(struct _frozen) * (numDefault + 1));
+    PyImport_FrozenModules = modules;
+
+    return 0;
+}
+#endif
+
+
+//-----------------------------------------------------------------------------
+// GetPerfCounter()
+//   Return the value in seconds of the clock used by time.perf_counter(), so
+// that the time spent initializing Python can be reported by the startup
+// tracer in __startup__.py.
+//-----------------------------------------------------------------------------
+static double GetPerfCounter(void)
+{
+#ifdef MS_WINDOWS
+    LARGE_INTEGER counter, frequency;
+
+    QueryPerformanceFrequency(&frequency);
+    QueryPerformanceCounter(&counter);
+    return (double) counter.QuadPart / (double) frequency.QuadPart;
+#else
+    struct timespec ts;
+
+#if defined(__APPLE__) && defined(CLOCK_UPTIME_RAW)
+    clock_gettime(CLOCK_UPTIME_RAW, &ts);
+#else
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+#endif
+    return (double) ts.tv_sec + (double) ts.tv_nsec * 1e-9;
+#endif
+}
+
+
+#if PY_VERSION_HEX >= 0x03080000
+//-----------------------------------------------------------------------------
+// Runtime configuration
+//   Each option is given a value by the configuration baked into the
+// executable and then by its environment variable, if it is allowed by the
+// configuration, with the same meaning as when running python.
+//-----------------------------------------------------------------------------
+typedef struct {
+    PyMemAllocatorName allocator;
+    int utf8Mode;
+    int optimize;
+    int useHashSeed;
+    unsigned long hashSeed;
+    int faultHandler;
+    int dontWriteBytecode;
+    int unbuffered;
+    const char *warnings;
+    const char *ioEncoding;
+} RuntimeConfig;
+
+typedef int (*RuntimeOptionSetter)(RuntimeConfig *, const char *);
+
+static RuntimeConfig g_RuntimeOptions;
+
+static int SetOptimize(RuntimeConfig *rc, const char *value)
+{
+    char *end;
+
+    // a value which is not an integer counts as 1
+    rc->optimize = (int) strtol(value, &end, 10);
+    if (*end || rc->optimize < 0)
+        rc->optimize = 1;
+    return 0;
+}
+
+static int SetHashSeed(RuntimeConfig *rc, const char *value)
+{
+    char *end;
+
+    if (strcmp(value, "random") == 0) {
+        rc->useHashSeed = 0;
+        return 0;
+    }
+    errno = 0;
+    rc->hashSeed = strtoul(value, &end, 10);
+    if (*end || errno || rc->hashSeed > 4294967295UL)
+        return FatalError("Hash seed must be \"random\" or an integer in "
+                "range [0; 4294967295]!");
+    rc->useHashSeed = 1;
+    return 0;
+}
+
+static int SetAllocator(RuntimeConfig *rc, const char *value)
+{
+    static const struct {
+        const char *name;
+        PyMemAllocatorName allocator;
+    } allocators[] = {
+        {"default", PYMEM_ALLOCATOR_DEFAULT},
+        {"debug", PYMEM_ALLOCATOR_DEBUG},
+        {"malloc", PYMEM_ALLOCATOR_MALLOC},
+        {"malloc_debug", PYMEM_ALLOCATOR_MALLOC_DEBUG},
+        {"pymalloc", PYMEM_ALLOCATOR_PYMALLOC},
+        {"pymalloc_debug", PYMEM_ALLOCATOR_PYMALLOC_DEBUG},
+    };
+    size_t i;
+
+    for (i = 0; i < sizeof(allocators) / sizeof(allocators[0]); i++) {
+        if (strcmp(value, allocators[i].name) == 0) {
+            rc->allocator = allocators[i].allocator;
+            return 0;
+        }
+    }
+    return FatalError("Unknown memory allocator!");
+}
+
+static int SetUTF8Mode(RuntimeConfig *rc, const char *value)
+{
+    if (strcmp(value, "0") != 0 && strcmp(value, "1") != 0)
+        return FatalError("UTF-8 mode must be 0 or 1!");
+    rc->utf8Mode = (value[0] == '1');
+    return 0;
+}
+
+static int SetFaultHandler(RuntimeConfig *rc, const char *value)
+{
+    rc->faultHandler = 1;
+    return 0;
+}
+
+static int SetDontWriteBytecode(RuntimeConfig *rc, const char *value)
+{
+    rc->dontWriteBytecode = 1;
+    return 0;
+}
+
+static int SetUnbuffered(RuntimeConfig *rc, const char *value)
+{
+    rc->unbuffered = 1;
+    return 0;
+}
+
+static int SetWarnings(RuntimeConfig *rc, const char *value)
+{
+    rc->warnings = value;
+    return 0;
+}
+
+static int SetIOEncoding(RuntimeConfig *rc, const char *value)
+{
+    rc->ioEncoding = value;
+    return 0;
+}
+
+static const struct {
+    const char *name;
+    const char *envName;
+    RuntimeOptionSetter setter;
+} cx_RuntimeOptions[] = {
+    {"optimize", "PYTHONOPTIMIZE", SetOptimize},
+    {"hash_seed", "PYTHONHASHSEED", SetHashSeed},
+    {"allocator", "PYTHONMALLOC", SetAllocator},
+    {"utf8_mode", "PYTHONUTF8", SetUTF8Mode},
+    {"faulthandler", "PYTHONFAULTHANDLER", SetFaultHandler},
+    {"dont_write_bytecode", "PYTHONDONTWRITEBYTECODE", SetDontWriteBytecode},
+    {"unbuffered", "PYTHONUNBUFFERED", SetUnbuffered},
+    {"warnings", "PYTHONWARNINGS", SetWarnings},
+    {"io_encoding", "PYTHONIOENCODING", SetIOEncoding},
+    {NULL, NULL, NULL}
+};
+
+
+//-----------------------------------------------------------------------------
+// ReadRuntimeConfig()
+//   Read the runtime configuration baked into the executable, followed by
+// the environment variables it allows. The buffer receives a copy of the
+// configuration, which the values of the options point into.
+//-----------------------------------------------------------------------------
+static int ReadRuntimeConfig(RuntimeConfig *rc, char *buffer)
+{
+    char *line, *next, *value, *environment = NULL, *envValue;
+    size_t i, offset = sizeof(CX_RUNTIME_CONFIG_MARKER);
+
+    memset(rc, 0, sizeof(RuntimeConfig));
+    rc->optimize = -1;
+    rc->allocator = PYMEM_ALLOCATOR_NOT_SET;
+    rc->utf8Mode = -1;
+    rc->useHashSeed = -1;
+
+    for (i = 0; offset + i < CX_RUNTIME_CONFIG_SIZE; i++)
+        buffer[i] = g_RuntimeConfig[offset + i];
+    buffer[i - 1] = '\0';
+
+    for (line = buffer; *line; line = next) {
+        next = strchr(line, '\n');
+        if (next)
+            *next++ = '\0';
+        else next = line + strlen(line);
+        value = strchr(line, '=');
+        if (!value)
+            continue;
+        *value++ = '\0';
+        if (strcmp(line, "environment") == 0) {
+            environment = value;
+            continue;
+        }
+        for (i = 0; cx_RuntimeOptions[i].name; i++) {
+            if (strcmp(line, cx_RuntimeOptions[i].name) == 0) {
+                if (cx_RuntimeOptions[i].setter(rc, value) < 0)
+                    return -1;
+                break;
+            }
+        }
+    }
+
+    // environment variables are ignored when empty, as by python
+    while (environment && *environment) {
+        next = strchr(environment, ',');
+        if (next)
+            *next++ = '\0';
+        for (i = 0; cx_RuntimeOptions[i].name; i++) {
+            if (strcmp(environment, cx_RuntimeOptions[i].envName) != 0)
+                continue;
+            envValue = getenv(environment);
+            if (envValue && *envValue &&
+                    cx_RuntimeOptions[i].setter(rc, envValue) < 0)
+                return -1;
+            break;
+        }
+        environment = next;
+    }
+
+    return 0;
+}
+
+
+//-----------------------------------------------------------------------------
+// ApplyRuntimeConfig()
+//   Apply the runtime configuration to the configuration of Python, once
+// Python is preinitialized.
+//-----------------------------------------------------------------------------
+static PyStatus ApplyRuntimeConfig(PyConfig *config, RuntimeConfig *rc)
+{
+    PyStatus status;
+    wchar_t *wvalue;
+    char *copy, *item, *next, *errors;
+
+    if (rc->optimize >= 0)
+        config->optimization_level = rc->optimize;
+    if (rc->useHashSeed >= 0) {
+        config->use_hash_seed = rc->useHashSeed;
+        config->hash_seed = rc->hashSeed;
+    }
+    config->faulthandler = rc->faultHandler;
+    config->write_bytecode = !rc->dontWriteBytecode;
+    config->buffered_stdio = !rc->unbuffered;
+
+    if (rc->ioEncoding) {
+        copy = PyMem_RawMalloc(strlen(rc->ioEncoding) + 1);
+        if (!copy)
+            return PyStatus_NoMemory();
+        strcpy(copy, rc->ioEncoding);
+        errors = strchr(copy, ':');
+        if (errors)
+            *errors++ = '\0';
+        status = PyStatus_Ok();
+        if (*copy)
+            status = PyConfig_SetBytesString(config, &config->stdio_encoding,
+                    copy);
+        if (!PyStatus_Exception(status) && errors && *errors)
+            status = PyConfig_SetBytesString(config, &config->stdio_errors,
+                    errors);
+        PyMem_RawFree(copy);
+        if (PyStatus_Exception(status))
+            return status;
+    }
+
+    if (rc->warnings) {
+        copy = PyMem_RawMalloc(strlen(rc->warnings) + 1);
+        if (!copy)
+            return PyStatus_NoMemory();
+        strcpy(copy, rc->warnings);
+        for (item = copy; item; item = next) {
+            next = strchr(item, ',');
+            if (next)
+                *next++ = '\0';
+            if (!*item)
+                continue;
+            wvalue = Py_DecodeLocale(item, NULL);
+            if (!wvalue) {
+                PyMem_RawFree(copy);
+                return PyStatus_NoMemory();
+            }
+            status = PyWideStringList_Append(&config->warnoptions, wvalue);
+            PyMem_RawFree(wvalue);
+            if (PyStatus_Exception(status)) {
+                PyMem_RawFree(copy);
+                return status;
+            }
+        }
+        PyMem_RawFree(copy);
+    }
+
+    return PyStatus_Ok();
+}
+
+
+//-----------------------------------------------------------------------------
+// InitializeConfig()
+//   Initialize the configuration of Python, with the same settings as the
+// legacy global flags used before Python 3.8 (no site, frozen, environment
+// ignored) followed by the runtime configuration.
+//-----------------------------------------------------------------------------
+static PyStatus InitializeConfig(PyConfig *config, RuntimeConfig *rc,
+        wchar_t *path)
+{
+    wchar_t *entry, *delim;
+    PyStatus status;
+
+    PyConfig_InitPythonConfig(config);
+    config->parse_argv = 0;
+    config->use_environment = 0;
+    config->site_import = 0;
+    config->pathconfig_warnings = 0;
+    config->configure_c_stdio = 0;
+    status = PyConfig_SetString(config, &config->program_name,
+            g_ExecutableName);
+    if (PyStatus_Exception(status))
+        return status;
+    status = PyConfig_SetString(config, &config->executable,
+            g_ExecutableName);
+    if (PyStatus_Exception(status))
+        return status;
+    status = PyConfig_SetString(config, &config->prefix, L"");
+    if (PyStatus_Exception(status))
+        return status;
+    status = PyConfig_SetString(config, &config->exec_prefix, L"");
+    if (PyStatus_Exception(status))
+        return status;
+    for (entry = path; entry; entry = delim) {
+        delim = wcschr(entry, DELIM);
+        if (delim)
+            *delim++ = L'\0';
+        status = PyWideStringList_Append(&config->module_search_paths,
+                entry);
+        if (PyStatus_Exception(status))
+            return status;
+    }
+    config->module_search_paths_set = 1;
+    return ApplyRuntimeConfig(config, rc);
+}
+#endif
+
+
+//-----------------------------------------------------------------------------
+// PreInitializePython()
+//   Preinitialize Python with the memory allocator and UTF-8 mode of the
+// runtime configuration. This must be done before Python allocates any
+// memory, so the bases call it before converting the arguments; calling it
+// again does nothing.
+//-----------------------------------------------------------------------------
+static int PreInitializePython(void)
+{
+#if PY_VERSION_HEX >= 0x03080000
+    PyPreConfig preconfig;
+    PyStatus status;
+
+    if (g_PreInitialized)
+        return 0;
+    if (ReadRuntimeConfig(&g_RuntimeOptions, g_RuntimeOptionsText) < 0)
+        return -1;
+    PyPreConfig_InitPythonConfig(&preconfig);
+    preconfig.parse_argv = 0;
+    preconfig.use_environment = 0;
+    preconfig.coerce_c_locale = 0;
+    preconfig.coerce_c_locale_warn = 0;
+    preconfig.utf8_mode = g_RuntimeOptions.utf8Mode > 0;
+    preconfig.allocator = g_RuntimeOptions.allocator;
+    status = Py_PreInitialize(&preconfig);
+    if (PyStatus_Exception(status))
+        Py_ExitStatusException(status);
+    g_PreInitialized = 1;
+#endif
+    return 0;
+}
+
+
 //-----------------------------------------------------------------------------
 // InitializePython()
 //   Initialize Python on all platforms.
 //-----------------------------------------------------------------------------
 static int InitializePython(int argc, wchar_t **argv)
 {
+#if PY_VERSION_HEX >= 0x03080000
+    PyConfig config;
+    PyStatus status;
+#endif
+    PyObject *initTimes;
+    double startTime;
     char *path;
     wchar_t *wpath;
     size_t size;
 
+    startTime = GetPerfCounter();
+
+    // preinitialize Python, unless the base already did
+    if (PreInitializePython() < 0)
+        return -1;
+
     // determine executable name
     if (SetExecutableName(argv[0]) < 0)
         return -1;
@@ -137,13 +573,30 @@ static int InitializePython(int argc, wchar_t **argv)
     if (!wpath)
         return FatalError("Unable to convert path to string!");
 
+#ifdef CX_FROZEN_MODULES
+    // embedded modules
+    if (SetFrozenModules() < 0)
+        return -1;
+#endif
+
     // initialize Python
+#if PY_VERSION_HEX >= 0x03080000
+    status = InitializeConfig(&config, &g_RuntimeOptions, wpath);
+    if (!PyStatus_Exception(status))
+        status = Py_InitializeFromConfig(&config);
+    PyConfig_Clear(&config);
+    if (PyStatus_Exception(status)) {
+        PyMem_RawFree(wpath);
+        Py_ExitStatusException(status);
+    }
+#else
     Py_NoSiteFlag = 1;
     Py_FrozenFlag = 1;
     Py_IgnoreEnvironmentFlag = 1;
     Py_SetProgramName(g_ExecutableName);
     Py_SetPath(wpath);
     Py_Initialize();
+#endif
 #ifdef MS_WINDOWS
     PySys_SetArgv(argc, argv);
 #else
@@ -152,6 +605,12 @@ static int InitializePython(int argc, wchar_t **argv)
 
     PyMem_RawFree(wpath);
 
+    // record the time spent until now, for the startup tracer
+    initTimes = Py_BuildValue("(dd)", startTime, GetPerfCounter());
+    if (!initTimes || PySys_SetObject("_cx_freeze_init_times", initTimes) < 0)
+        PyErr_Clear();
+    Py_XDECREF(initTimes);
+
     return 0;
 }
 
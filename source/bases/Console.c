@@ -73,7 +73,10 @@ int main(int argc, char **argv)
     int i;
 
     // convert arguments to wide characters, using the system default locale
+    // (and the memory allocator of the runtime configuration)
     setlocale(LC_ALL, "");
+    if (PreInitializePython() < 0)
+        return 1;
     wargv = PyMem_RawMalloc(sizeof(wchar_t*) * argc);
     if (!wargv)
         return FatalError("Out of memory converting arguments!");
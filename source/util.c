@@ -56,6 +56,7 @@ typedef struct {
 #ifdef MS_WINDOWS
 static PyObject *g_BindErrorException = NULL;
 static PyObject *g_ImageNames = NULL;
+static const char *g_DllPath = NULL;
 #endif
 
 #ifdef MS_WINDOWS
@@ -80,9 +81,12 @@ static BOOL __stdcall BindStatusRoutine(
             PathRemoveFileSpec(imagePath);
             if (!SearchPath(imagePath, dllName, NULL, sizeof(fileName),
                     fileName, NULL)) {
-                if (!SearchPath(NULL, dllName, NULL, sizeof(fileName),
-                        fileName, NULL))
-                    return FALSE;
+                if (!g_DllPath || !SearchPath(g_DllPath, dllName, NULL,
+                        sizeof(fileName), fileName, NULL)) {
+                    if (!SearchPath(NULL, dllName, NULL, sizeof(fileName),
+                            fileName, NULL))
+                        return FALSE;
+                }
             }
             Py_INCREF(Py_None);
             if (PyDict_SetItemString(g_ImageNames, fileName, Py_None) < 0)
@@ -335,27 +339,33 @@ static PyObject *ExtEndUpdateResource(
 
 //-----------------------------------------------------------------------------
 // ExtGetDependentFiles()
-//   Return a list of files that this file depends on.
+//   Return a list of files that this file depends on. The optional DLL path
+// is searched (before the default search path) for the dependencies that are
+// not found in the directory of the image which needs them; the GIL is held
+// throughout, which protects the global state used by BindStatusRoutine().
 //-----------------------------------------------------------------------------
 static PyObject *ExtGetDependentFiles(
     PyObject *self,                     // passthrough argument
     PyObject *args)                     // arguments
 {
     PyObject *results;
-    char *imageName;
+    char *imageName, *dllPath = NULL;
 
-    if (!PyArg_ParseTuple(args, "s", &imageName))
+    if (!PyArg_ParseTuple(args, "s|z", &imageName, &dllPath))
         return NULL;
     g_ImageNames = PyDict_New();
     if (!g_ImageNames)
         return NULL;
+    g_DllPath = dllPath;
     if (!BindImageEx(BIND_NO_BOUND_IMPORTS | BIND_NO_UPDATE | BIND_ALL_IMAGES,
-                imageName, NULL, NULL, BindStatusRoutine)) {
+                imageName, dllPath, NULL, BindStatusRoutine)) {
+        g_DllPath = NULL;
         Py_DECREF(g_ImageNames);
         PyErr_SetExcFromWindowsErrWithFilename(g_BindErrorException,
                 GetLastError(), imageName);
         return NULL;
     }
+    g_DllPath = NULL;
     results = PyDict_Keys(g_ImageNames);
     Py_DECREF(g_ImageNames);
     return results;
@@ -1,10 +1,11 @@
+import importlib.machinery
 from unittest import mock
 import os.path
 import sys
 
 test_dir = os.path.dirname(__file__)
 
-from cx_Freeze.finder import ModuleFinder
+from cx_Freeze.finder import ModuleFinder, _PathIndex
 
 any3 = (mock.ANY,) * 3
 
@@ -58,3 +59,259 @@ def test_invalid_syntax():
         pass
     else:
         assert False, "Expected ImportError, but no error was raised"
+
+
+def test_scan_cache(tmp_path):
+    """A warm scan cache should be used instead of compiling the source."""
+    sample = os.path.join(test_dir, "imports_sample.py")
+    cache_dir = str(tmp_path)
+    mf = ModuleFinder(cache_dir=cache_dir)
+    with mock.patch.object(mf, "_import_module") as _ImportModule_mock:
+        _ImportModule_mock.return_value = None
+        mf.IncludeFile(sample)
+        cold_calls = [c[0][::3] for c in _ImportModule_mock.call_args_list]
+    mf = ModuleFinder(cache_dir=cache_dir)
+    with mock.patch.object(
+        importlib.machinery.SourceFileLoader, "source_to_code"
+    ) as source_to_code_mock, mock.patch.object(
+        mf, "_import_module"
+    ) as _ImportModule_mock:
+        _ImportModule_mock.return_value = None
+        module = mf.IncludeFile(sample)
+        source_to_code_mock.assert_not_called()
+        warm_calls = [c[0][::3] for c in _ImportModule_mock.call_args_list]
+        assert warm_calls == cold_calls
+    assert module.code is not None
+
+    # files generated for a single build are not cached
+    generated = tmp_path / "generated.py"
+    generated.write_text("VALUE = 1\n")
+    mf = ModuleFinder(cache_dir=cache_dir)
+    assert mf.IncludeFile(str(generated), cache=False).code is not None
+    assert not mf._scan_cache.contains(str(generated), mf.optimize_flag)
+    mf = ModuleFinder(cache_dir=cache_dir)
+    mf.IncludeFile(str(generated))
+    assert mf._scan_cache.contains(str(generated), mf.optimize_flag)
+
+
+def test_jobs(tmp_path, monkeypatch):
+    """Worker processes should find the same modules, with the same code."""
+    from cx_Freeze.finder import _get_mp_context, _has_main_guard
+
+    found = {}
+    for jobs in (1, 2):
+        mf = ModuleFinder(jobs=jobs)
+        try:
+            mf.IncludePackage("email")
+            mf.IncludeModule("json")
+        finally:
+            mf.Close()
+        found[jobs] = {m.name: m.code for m in mf.modules}
+    assert sorted(found[1]) == sorted(found[2])
+    assert found[1]["email.message"] == found[2]["email.message"]
+
+    # once closed, the finder compiles in-process
+    mf.IncludeModule("csv")
+    assert mf._executor is None
+
+    # spawned workers are only used if the main script has a __main__ guard
+    script = tmp_path / "setup.py"
+    script.write_text("from cx_Freeze import setup\nsetup()\n")
+    assert not _has_main_guard(str(script))
+    monkeypatch.setattr(sys.modules["__main__"], "__file__", str(script))
+    monkeypatch.setattr(sys, "platform", "darwin")
+    assert _get_mp_context() is None
+    script.write_text("if __name__ == '__main__':\n    setup()\n")
+    assert _has_main_guard(str(script))
+    # on macOS, where forking is not safe, workers are then spawned
+    assert _get_mp_context().get_start_method() == "spawn"
+
+
+def test_path_index():
+    """The path index should resolve the same specs as the PathFinder."""
+    path_index = _PathIndex()
+    path = [os.path.join(test_dir, "samples")] + sys.path
+    for name in ("os", "json", "testpkg1", "testmod1", "_ctypes", "missing"):
+        expected = importlib.machinery.PathFinder.find_spec(name, path)
+        spec = path_index.find_spec(name, path)
+        if expected is None:
+            assert spec is None
+        else:
+            assert spec.origin == expected.origin
+            assert type(spec.loader) is type(expected.loader)
+            assert spec.submodule_search_locations == (
+                expected.submodule_search_locations
+            )
+
+
+def test_static_guards(tmp_path):
+    import ast
+
+    from cx_Freeze.guards import evaluate_guard, find_import_guards
+
+    source = tmp_path / "guarded.py"
+    source.write_text(
+        "import os, sys\n"
+        "from typing import TYPE_CHECKING\n"
+        "WINDOWS = sys.platform == 'win32'\n"
+        "if TYPE_CHECKING:\n"
+        "    import typed_only\n"
+        "if WINDOWS:\n"
+        "    import windows_only\n"
+        "else:\n"
+        "    import not_windows\n"
+        "def func():\n"
+        "    if sys.version_info < (3,) or os.name == 'java':\n"
+        "        import py2_only\n"
+        "if os.name == 'nt' or unknown_condition:\n"
+        "    import maybe\n"
+    )
+    guards = find_import_guards(ast.parse(source.read_text()))
+    assert sorted(guards) == [5, 7, 9, 12, 14]
+    windows = {"sys.platform": "win32", "os.name": "nt"}
+    linux = {"sys.platform": "linux", "os.name": "posix"}
+    assert evaluate_guard(guards[5], windows) is False
+    assert evaluate_guard(guards[7], windows) is True
+    assert evaluate_guard(guards[9], linux) is True
+    assert evaluate_guard(guards[14], windows) is True
+    assert evaluate_guard(guards[14], linux) is None
+
+    mf = ModuleFinder(static_guards=True)
+    with mock.patch.object(mf, "_import_module") as _ImportModule_mock:
+        _ImportModule_mock.return_value = None
+        module = mf.IncludeFile(str(source))
+    imported = [c.args[0] for c in _ImportModule_mock.call_args_list]
+    skipped = {"typed_only", "py2_only"}
+    if sys.platform == "win32":
+        skipped.add("not_windows")
+    else:
+        skipped.add("windows_only")
+    assert module.dead_imports == skipped
+    assert not skipped.intersection(imported)
+    assert "maybe" in imported
+
+
+def test_optional_imports(tmp_path):
+    import ast
+
+    from cx_Freeze.graph import ImportGraph
+    from cx_Freeze.guards import find_optional_imports
+
+    main = tmp_path / "main.py"
+    main.write_text(
+        "import required\n"
+        "try:\n"
+        "    import optional\n"
+        "    from optional import sub\n"
+        "except ImportError:\n"
+        "    optional = None\n"
+        "try:\n"
+        "    import required\n"
+        "except (KeyError, ModuleNotFoundError):\n"
+        "    pass\n"
+    )
+    assert find_optional_imports(ast.parse(main.read_text())) == {3, 4, 8}
+    (tmp_path / "required.py").write_text("")
+    (tmp_path / "optional").mkdir()
+    (tmp_path / "optional" / "__init__.py").write_text("import only_optional")
+    (tmp_path / "optional" / "sub.py").write_text("import required")
+    (tmp_path / "only_optional.py").write_text("")
+
+    mf = ModuleFinder(path=[str(tmp_path)] + sys.path, optional_imports=True)
+    mf.IncludeFile(str(main))
+    # imported where ImportError is not handled as well
+    assert mf.edges[("main", "required", "import")] is False
+    assert mf.edges[("main", "optional", "import")] is True
+    assert mf.edges[("main", "optional.sub", "from-list")] is True
+    names = [module.name for module in mf.modules]
+    graph = ImportGraph(names, mf.edges, ["main"])
+    dependencies = graph.get_optional_dependencies()
+    assert dependencies["optional"] == ["main"]
+    assert "optional.sub" not in dependencies
+    assert "required" not in dependencies
+    assert graph.get_exclusive_modules(["optional"]) == {
+        "optional",
+        "optional.sub",
+        "only_optional",
+    }
+
+
+def test_hook_replaced_code(tmp_path, monkeypatch):
+    from cx_Freeze.common import code_object_replace
+
+    (tmp_path / "hooked.py").write_text(
+        "import sys\n"
+        "if sys.platform == 'never':\n"
+        "    import never_imported\n"
+        "try:\n"
+        "    import maybe_missing\n"
+        "except ImportError:\n"
+        "    pass\n"
+    )
+    (tmp_path / "maybe_missing.py").write_text("")
+    (tmp_path / "injected_import.py").write_text("")
+
+    # a hook replacing the code like those of cx_Freeze.hooks do, adding a
+    # function with an import at the line of the guarded import
+    def load_hooked(finder, module):
+        injected = compile(
+            "def injected():\n\n    import injected_import\n",
+            module.file,
+            "exec",
+        )
+        consts = list(module.code.co_consts) + [injected.co_consts[0]]
+        module.code = code_object_replace(module.code, co_consts=consts)
+
+    mf = ModuleFinder(
+        path=[str(tmp_path)] + sys.path,
+        static_guards=True,
+        optional_imports=True,
+    )
+    monkeypatch.setattr(mf._hooks, "load_hooked", load_hooked, raising=False)
+    module = mf.IncludeModule("hooked")
+    # the analysis of the source still applies to the replaced code
+    assert module.dead_imports == {"never_imported"}
+    assert mf.edges[("hooked", "maybe_missing", "import")] is True
+    # but not to the code added by the hook
+    assert mf.edges[("hooked", "injected_import", "import")] is False
+
+
+def test_import_graph(tmp_path):
+    import json
+
+    from cx_Freeze.graph import ImportGraph
+
+    (tmp_path / "main.py").write_text("import first\nfrom star import *\n")
+    (tmp_path / "first.py").write_text("from pkg import sub\nimport aliased")
+    (tmp_path / "star.py").write_text("")
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "__init__.py").write_text("")
+    (tmp_path / "pkg" / "sub.py").write_text("import leaf")
+    (tmp_path / "leaf.py").write_text("")
+    (tmp_path / "actual.py").write_text("")
+
+    mf = ModuleFinder(path=[str(tmp_path)] + sys.path)
+    mf.AddAlias("aliased", "actual")
+    mf.IncludeFile(str(tmp_path / "main.py"))
+    assert ("main", "star", "star") in mf.edges
+    assert ("first", "actual", "alias") in mf.edges
+    assert ("first", "pkg.sub", "from-list") in mf.edges
+
+    names = [module.name for module in mf.modules]
+    graph = ImportGraph(names, mf.edges, ["main"])
+    assert graph.get_shortest_path("leaf", ["main"]) == [
+        ("main", "root"),
+        ("first", "import"),
+        ("pkg.sub", "from-list"),
+        ("leaf", "import"),
+    ]
+    assert graph.get_excluded_modules(["pkg"]) == {"pkg", "pkg.sub", "leaf"}
+    assert graph.get_shortest_path("leaf", ["star"]) is None
+
+    explanations = {"leaf": graph.explain("leaf", ["main"])}
+    graph.write(str(tmp_path / "graph.json"), explanations)
+    data = json.loads((tmp_path / "graph.json").read_text())
+    assert data["explanations"]["leaf"]["excluded"] == ["leaf"]
+    graph.write(str(tmp_path / "graph.dot"), explanations)
+    dot = (tmp_path / "graph.dot").read_text()
+    assert '"pkg.sub" -> "leaf" [label="import", color=red];' in dot
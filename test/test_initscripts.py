@@ -0,0 +1,272 @@
+import os.path
+import subprocess
+import sys
+
+import cx_Freeze
+
+initscripts_dir = os.path.join(
+    os.path.dirname(cx_Freeze.__file__), "initscripts"
+)
+
+FORK_SERVER_DRIVER = """
+import importlib.util
+import os
+import signal
+import socket
+import sys
+import time
+import types
+
+# the version of the server is that of the executable and its zip files
+sys.path = [{initscripts_dir!r}] + [p for p in sys.path if os.path.exists(p)]
+sys.modules["BUILD_CONSTANTS"] = types.ModuleType("BUILD_CONSTANTS")
+spec = importlib.util.spec_from_file_location(
+    "app__init__", os.path.join({initscripts_dir!r}, "ConsoleForkServer.py")
+)
+init_script = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(init_script)
+client_pid = os.getpid()
+
+
+def run_main():
+    print("stdout", sys.argv[1:], os.environ["CX_TEST"], os.getcwd())
+    print("stderr", os.getpid() != client_pid, file=sys.stderr)
+    raise SystemExit(3)
+
+
+init_script._run_main = run_main
+init_script._get_socket_path = lambda version: {socket_path!r}
+server_pid = os.fork()
+if server_pid == 0:
+    # the standard streams of the client are passed to the server
+    null_fd = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(null_fd, fd)
+    try:
+        init_script._serve({socket_path!r}, init_script._get_version())
+    finally:
+        os._exit(0)
+for _ in range(500):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect({socket_path!r})
+        break
+    except OSError:
+        time.sleep(0.01)
+    finally:
+        probe.close()
+try:
+    status = init_script._run_in_server()
+finally:
+    os.kill(server_pid, signal.SIGTERM)
+    os.waitpid(server_pid, 0)
+sys.exit(status)
+"""
+
+
+def test_fork_server(tmp_path):
+    if not sys.platform.startswith("linux"):
+        return
+    driver = tmp_path / "driver.py"
+    driver.write_text(
+        FORK_SERVER_DRIVER.format(
+            initscripts_dir=initscripts_dir,
+            socket_path=str(tmp_path / "server.sock"),
+        )
+    )
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    env = dict(os.environ, CX_TEST="passed")
+    result = subprocess.run(
+        [sys.executable, str(driver), "a", "b"],
+        cwd=str(work_dir),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        timeout=60,
+    )
+    # the script ran in a process forked from the server, with the
+    # arguments, environment, working directory, standard streams and exit
+    # status of the client
+    assert result.returncode == 3, result.stderr
+    assert result.stdout == f"stdout ['a', 'b'] passed {work_dir}\n"
+    assert result.stderr == "stderr True\n"
+
+
+
+VERSION_DRIVER = """
+import importlib.util
+import os
+import sys
+import types
+
+sys.path = [{initscripts_dir!r}, {zip_path!r}] + [
+    p for p in sys.path[1:] if os.path.exists(p)
+]
+sys.modules["BUILD_CONSTANTS"] = types.ModuleType("BUILD_CONSTANTS")
+spec = importlib.util.spec_from_file_location(
+    "app__init__", os.path.join({initscripts_dir!r}, "ConsoleForkServer.py")
+)
+init_script = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(init_script)
+print(init_script._get_version())
+"""
+
+
+def test_fork_server_version(tmp_path):
+    import zipfile
+
+    from cx_Freeze.archive import IndexedArchiveWriter
+
+    if sys.platform == "win32":
+        return
+    zip_path = tmp_path / "library.zip"
+    zipfile.ZipFile(str(zip_path), "w").close()
+    driver = tmp_path / "driver.py"
+    driver.write_text(
+        VERSION_DRIVER.format(
+            initscripts_dir=initscripts_dir, zip_path=str(zip_path)
+        )
+    )
+
+    def get_version():
+        return subprocess.check_output(
+            [sys.executable, str(driver)], universal_newlines=True
+        )
+
+    def write_indexed_archive(*module_names):
+        writer = IndexedArchiveWriter(str(tmp_path / "library.cxa"))
+        for name in module_names:
+            writer.add_module(name, False, compile("", name, "exec"))
+        writer.close()
+
+    # rewriting only the indexed or the hot archive changes the version
+    versions = [get_version()]
+    with zipfile.ZipFile(str(tmp_path / "library_hot.zip"), "w") as hot:
+        hot.writestr("mod1.pyc", b"")
+    versions.append(get_version())
+    write_indexed_archive("mod1")
+    versions.append(get_version())
+    write_indexed_archive("mod1", "mod2")
+    versions.append(get_version())
+    assert len(set(versions)) == len(versions)
+
+
+TRACER_DRIVER = """
+import importlib.util
+import os
+import sys
+import types
+
+sys.path[0] = {initscripts_dir!r}
+constants = types.ModuleType("BUILD_CONSTANTS")
+constants.TRACE_STARTUP = True
+constants.ORIGIN_RPATH = True
+sys.modules["BUILD_CONSTANTS"] = constants
+import __startup__
+
+spec = importlib.util.spec_from_file_location(
+    "app__init__", os.path.join({initscripts_dir!r}, sys.argv[1] + ".py")
+)
+init_script = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(init_script)
+
+
+class MainLoader:
+    def get_code(self, name):
+        assert name == "app__main__"
+        return compile("import colorsys", "app.py", "exec")
+
+
+init_script.__loader__ = MainLoader()
+init_script.run()
+"""
+
+
+def test_startup_tracer(tmp_path):
+    import json
+
+    driver = tmp_path / "driver.py"
+    driver.write_text(TRACER_DRIVER.format(initscripts_dir=initscripts_dir))
+    trace = tmp_path / "trace.json"
+    env = dict(
+        os.environ, CXFREEZE_TRACE=str(trace), CX_FREEZE_FORK_SERVER="0"
+    )
+    init_scripts = ["Console"]
+    if sys.platform != "win32":
+        init_scripts += ["ConsoleSetLibPath", "ConsoleForkServer"]
+    for init_script in init_scripts:
+        subprocess.run(
+            [sys.executable, str(driver), init_script], env=env, check=True
+        )
+        # every init script marks the start of the main script
+        data = json.loads(trace.read_text())
+        phases = data["phases_us"]
+        assert list(phases) == ["tracer", "main", "exit"]
+        assert data["time_to_main_us"] == phases["main"]
+        assert "colorsys" not in data["modules_before_tracer"]
+        imports = {record["name"]: record for record in data["imports"]}
+        record = imports["colorsys"]
+        assert record["level"] == 0
+        assert record["start_us"] >= phases["main"]
+        assert record["cumulative_us"] >= record["self_us"] >= 0
+        assert record["source"].endswith("colorsys.py")
+        assert "colorsys" in data["modules"]
+        trace.unlink()
+
+
+EXTENSION_SCRIPT = """
+import sys
+
+import extpkg._json
+
+# the file name recorded in BUILD_CONSTANTS was looked up, not searched for
+finder = sys.modules["__startup__"].ExtensionFinder
+print(finder._file_names)
+print(extpkg._json.__spec__.origin)
+"""
+
+
+def test_extension_modules(tmp_path):
+    import _json
+    import shutil
+
+    from cx_Freeze import Executable
+    from cx_Freeze.freezer import Freezer
+
+    # _json is built in on Windows
+    if not hasattr(_json, "__file__"):
+        return
+    # an extension module of a package stored in the zip file, found by the
+    # name of its init function
+    package_dir = tmp_path / "extpkg"
+    package_dir.mkdir()
+    (package_dir / "__init__.py").write_text("")
+    file_name = os.path.basename(_json.__file__)
+    shutil.copyfile(_json.__file__, str(package_dir / file_name))
+    script = tmp_path / "script.py"
+    script.write_text(EXTENSION_SCRIPT)
+    target_dir = tmp_path / "build"
+    freezer = Freezer(
+        [Executable(str(script))],
+        path=[str(tmp_path)] + sys.path,
+        targetDir=str(target_dir),
+        includeFiles=[],
+        zipIncludes=[],
+        zipIncludePackages=["extpkg"],
+        silent=True,
+    )
+    freezer.Freeze()
+
+    name = "extpkg." + file_name
+    assert (target_dir / "lib" / name).is_file()
+    exe_name = "script.exe" if sys.platform == "win32" else "script"
+    output = subprocess.run(
+        [str(target_dir / exe_name)],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    ).stdout.splitlines()
+    assert output[0] == repr({"extpkg._json": name})
+    assert output[1] == str(target_dir / "lib" / name)
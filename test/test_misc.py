@@ -28,3 +28,593 @@ def test_process_path_specs_bad():
 
     with assert_raises(ConfigError):
         process_path_specs([("a", "b", "c")])
+
+
+def test_elf_dependent_files(tmp_path):
+    if not sys.platform.startswith("linux"):
+        return
+    import _ctypes
+    import shutil
+
+    from cx_Freeze.elftools import LibraryResolver
+
+    # a copy without the exec bit is still resolved
+    path = str(tmp_path / os.path.basename(_ctypes.__file__))
+    shutil.copyfile(_ctypes.__file__, path)
+    os.chmod(path, 0o644)
+    dependent_files, missing = LibraryResolver().get_dependent_files(path)
+    assert missing == []
+    assert any(os.path.basename(f) == "libc.so.6" for f in dependent_files)
+    assert all(os.path.isabs(f) for f in dependent_files)
+    assert LibraryResolver().get_dependent_files(__file__) == ([], [])
+
+
+def test_elf_set_search_path(tmp_path):
+    if not sys.platform.startswith("linux"):
+        return
+    import _ctypes
+    import shutil
+
+    from cx_Freeze.elftools import DT_RPATH, ELFFile
+    from cx_Freeze.freezer import Freezer
+
+    # the freezer is told when the search path of a copy cannot be set
+    not_elf = tmp_path / "not_elf.so"
+    not_elf.write_bytes(b"not an ELF file")
+    assert not Freezer._SetSearchPath(str(not_elf), "$ORIGIN", False)
+
+    path = str(tmp_path / os.path.basename(_ctypes.__file__))
+    shutil.copyfile(_ctypes.__file__, path)
+    elf_file = ELFFile(path)
+    if elf_file.raw_rpath is None and elf_file.raw_runpath is None:
+        assert not elf_file.set_search_path("$ORIGIN")
+        return
+    assert not elf_file.set_search_path("x" * 4096)
+    assert elf_file.set_search_path("$ORIGIN", DT_RPATH)
+    elf_file = ELFFile(path)
+    assert elf_file.raw_rpath == "$ORIGIN"
+    assert elf_file.raw_runpath is None
+    assert elf_file.rpath == [str(tmp_path)]
+    assert elf_file.needed == ELFFile(_ctypes.__file__).needed
+
+
+def test_distribution_index(tmp_path):
+    from cx_Freeze.module import DistributionIndex
+
+    for name, top_level, requires in (
+        ("foo", ["foo", "foo_extra"], ["bar (>=1.0)"]),
+        ("bar", ["bar"], []),
+    ):
+        dist_info = tmp_path / f"{name}-1.0.dist-info"
+        dist_info.mkdir()
+        metadata = [f"Name: {name}", "Version: 1.0"]
+        metadata += [f"Requires-Dist: {r}" for r in requires]
+        (dist_info / "METADATA").write_text("\n".join(metadata) + "\n")
+        (dist_info / "top_level.txt").write_text("\n".join(top_level))
+        records = ["METADATA", "top_level.txt", "RECORD"]
+        (dist_info / "RECORD").write_text(
+            "".join(f"{dist_info.name}/{r},,\n" for r in records)
+        )
+
+    # the files are given for each module, not only for the first one (which
+    # may be excluded later), and written once (see Freezer._WriteModules)
+    index = DistributionIndex([str(tmp_path)])
+    foo_files = index.get_dist_files("foo_extra")
+    assert index.get_dist_files("foo") == foo_files
+    arcnames = sorted(arcname for _, arcname in foo_files)
+    assert arcnames == [
+        f"{name}-1.0.dist-info/{r}"
+        for name in ("bar", "foo")
+        for r in ("METADATA", "RECORD", "top_level.txt")
+    ]
+    assert all(os.path.isfile(path) for path, _ in foo_files)
+    assert len(index.get_dist_files("bar")) == 3
+    assert index.get_dist_files("missing") == []
+    assert index.get_distribution_name("foo_extra.sub") == "foo"
+
+    # the names of the distributions are read once, when the index is built
+    (tmp_path / "foo-1.0.dist-info" / "METADATA").write_text("")
+    assert index.get_distribution_name("foo") == "foo"
+
+    # as are their requirements and files, once per distribution
+    (tmp_path / "foo-1.0.dist-info" / "RECORD").write_text("")
+    assert index.get_dist_files("foo") == foo_files
+
+
+def test_freeze_jobs(tmp_path):
+    from cx_Freeze import Executable
+    from cx_Freeze.freezer import Freezer
+    from cx_Freeze.module import Module
+    from cx_Freeze.sizereport import SIZE_REPORT_NAME
+
+    # extension modules are searched for their dependencies in the path of
+    # their package, in the resolve phase as in the copy phase
+    package = Module("package", ["/package"], "/package/__init__.py")
+    extension = Module("package.ext", None, "/package/ext.so", package)
+    assert Freezer._GetExtensionSearchPath(extension) == ["/package"]
+    assert Freezer._GetExtensionSearchPath(package) is None
+
+    script = tmp_path / "script.py"
+    script.write_text("import ctypes, decimal, sqlite3\n")
+    freezers = []
+    for jobs in (1, 4):
+        target_dir = tmp_path / f"jobs{jobs}"
+        freezer = Freezer(
+            [Executable(str(script))],
+            targetDir=str(target_dir),
+            includeFiles=[],
+            zipIncludes=[],
+            silent=True,
+            jobs=jobs,
+        )
+        freezer.Freeze()
+        files = sorted(
+            os.path.relpath(os.path.join(p, n), target_dir)
+            for p, _, names in os.walk(target_dir)
+            for n in names
+        )
+        freezers.append((freezer, files))
+
+    # the dependencies resolved and the files copied by the threads are the
+    # same as those of a sequential build
+    (sequential, sequential_files), (concurrent, concurrent_files) = freezers
+    assert concurrent_files == sequential_files
+
+    # every build writes its size report, for cxfreeze-diff
+    assert SIZE_REPORT_NAME in sequential_files
+    assert concurrent.dependentFiles == sequential.dependentFiles
+    assert concurrent.linkerWarnings == sequential.linkerWarnings
+    assert concurrent.originRPath == sequential.originRPath
+
+
+def test_dependency_cache(tmp_path):
+    from cx_Freeze.cache import DependencyCache
+
+    binary = tmp_path / "binary"
+    binary.write_bytes(b"binary")
+    library = tmp_path / "library"
+    library.write_bytes(b"library")
+    cache = DependencyCache(str(tmp_path / "cache"))
+    assert cache.get(str(binary)) is None
+    cache.put(str(binary), [str(library)], ["missing"])
+    cache = DependencyCache(str(tmp_path / "cache"))
+    assert cache.get(str(binary)) == ([str(library)], ["missing"])
+
+    # a dependency which no longer exists invalidates the entry
+    library.unlink()
+    assert cache.get(str(binary)) is None
+
+    # as does a change to the binary itself
+    cache.put(str(binary), [], [])
+    assert cache.get(str(binary)) == ([], [])
+    binary.write_bytes(b"changed binary")
+    assert cache.get(str(binary)) is None
+
+
+def test_build_manifest(tmp_path):
+    from cx_Freeze.manifest import BuildManifest
+
+    source = tmp_path / "source.txt"
+    source.write_text("data")
+    target_dir = tmp_path / "build"
+    (target_dir / "sub").mkdir(parents=True)
+    target = target_dir / "sub" / "target.txt"
+    target.write_text("data")
+    manifest = BuildManifest(str(target_dir))
+    assert not manifest.is_copy_current(str(source), str(target))
+    manifest.record_copy(str(source), str(target))
+    manifest.save()
+
+    manifest = BuildManifest(str(target_dir))
+    assert manifest.is_copy_current(str(source), str(target))
+    source.write_text("changed")
+    assert not manifest.is_copy_current(str(source), str(target))
+
+    # files of the previous build which were not recorded again are removed
+    assert manifest.remove_stale() == [str(target)]
+    assert not (target_dir / "sub").exists()
+
+
+def test_list_tree(tmp_path):
+    import shutil
+
+    from cx_Freeze.copytools import copy_file, list_tree
+
+    source = tmp_path / "source"
+    (source / "sub").mkdir(parents=True)
+    (source / "data.txt").write_text("data")
+    (source / "sub" / "module.py").write_text("pass")
+    (source / "sub" / "more.txt").write_text("more")
+    target = tmp_path / "target"
+    pairs = list_tree(str(source), str(target), shutil.ignore_patterns("*.py"))
+    assert sorted(os.path.relpath(t, str(target)) for _, t in pairs) == [
+        "data.txt",
+        os.path.join("sub", "more.txt"),
+    ]
+    assert (target / "sub").is_dir()
+
+    # the files of symbolic links to directories are copied, as
+    # shutil.copytree() does
+    linked = tmp_path / "linked"
+    linked.mkdir()
+    (linked / "linked.txt").write_text("linked")
+    try:
+        os.symlink(str(linked), str(source / "link"), True)
+    except (OSError, NotImplementedError):
+        pass
+    else:
+        pairs = list_tree(str(source), str(target))
+        linked_file = os.path.realpath(str(linked / "linked.txt"))
+        assert (linked_file, str(target / "link" / "linked.txt")) in [
+            (os.path.realpath(s), t) for s, t in pairs
+        ]
+
+    method = copy_file(
+        str(source / "data.txt"), str(tmp_path / "link.txt"), hardlink=True
+    )
+    if method == "hardlink":
+        assert (source / "data.txt").stat().st_nlink == 2
+    assert (tmp_path / "link.txt").read_text() == "data"
+
+
+def _load_startup_module():
+    import importlib.util
+
+    from cx_Freeze.common import get_resource_file_path
+
+    startup = get_resource_file_path("initscripts", "__startup__", ".py")
+    spec = importlib.util.spec_from_file_location("__startup__", startup)
+    startup_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(startup_module)
+    sys.meta_path.remove(startup_module.ExtensionFinder)
+    return startup_module
+
+
+def test_archive_writer(tmp_path, monkeypatch):
+    import hashlib
+    import zipfile
+
+    from cx_Freeze import archive
+    from cx_Freeze.manifest import BuildManifest
+
+    def get_entries(version):
+        for i in range(40):
+            data = f"entry {i} of version {version if i % 3 else 0}\n"
+            yield f"pkg/mod{i}.pyc", data.encode() * (i + 1)
+
+    def write(file_name, version, compress_type, jobs, manifest=None):
+        writer = archive.ArchiveWriter(
+            file_name, compress_type, jobs, manifest
+        )
+        for name, data in get_entries(version):
+            zinfo = zipfile.ZipInfo(name, (2020, 1, 1, 0, 0, 0))
+            writer.add_data(zinfo, lambda data=data: data)
+        writer.close()
+        with open(file_name, "rb") as fp:
+            return fp.read()
+
+    def write_expected(file_name, version, compress_type):
+        with zipfile.ZipFile(file_name, "w", compress_type) as zip_file:
+            for name, data in get_entries(version):
+                zinfo = zipfile.ZipInfo(name, (2020, 1, 1, 0, 0, 0))
+                zinfo.compress_type = compress_type
+                zip_file.writestr(zinfo, data)
+        with open(file_name, "rb") as fp:
+            return fp.read()
+
+    # the entries compressed by the threads (or copied from the previous
+    # archive in incremental builds) are written with the internals of
+    # ZipFile exactly as ZipFile.writestr() writes them
+    for compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        expected_name = str(tmp_path / "expected.zip")
+        expected = write_expected(expected_name, 1, compress_type)
+        for jobs in (1, 2):
+            file_name = str(tmp_path / f"library{jobs}.zip")
+            assert write(file_name, 1, compress_type, jobs) == expected
+            assert zipfile.ZipFile(file_name).testzip() is None
+
+        target_dir = tmp_path / f"build{compress_type}"
+        target_dir.mkdir()
+        file_name = str(target_dir / "library.zip")
+        for version in (1, 2):
+            manifest = BuildManifest(str(target_dir))
+            result = write(file_name, version, compress_type, 2, manifest)
+            manifest.save()
+            expected = write_expected(expected_name, version, compress_type)
+            assert result == expected
+
+    # without them, the entries are compressed by ZipFile.writestr()
+    monkeypatch.setattr(
+        archive, "_ZIP_FILE_INTERNALS", archive._ZIP_FILE_INTERNALS + ("x",)
+    )
+    file_name = str(tmp_path / "fallback.zip")
+    expected = write_expected(expected_name, 1, zipfile.ZIP_DEFLATED)
+    assert write(file_name, 1, zipfile.ZIP_DEFLATED, 2) == expected
+
+    # the files written by the threads are recorded once they are written
+    target_dir = tmp_path / "files"
+    target_dir.mkdir()
+    for data in (b"data", b"data", b"changed"):
+        manifest = BuildManifest(str(target_dir))
+        writer = archive.ArchiveWriter(
+            str(target_dir / "library.zip"), zipfile.ZIP_STORED, 2, manifest
+        )
+        target = str(target_dir / "module.pyc")
+        writer.write_file(target, lambda: data)
+        writer.close()
+        manifest.save()
+        digest = hashlib.sha1(data).hexdigest()
+        assert manifest.files["module.pyc"]["digest"] == digest
+        assert (target_dir / "module.pyc").read_bytes() == data
+
+
+def test_indexed_archive(tmp_path):
+    from cx_Freeze.archive import IndexedArchiveWriter
+
+    archive_name = str(tmp_path / "library.cxa")
+    writer = IndexedArchiveWriter(archive_name)
+    for i in range(20):
+        writer.add_module(f"mod{i}", False, compile(f"x = {i}", "m", "exec"))
+    writer.add_module("pkg", True, compile("", "pkg", "exec"))
+    writer.close()
+
+    startup_module = _load_startup_module()
+    finder = startup_module.IndexedArchiveFinder(archive_name)
+    assert len(finder.names()) == 21
+    assert finder.is_package("pkg")
+    assert not finder.is_package("mod7")
+    assert finder.find_spec("missing") is None
+    namespace = {}
+    exec(finder.get_code("mod13"), namespace)
+    assert namespace["x"] == 13
+
+
+def test_indexed_archive_data(tmp_path, monkeypatch):
+    import importlib
+    import pkgutil
+    import zipfile
+
+    from cx_Freeze.archive import IndexedArchiveWriter
+
+    archive_name = str(tmp_path / "library.cxa")
+    writer = IndexedArchiveWriter(archive_name)
+    writer.add_module("cxadatapkg", True, compile("", "pkg", "exec"))
+    writer.close()
+    zip_name = str(tmp_path / "library.zip")
+    with zipfile.ZipFile(zip_name, "w") as zip_file:
+        zip_file.writestr("cxadatapkg/data.txt", b"data")
+        zip_file.writestr("cxadatapkg/sub/more.txt", b"more")
+
+    # the data files of the packages in the archive are read from the zip
+    # file by pkgutil.get_data and importlib.resources
+    startup_module = _load_startup_module()
+    finder = startup_module.IndexedArchiveFinder(archive_name, zip_name)
+    monkeypatch.setattr(sys, "meta_path", [finder] + sys.meta_path)
+    monkeypatch.delitem(sys.modules, "cxadatapkg", raising=False)
+    importlib.import_module("cxadatapkg")
+    assert pkgutil.get_data("cxadatapkg", "data.txt") == b"data"
+    assert pkgutil.get_data("cxadatapkg", "sub/more.txt") == b"more"
+    assert_raises(OSError, pkgutil.get_data, "cxadatapkg", "missing.txt")
+    if sys.version_info >= (3, 7):
+        import importlib.resources
+
+        assert importlib.resources.read_binary("cxadatapkg", "data.txt") == (
+            b"data"
+        )
+        assert importlib.resources.is_resource("cxadatapkg", "data.txt")
+        assert not importlib.resources.is_resource("cxadatapkg", "sub")
+        assert sorted(importlib.resources.contents("cxadatapkg")) == [
+            "data.txt",
+            "sub",
+        ]
+    # Python 3.9 looks for the files of packages only in the file system or
+    # in zip files given by their loader
+    if sys.version_info >= (3, 10):
+        files = importlib.resources.files("cxadatapkg")
+        assert files.joinpath("sub", "more.txt").read_bytes() == b"more"
+    sys.modules.pop("cxadatapkg")
+
+
+def test_lazy_finder(tmp_path, monkeypatch):
+    package_dir = tmp_path / "lazypkg"
+    package_dir.mkdir()
+    (package_dir / "__init__.py").write_text("import sys\nsys.executed = 1")
+    (package_dir / "eager.py").write_text("")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delattr(sys, "executed", raising=False)
+
+    startup_module = _load_startup_module()
+    finder = startup_module.LazyFinder(["lazypkg"], ["lazypkg.eager"])
+    sys.meta_path.insert(0, finder)
+    try:
+        import lazypkg
+
+        assert not hasattr(sys, "executed")
+        assert finder.deferred == ["lazypkg"]
+        assert finder.find_spec("lazypkg.eager", lazypkg.__path__) is None
+        assert sys.executed == 1
+    finally:
+        sys.meta_path.remove(finder)
+        sys.modules.pop("lazypkg", None)
+        monkeypatch.delattr(sys, "executed", raising=False)
+
+
+def test_import_profiles(tmp_path):
+    import json
+
+    from cx_Freeze.importprofile import (
+        find_unused_modules,
+        read_import_order,
+        read_import_profiles,
+    )
+
+    profile = {
+        "modules_before_tracer": ["sys"],
+        "imports": [
+            {"name": "other", "level": 0, "start_us": 30},
+            {"name": "pkg.used", "level": 0, "start_us": 10},
+            {"name": "pkg.failed", "error": "ImportError", "start_us": 20},
+        ],
+        "modules": ["sys", "pkg", "pkg.used", "other"],
+    }
+    (tmp_path / "run-1.json").write_text(json.dumps(profile))
+    used = read_import_profiles([str(tmp_path)])
+    assert used == {"sys", "pkg", "pkg.used", "other"}
+    names = ["sys", "pkg", "pkg.used", "pkg.failed", "dyn.sub.mod", "unused"]
+    unused = find_unused_modules(names, used, ["dyn.sub"])
+    assert unused == ["pkg.failed", "unused"]
+    assert read_import_order([str(tmp_path)]) == (
+        ["pkg", "pkg.used", "other"],
+        {"sys"},
+    )
+
+    (tmp_path / "bad.json").write_text("{")
+    with assert_raises(ConfigError):
+        read_import_profiles([str(tmp_path / "bad.json")])
+
+
+def test_runtime_config(tmp_path):
+    from cx_Freeze.runtimeconfig import (
+        RUNTIME_CONFIG_MARKER,
+        RUNTIME_CONFIG_SIZE,
+        format_runtime_config,
+        parse_runtime_config,
+        write_runtime_config,
+    )
+
+    config = parse_runtime_config(
+        ["optimize=2", "faulthandler=no", "environment=PYTHONHASHSEED"]
+    )
+    assert config == {
+        "optimize": 2,
+        "faulthandler": False,
+        "environment": ["PYTHONHASHSEED"],
+    }
+    config.update(parse_runtime_config({"hash_seed": 0, "utf8_mode": False}))
+    data = format_runtime_config(config)
+    # faulthandler is off unless present, utf8_mode has a value either way
+    assert data == (
+        b"environment=PYTHONHASHSEED\nhash_seed=0\noptimize=2\nutf8_mode=0\n"
+    )
+    for bad in ({"optimize": 3}, {"allocator": "x"}, {"environment": ["X"]}):
+        with assert_raises(ConfigError):
+            parse_runtime_config(bad)
+
+    executable = tmp_path / "executable"
+    buffer = RUNTIME_CONFIG_MARKER.ljust(RUNTIME_CONFIG_SIZE, b"\0")
+    executable.write_bytes(b"head" + buffer + b"tail")
+    assert write_runtime_config(str(executable), data)
+    assert not write_runtime_config(str(executable), data)
+    contents = executable.read_bytes()
+    assert len(contents) == RUNTIME_CONFIG_SIZE + 8
+    assert contents.endswith(b"tail")
+    assert data + b"\0" in contents
+    assert write_runtime_config(str(executable), b"")
+    assert executable.read_bytes() == b"head" + buffer + b"tail"
+
+
+def test_size_report(tmp_path):
+    import zipfile
+
+    from cx_Freeze.archive import IndexedArchiveWriter
+    from cx_Freeze.sizereport import (
+        SizeReport,
+        format_size,
+        iter_indexed_archive,
+        iter_zip_entries,
+    )
+
+    zip_name = str(tmp_path / "library.zip")
+    with zipfile.ZipFile(zip_name, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("pkg/__init__.pyc", b"x" * 1000)
+        compress_size = zip_file.getinfo("pkg/__init__.pyc").compress_size
+    assert list(iter_zip_entries(zip_name)) == [
+        ("pkg/__init__.pyc", 1000, compress_size)
+    ]
+    archive_name = str(tmp_path / "library.cxa")
+    writer = IndexedArchiveWriter(archive_name)
+    writer.add_module("mod", False, compile("x = 1", "mod", "exec"))
+    writer.close()
+    assert [name for name, _ in iter_indexed_archive(archive_name)] == ["mod"]
+
+    report = SizeReport()
+    report.add("lib/library.zip/pkg/__init__.pyc", "module", 1000, 20, "pkg")
+    report.add(
+        "lib/pkg/sub/data.txt",
+        "data",
+        300,
+        module="pkg.sub",
+        distribution="dist",
+        hook="hooked",
+        directory="lib/pkg/sub",
+    )
+    report.add("lib/libz.so", "library", 5000)
+    assert report.get_total() == {
+        "size": 6300,
+        "compressed_size": 5320,
+        "items": 3,
+    }
+    assert [t["name"] for t in report.get_totals("package")] == ["pkg"]
+    assert report.get_totals("package")[0]["compressed_size"] == 320
+    assert [t["name"] for t in report.get_totals("kind")] == [
+        "library",
+        "data",
+        "module",
+    ]
+    assert "largest by hook:\n" in report.format_summary()
+    assert format_size(1536) == "1.5 KB"
+
+    report.write(str(tmp_path / "report.json"))
+    loaded = SizeReport.load(str(tmp_path / "report.json"))
+    assert loaded.get_totals("distribution") == report.get_totals(
+        "distribution"
+    )
+    with assert_raises(ConfigError):
+        SizeReport.load(str(tmp_path / "library.cxa"))
+
+
+def test_size_diff(tmp_path):
+    import json
+
+    from cx_Freeze.sizediff import check_budgets, prepare_parser
+    from cx_Freeze.sizereport import (
+        SIZE_REPORT_NAME,
+        SizeReport,
+        compare_size_reports,
+    )
+
+    old = SizeReport()
+    old.add("lib/library.zip/pkg/__init__.pyc", "module", 1000, 500, "pkg")
+    old.add("lib/libold.so", "library", 2000)
+    old_dir = tmp_path / "old"
+    old_dir.mkdir()
+    old.write(str(old_dir / SIZE_REPORT_NAME))
+    new = SizeReport()
+    new.add("lib/library.zip/pkg/__init__.pyc", "module", 3000, 1500, "pkg")
+    new.add("lib/library.zip/pkg/sub.pyc", "module", 100, 50, "pkg.sub")
+    new.add("lib/libnew.so", "library", 4000)
+
+    diff = compare_size_reports(SizeReport.load(str(old_dir)), new)
+    assert diff["added_modules"] == ["pkg.sub"]
+    assert diff["removed_modules"] == []
+    assert diff["added_binaries"] == [{"path": "lib/libnew.so", "size": 4000}]
+    assert diff["removed_binaries"] == [
+        {"path": "lib/libold.so", "size": 2000}
+    ]
+    assert diff["totals"]["package"][0]["change"] == 1050
+
+    parser = prepare_parser()
+    args = parser.parse_args(["old", "new", "--max-growth", "3K"])
+    assert check_budgets(diff, args) == []
+    args = parser.parse_args(
+        ["old", "new", "--max-package-growth", "1K", "--max-modules", "1"]
+    )
+    assert len(check_budgets(diff, args)) == 2
+
+    # builds without a size report fall back to the manifest
+    manifest_dir = tmp_path / "manifest"
+    manifest_dir.mkdir()
+    (manifest_dir / ".cx_freeze_manifest.json").write_text(
+        json.dumps({"version": 1, "files": {"lib/x.so": {"stat": [7, 0]}}})
+    )
+    assert SizeReport.load(str(manifest_dir)).get_total()["size"] == 7